@@ -2,23 +2,53 @@
 
 # original skeleton for this project is located on
 # https://github.com/alexopryshko/advancedpython/blob/master/2/orm.py
+import sys
+import csv
+import zlib
+import heapq
+import functools
+import json
+import time
+import base64
+import datetime
 import logging
 import sqlite3
+import itertools
+import queue
+import threading
+import urllib.parse
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import List, Type
 
 
+class ValidationError(ValueError):
+    """ Validation error, that carries all (row index, field name, message) errors """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f'row {i}: {name}: {msg}' for i, name, msg in errors))
+
+
 class Field:
     """ Base class for all orm fields """
-    def __init__(self, primary=False, null=False, default=None):
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
         self.primary = primary
         self.null = null
         self.default = default
+        # lazy fields are excluded from selects and loaded on the first attribute access
+        self.lazy = lazy
 
         self.name: str = None  # will be defined in ModelMeta
 
         self.is_primary_key_sql = 'PRIMARY KEY' if primary else ''
 
+    def __get__(self, instance, owner):
+        # instance attributes shadow fields, so it's called only for deferred values
+        if instance is None:
+            return self
+        return instance.load_deferred_field(self)
+
     def validate(self, value):
         if value is None and not self.null:
             raise ValueError(f'Null values are not allowed for {type(self).__name__} in {self.name}')
@@ -30,26 +60,98 @@ class Field:
     def _validate(self, value):
         raise NotImplementedError
 
+    def validate_many(self, values: list) -> list:
+        """ Column-wise validation, returns list of (row index, error message) """
+        errors = []
+        if not self.null:
+            msg = f'Null values are not allowed for {type(self).__name__} in {self.name}'
+            errors.extend((i, msg) for i, value in enumerate(values) if value is None)
+        errors.extend(self._validate_many(values))
+        return errors
+
+    def _validate_many(self, values: list) -> list:
+        # fallback for fields without column-wise implementation
+        errors = []
+        for i, value in enumerate(values):
+            if value is None and not self.null:
+                continue  # already reported
+            try:
+                self._validate(value)
+            except ValueError as e:
+                errors.append((i, str(e)))
+        return errors
+
     def get_column_sql(self):
         raise NotImplementedError
 
+    # db <-> python converters, python_value is called on every hydrated row,
+    # so fields, that store python values as is, must not override them
+    def db_value(self, value):
+        return value
+
+    def python_value(self, value):
+        return value
+
+    @property
+    def converts_db_value(self):
+        return type(self).db_value is not Field.db_value
+
+    @property
+    def converts_python_value(self):
+        return type(self).python_value is not Field.python_value
+
+    # import/export converters, value must survive json and csv (where everything is str)
+    # serialize gets db value (as it is stored), deserialize returns python value
+    def serialize(self, value):
+        return value
+
+    def deserialize(self, value):
+        return value
+
     # for other types of filtering you can implement other comparison methods
     def __eq__(self, other):
-        return f"{self.name} = '{other}'"
+        value = str(self.db_value(other)).replace("'", "''")
+        return f"{self.name} = '{value}'"
+
+    def asc(self):
+        return Ordering(self)
+
+    def desc(self):
+        return Ordering(self, descending=True)
+
+
+@dataclass
+class Ordering:
+    """ Order by item, e.g. Model.field.desc() """
+    field: Field
+    descending: bool = False
+
+    def get_sql(self):
+        return f'{self.field.name} {"DESC" if self.descending else "ASC"}'
 
 
 class IntegerField(Field):
     """ Integer field """
-    def __init__(self, primary=False, null=False, default=None):
-        super().__init__(primary, null, default)
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
 
     def _validate(self, value):
         if not self.null and not isinstance(value, int):
             raise ValueError(f'{type(self).__name__} value {value!r} is not int')
 
+    def _validate_many(self, values):
+        if self.null:
+            return []
+        return [(i, f'{type(self).__name__} value {value!r} is not int')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, int)]
+
     def get_column_sql(self):
         return f'{self.name} INT {self.is_primary_key_sql}'
 
+    def deserialize(self, value):
+        return None if value is None or value == '' else int(value)
+
 
 class AutoField(Field):
     """ Primary auto-incremental integer field """
@@ -60,23 +162,235 @@ class AutoField(Field):
         if self.null and value is not None:
             raise ValueError(f'{type(self).__name__} doesn\'t expect any value assign')
 
+    def _validate_many(self, values):
+        if not self.null:
+            return []
+        return [(i, f'{type(self).__name__} doesn\'t expect any value assign')
+                for i, value in enumerate(values) if value is not None]
+
     def get_column_sql(self):
         return f'{self.name} INTEGER {self.is_primary_key_sql} AUTOINCREMENT'
 
+    def deserialize(self, value):
+        return None if value is None or value == '' else int(value)
+
 
 class CharField(Field):
     """ Char field """
-    def __init__(self, max_length=255, primary=False, null=False, default=None):
+    def __init__(self, max_length=255, primary=False, null=False, default=None,
+                 lazy=False):
         self.max_length = max_length
-        super().__init__(primary, null, default)
+        super().__init__(primary, null, default, lazy)
 
     def _validate(self, value):
         if not self.null and not isinstance(value, str):
             raise ValueError(f'{type(self).__name__} value {value!r} is not str')
 
+    def _validate_many(self, values):
+        if self.null:
+            return []
+        return [(i, f'{type(self).__name__} value {value!r} is not str')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, str)]
+
     def get_column_sql(self):
         return f'{self.name} VARCHAR({self.max_length}) {self.is_primary_key_sql}'
 
+    def deserialize(self, value):
+        # csv has no nulls, so empty string is null for nullable fields
+        if value == '' and self.null:
+            return None
+        return value
+
+
+class FloatField(Field):
+    """ Float field """
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
+
+    def _validate(self, value):
+        # nulls are checked in validate
+        if value is not None and not isinstance(value, (int, float)):
+            raise ValueError(f'{type(self).__name__} value {value!r} is not float')
+
+    def _validate_many(self, values):
+        return [(i, f'{type(self).__name__} value {value!r} is not float')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, (int, float))]
+
+    def get_column_sql(self):
+        return f'{self.name} REAL {self.is_primary_key_sql}'
+
+    def deserialize(self, value):
+        return None if value is None or value == '' else float(value)
+
+
+class BooleanField(Field):
+    """ Boolean field, stored as 0/1 integer """
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
+
+    def _validate(self, value):
+        # nulls are checked in validate
+        if value is not None and not isinstance(value, bool):
+            raise ValueError(f'{type(self).__name__} value {value!r} is not bool')
+
+    def _validate_many(self, values):
+        return [(i, f'{type(self).__name__} value {value!r} is not bool')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, bool)]
+
+    def get_column_sql(self):
+        return f'{self.name} INTEGER {self.is_primary_key_sql}'
+
+    def db_value(self, value):
+        return None if value is None else int(value)
+
+    def python_value(self, value):
+        return None if value is None else bool(value)
+
+    def deserialize(self, value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, str):
+            return value.lower() in ('1', 'true')
+        return bool(value)
+
+
+class DateTimeField(Field):
+    """
+    Datetime field, stored as integer unix epoch (seconds)
+
+    naive datetimes are treated as local time (as datetime.timestamp() does),
+    values are read back as aware utc datetimes
+    """
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
+
+    def _validate(self, value):
+        # nulls are checked in validate
+        if value is not None and not isinstance(value, datetime.datetime):
+            raise ValueError(f'{type(self).__name__} value {value!r} is not datetime')
+
+    def _validate_many(self, values):
+        return [(i, f'{type(self).__name__} value {value!r} is not datetime')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, datetime.datetime)]
+
+    def get_column_sql(self):
+        return f'{self.name} INTEGER {self.is_primary_key_sql}'
+
+    def db_value(self, value):
+        if isinstance(value, datetime.datetime):
+            return int(value.timestamp())
+        return value
+
+    def python_value(self, value):
+        if value is None:
+            return None
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+
+    def deserialize(self, value):
+        if value is None or value == '':
+            return None
+        return self.python_value(int(value))
+
+
+class BlobField(Field):
+    """ Binary field, values are read as zero-copy memoryview over fetched bytes """
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
+
+    def _validate(self, value):
+        # nulls are checked in validate
+        if value is not None and not isinstance(value, (bytes, bytearray, memoryview)):
+            raise ValueError(f'{type(self).__name__} value {value!r} is not bytes-like')
+
+    def _validate_many(self, values):
+        bytes_types = (bytes, bytearray, memoryview)
+        return [(i, f'{type(self).__name__} value {value!r} is not bytes-like')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, bytes_types)]
+
+    def get_column_sql(self):
+        return f'{self.name} BLOB {self.is_primary_key_sql}'
+
+    def python_value(self, value):
+        return None if value is None else memoryview(value)
+
+    def serialize(self, value):
+        return None if value is None else base64.b64encode(value).decode('ascii')
+
+    def deserialize(self, value):
+        # csv has no nulls, so empty string is null for nullable fields
+        if value is None or (value == '' and self.null):
+            return None
+        return base64.b64decode(value)
+
+
+class _LazyJSON:
+    """ Raw json text, that is decoded on the first attribute access """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+
+class JSONField(Field):
+    """
+    Json field, stored as text
+
+    Fetched values are decoded lazily on the first attribute access,
+    so rows, whose json is never touched, don't pay for json.loads
+    """
+    json_types = (dict, list, str, int, float, bool)
+
+    def __init__(self, primary=False, null=False, default=None, lazy=False):
+        super().__init__(primary, null, default, lazy)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.name not in instance.__dict__:
+            return instance.load_deferred_field(self)
+        value = instance.__dict__[self.name]
+        if type(value) is _LazyJSON:
+            value = instance.__dict__[self.name] = json.loads(value.raw)
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+    def _validate(self, value):
+        # nulls are checked in validate
+        if value is not None and not isinstance(value, self.json_types):
+            raise ValueError(f'{type(self).__name__} value {value!r} is not json type')
+
+    def _validate_many(self, values):
+        return [(i, f'{type(self).__name__} value {value!r} is not json type')
+                for i, value in enumerate(values)
+                if value is not None and not isinstance(value, self.json_types)]
+
+    def get_column_sql(self):
+        return f'{self.name} TEXT {self.is_primary_key_sql}'
+
+    def db_value(self, value):
+        if value is None:
+            return None
+        if type(value) is _LazyJSON:
+            return value.raw  # wasn't touched, so there is no need in round trip
+        return json.dumps(value)
+
+    def python_value(self, value):
+        return None if value is None else _LazyJSON(value)
+
+    def deserialize(self, value):
+        # json field is serialized as its json text both for jsonl and csv,
+        # empty csv cell is null only for nullable fields, otherwise it's bad json
+        if value is None or (value == '' and self.null):
+            return None
+        return json.loads(value)
+
 
 class _ConnectionState:
     """ Just container for connection storing """
@@ -103,6 +417,9 @@ class DBDriver:
 
         self._state = _ConnectionState()
 
+        # optional write-behind BufferedWriter, attaches itself
+        self.writer: "BufferedWriter" = None
+
     def _connect(self):
         raise NotImplementedError
 
@@ -131,6 +448,29 @@ class DBDriver:
             self.commit()
         return cursor
 
+    def close(self):
+        if self._state.closed:
+            return
+        self._state.conn.close()
+        self._state.reset()
+
+    def route(self, query: "Query") -> "DBDriver":
+        # drivers, that are composed of other drivers, choose one of them for the query
+        return self
+
+    def execute_many_sql(self, sql, seq_of_params):
+        # whole batch is executed in a single transaction
+        cursor = self._state.conn.cursor()
+        try:
+            logging.debug(sql)
+            cursor.executemany(sql, seq_of_params)
+        except Exception:
+            self.rollback()
+            raise
+        else:
+            self.commit()
+        return cursor
+
     @staticmethod
     def last_insert_id(cursor):
         return cursor.lastrowid
@@ -153,14 +493,24 @@ class DBDriver:
 
 
 class SQLiteDBDriver(DBDriver):
-    """ Sqlite db driver implementation """
-    def __init__(self, database, connect_params=None, timeout=5):
+    """
+    Sqlite db driver implementation
+
+    read_only=True opens the database file with mode=ro uri, e.g. for read replicas
+    """
+    def __init__(self, database, connect_params=None, timeout=5, read_only=False):
         super().__init__(database, connect_params)
         self._timeout = timeout
+        self.read_only = read_only
 
     def _connect(self):
-        conn = sqlite3.connect(self.database, timeout=self._timeout,
-                               **self.connect_params)
+        if self.read_only:
+            database = f'file:{urllib.parse.quote(self.database)}?mode=ro'
+            conn = sqlite3.connect(database, timeout=self._timeout, uri=True,
+                                   **self.connect_params)
+        else:
+            conn = sqlite3.connect(self.database, timeout=self._timeout,
+                                   **self.connect_params)
         return conn
 
     def get_tables(self, schema='main'):
@@ -170,6 +520,294 @@ class SQLiteDBDriver(DBDriver):
         return [row for row, in cursor.fetchall()]
 
 
+class ShardedDBDriver(DBDriver):
+    """
+    Driver, that spreads model rows across several drivers by Meta.shard_key
+
+    Inserts and saves/deletes of instances go to the shard of the instance key,
+    selects without key (see SelectQuery.shard) are executed on all shards in parallel
+    threads and merged with respect to order_by and limit, other queries (e.g. updates
+    and deletes by .where()) are broadcast.
+
+    Keep in mind, that auto ids are unique only within a shard
+    and shard key can not be updated, rows are not moved between shards
+    """
+    def __init__(self, shards: List[DBDriver]):
+        if not shards:
+            raise ValueError('ShardedDBDriver needs at least one shard')
+        super().__init__(tuple(shard.database for shard in shards))
+        self.shards = shards
+        self._pool: ThreadPoolExecutor = None
+
+        # shard connections are used from the fan-out threads
+        for shard in self.shards:
+            shard.connect_params.setdefault('check_same_thread', False)
+
+    def connect(self):
+        if not self._state.closed:
+            raise RuntimeError("Already connected")
+        for shard in self.shards:
+            shard.connect()
+        self._pool = ThreadPoolExecutor(len(self.shards), thread_name_prefix='shard')
+        self._state.set_connection(self.shards)
+
+    def close(self):
+        if self._state.closed:
+            return
+        for shard in self.shards:
+            shard.close()
+        self._pool.shutdown()
+        self._state.reset()
+
+    def rollback(self):
+        for shard in self.shards:
+            shard.rollback()
+
+    def commit(self):
+        for shard in self.shards:
+            shard.commit()
+
+    def shard_index(self, value):
+        # stable between processes, unlike hash()
+        return zlib.crc32(str(value).encode()) % len(self.shards)
+
+    def shard_for(self, value) -> DBDriver:
+        return self.shards[self.shard_index(value)]
+
+    def route(self, query: "Query") -> DBDriver:
+        if query.shard_key_value is not None:
+            return self.shard_for(query.shard_key_value)
+        if isinstance(query, InsertQuery):
+            raise ValueError(
+                f'Shard key {query.model_cls.meta.shard_key!r} is required for insert'
+            )
+        return self
+
+    def execute_sql(self, sql, params=None):
+        # broadcast, e.g. ddl or updates/deletes without shard key
+        cursor = None
+        for shard in self.shards:
+            cursor = shard.execute_sql(sql, params)
+        return cursor
+
+    def execute_many_sql(self, sql, seq_of_params):
+        raise NotImplementedError('Use execute_many_sharded, rows must be routed by key')
+
+    def execute_many_sharded(self, sql, seq_of_params, keys):
+        by_shard = defaultdict(list)
+        for params, key in zip(seq_of_params, keys):
+            by_shard[self.shard_index(key)].append(params)
+        for index, shard_params in by_shard.items():
+            self.shards[index].execute_many_sql(sql, shard_params)
+
+    def select(self, query: "SelectQuery") -> "_RowsCursor":
+        """ Fan-out select, results are merged by the query orderings and limit """
+        # ordering columns, that are not selected (e.g. deferred), are needed for
+        # the merge, so they are selected too and cut off after it
+        orderings = query.orderings
+        selected = query.fields_names.split(',')
+        extra = list(dict.fromkeys(o.field.name for o in orderings
+                                   if o.field.name not in selected))
+        sql = query._build_sql(extra) if extra else query.sql
+
+        def fetch(shard):
+            cursor = shard.execute_sql(sql, query.params)
+            return cursor.description, cursor.fetchall()
+
+        results = list(self._pool.map(fetch, self.shards))
+        description = results[0][0]
+        shards_rows = [rows for _, rows in results]
+
+        if orderings:
+            columns = [column[0] for column in description]
+            keys = [(columns.index(o.field.name), o.descending) for o in orderings]
+            rows = heapq.merge(*shards_rows, key=functools.cmp_to_key(
+                functools.partial(_compare_rows, keys)
+            ))
+        else:
+            rows = itertools.chain.from_iterable(shards_rows)
+        if query.limit_value is not None:
+            rows = itertools.islice(rows, query.limit_value)
+        if extra:
+            width = len(description) - len(extra)
+            return _RowsCursor(description[:width], [row[:width] for row in rows])
+        return _RowsCursor(description, list(rows))
+
+    def get_tables(self, schema='main'):
+        tables = [set(shard.get_tables(schema)) for shard in self.shards]
+        return sorted(set.intersection(*tables))
+
+
+def _compare_rows(keys, a, b):
+    # the same order as sqlite has, nulls are the smallest
+    for index, descending in keys:
+        x, y = a[index], b[index]
+        if x == y:
+            continue
+        if x is None:
+            result = -1
+        elif y is None:
+            result = 1
+        else:
+            result = -1 if x < y else 1
+        return -result if descending else result
+    return 0
+
+
+class _RowsCursor:
+    """ Cursor-like container over already fetched rows (e.g. from the query cache) """
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = iter(rows)
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return list(itertools.islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class QueryCache:
+    """
+    LRU cache of select results, bounded by estimated memory size
+
+    Entries are keyed by (database, sql, params) and are invalidated
+    by table, when any write query touches the table
+    """
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+
+        # key -> (table_name, expires_at, description, rows, size)
+        self._entries = OrderedDict()
+        self._table_keys = defaultdict(set)
+        # bumped on every invalidation, so results of selects, that were running
+        # during the table update, will not be stored
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, table_name):
+        return self._generations[table_name]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                table_name, expires_at, description, rows, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _RowsCursor(description, rows)
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, table_name, generation, description, rows, ttl=None):
+        size = self._estimate_size(rows)
+        if size > self.max_size:
+            return
+        with self._lock:
+            if generation != self._generations[table_name]:
+                return  # table was changed during the select
+            if key in self._entries:
+                self._remove(key)
+            expires_at = None if ttl is None else time.monotonic() + ttl
+            self._entries[key] = (table_name, expires_at, description, rows, size)
+            self._table_keys[table_name].add(key)
+            self.size += size
+            while self.size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, table_name):
+        with self._lock:
+            self._generations[table_name] += 1
+            for key in self._table_keys.pop(table_name, ()):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._table_keys.clear()
+            self.size = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hit_ratio,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self._entries),
+            'size': self.size,
+        }
+
+    def _remove(self, key):
+        table_name, _, _, _, size = self._entries.pop(key)
+        self._table_keys[table_name].discard(key)
+        self.size -= size
+
+    @staticmethod
+    def _estimate_size(rows):
+        size = sys.getsizeof(rows)
+        for row in rows:
+            size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+        return size
+
+
+# default cache for all models, can be replaced by Meta.query_cache
+query_cache = QueryCache()
+
+
+class DatabaseRouter:
+    """
+    Base database router, decides on which database the query will be executed
+
+    Default implementation sends everything to the main (writer) database
+    """
+    def __init__(self, database: DBDriver, replicas: List[DBDriver] = None):
+        self.database = database
+        self.replicas = replicas or []
+
+    def db_for_query(self, query: "Query") -> DBDriver:
+        if query.is_write:
+            return self.db_for_write(query)
+        return self.db_for_read(query)
+
+    def db_for_read(self, query: "Query") -> DBDriver:
+        return self.database
+
+    def db_for_write(self, query: "Query") -> DBDriver:
+        return self.database
+
+
+class ReadReplicaRouter(DatabaseRouter):
+    """ Sends selects to the replicas by round-robin and writes to the main db """
+    def __init__(self, database: DBDriver, replicas: List[DBDriver] = None):
+        super().__init__(database, replicas)
+        self._replicas_cycle = itertools.cycle(self.replicas or [self.database])
+
+    def db_for_read(self, query: "Query") -> DBDriver:
+        return next(self._replicas_cycle)
+
+
 @dataclass
 class Metadata:
     """ Model class meta container """
@@ -178,6 +816,11 @@ class Metadata:
     table_name: str
     pk_name: str
     pk_field: Field
+    replicas: List[DBDriver] = None
+    router: DatabaseRouter = None
+    query_cache: QueryCache = None
+    fts: List[str] = None
+    shard_key: str = None
 
 
 class ModelMeta(type):
@@ -239,19 +882,47 @@ class ModelMeta(type):
             fields[pk_name] = pk
         else:
             pk = primary_keys[0]
+            if pk.lazy:
+                raise ValueError(f'Primary key {pk.name} can not be lazy')
             if not any(isinstance(pk, t) for t in [AutoField]):
                 raise ValueError(
                     f'Field {pk} is not supported as primary key'
                 )
             pk_name = pk.name
 
+        # routing between main database and its read replicas
+        replicas = list(getattr(meta, 'replicas', None) or [])
+        router_cls = getattr(meta, 'router', None)
+        if router_cls is None:
+            router_cls = ReadReplicaRouter if replicas else DatabaseRouter
+        if not issubclass(router_cls, DatabaseRouter):
+            raise ValueError(f'{name}.Meta.router must be a DatabaseRouter subclass')
+
+        # full-text search fields, could be declared by names or by fields
+        fts = [f if isinstance(f, str) else f.name
+               for f in getattr(meta, 'fts', None) or []]
+        for f_name in fts:
+            if f_name not in fields:
+                raise ValueError(f'Unknown field {f_name!r} in {name}.Meta.fts')
+
+        shard_key = getattr(meta, 'shard_key', None)
+        if shard_key is not None and not isinstance(shard_key, str):
+            shard_key = shard_key.name
+        if shard_key is not None and shard_key not in fields:
+            raise ValueError(f'Unknown field {shard_key!r} in {name}.Meta.shard_key')
+
         # initialization of meta container
         model_meta = Metadata(
             database=meta.database,
             fields=fields,
             table_name=name.lower(),
             pk_name=pk_name,
-            pk_field=pk
+            pk_field=pk,
+            replicas=replicas,
+            router=router_cls(meta.database, replicas),
+            query_cache=getattr(meta, 'query_cache', None) or query_cache,
+            fts=fts,
+            shard_key=shard_key,
         )
         namespace['meta'] = model_meta
 
@@ -260,12 +931,27 @@ class ModelMeta(type):
 
 class Query:
     """ Base class for query """
+    # write queries invalidate cached selects of their table
+    is_write = False
+
     def __init__(self, model_cls: Type["Model"]):
         self.model_cls = model_cls
         self.sql = None
-
-    def execute(self, database):
-        return self._execute(database)
+        # for the ShardedDBDriver routing
+        self.shard_key_value = None
+
+    def execute(self, database=None):
+        # without explicit database the model router decides where to go
+        if database is None:
+            database = self.model_cls.meta.router.db_for_query(self)
+        database = database.route(self)
+        if not self.is_write:
+            return self._execute(database)
+        try:
+            return self._execute(database)
+        finally:
+            meta = self.model_cls.meta
+            meta.query_cache.invalidate(meta.table_name)
 
     def _execute(self, database):
         raise NotImplementedError
@@ -349,21 +1035,30 @@ class DictCursorWrapper(CursorWrapper):
 
 
 class ModelObjectCursorWrapper(DictCursorWrapper):
-    """ Cursor wrapper, that wraps every row in model object """
+    """
+    Cursor wrapper, that wraps every row in model object
+
+    Values from the database are trusted, so objects are hydrated
+    without validation, only fields with python_value converters are converted
+    """
     def __init__(self, cursor, model_cls: Type["Model"]):
         super().__init__(cursor)
         self.model_cls = model_cls
+        self.converters = None
 
-    def process_row(self, row):
-        row = super().process_row(row)
-
-        pk_name = self.model_cls.meta.pk_name
-        pk_value = row.pop(pk_name)
+    def initialize(self):
+        self._initialize_columns()
+        fields = self.model_cls.meta.fields
+        self.converters = [
+            (column, fields[column].python_value) for column in self.columns
+            if column in fields and fields[column].converts_python_value
+        ]
 
-        row = self.model_cls(**row)
-        row._pk = pk_value
-        setattr(row, pk_name, pk_value)
-        return row
+    def process_row(self, row):
+        row = self._row_to_dict(row)
+        for column, python_value in self.converters:
+            row[column] = python_value(row[column])
+        return self.model_cls.from_db(row)
 
 
 class SelectQuery(Query):
@@ -375,81 +1070,272 @@ class SelectQuery(Query):
     .group_by()
     .other_stuff()
     """
-    def __init__(self, model_cls: Type["Model"], sql=None):
+    def __init__(self, model_cls: Type["Model"], sql=None, params=None):
         super().__init__(model_cls)
-        self.fields_names = ','.join(self.model_cls.meta.fields)
-        self.sql = sql or f'SELECT {self.fields_names} FROM {self.model_cls.meta.table_name}'
+        meta = self.model_cls.meta
+        self.deferred = {f_name for f_name, f in meta.fields.items() if f.lazy}
+        self.fields_names = self._fields_names()
+        self.params = tuple(params or ())
+
+        self._where = None
+        self._order_by = []
+        self.orderings: List[Ordering] = []
+        self.limit_value = None
+
+        self.sql = sql or self._build_sql()
+
+        self._cached = False
+        self._cache_ttl = None
+
+    def _fields_names(self):
+        return ','.join(f_name for f_name in self.model_cls.meta.fields
+                        if f_name not in self.deferred)
+
+    def _from_sql(self):
+        return self.model_cls.meta.table_name
+
+    def _build_sql(self, extra_columns=()):
+        fields_names = ','.join([self.fields_names, *extra_columns])
+        sql = f'SELECT {fields_names} FROM {self._from_sql()}'
+        if self._where:
+            sql += f' WHERE {self._where}'
+        if self._order_by:
+            sql += f' ORDER BY {", ".join(self._order_by)}'
+        if self.limit_value is not None:
+            sql += f' LIMIT {self.limit_value}'
+        return sql
 
     def _execute(self, database):
-        cursor = self.model_cls.meta.database.execute_sql(self.sql)
+        if self._cached:
+            cursor = self._execute_cached(database)
+        else:
+            cursor = self._fetch(database)
         return ModelObjectCursorWrapper(cursor, self.model_cls)
 
+    def _fetch(self, database):
+        if isinstance(database, ShardedDBDriver):
+            return database.select(self)
+        return database.execute_sql(self.sql, self.params)
+
+    def _execute_cached(self, database):
+        meta = self.model_cls.meta
+        cache = meta.query_cache
+        key = (database.database, self.sql, self.params)
+
+        cursor = cache.get(key)
+        if cursor is None:
+            generation = cache.generation(meta.table_name)
+            cursor = self._fetch(database)
+            description, rows = cursor.description, cursor.fetchall()
+            cache.set(key, meta.table_name, generation, description, rows,
+                      self._cache_ttl)
+            cursor = _RowsCursor(description, rows)
+        return cursor
+
+    def cached(self, ttl=None):
+        """ Opt-in result caching, ttl in seconds (None - until the table is changed) """
+        self._cached = True
+        self._cache_ttl = ttl
+        return self
+
     def where(self, expression):
         # todo: avoid sqlinj in where construction, lol
-        self.sql = f'SELECT {self.fields_names} FROM {self.model_cls.meta.table_name} WHERE {expression}'
+        self._where = expression
+        self.sql = self._build_sql()
+        return self
+
+    def order_by(self, *orderings):
+        """ Accepts fields (ascending) or orderings like Model.field.desc() """
+        self.orderings = [o if isinstance(o, Ordering) else o.asc() for o in orderings]
+        self._order_by = [o.get_sql() for o in self.orderings]
+        self.sql = self._build_sql()
+        return self
+
+    def limit(self, limit: int):
+        self.limit_value = int(limit)
+        self.sql = self._build_sql()
+        return self
+
+    def defer(self, *fields):
+        """ Excludes fields from the select, they will be loaded on the first access """
+        meta = self.model_cls.meta
+        names = {f if isinstance(f, str) else f.name for f in fields}
+        if meta.pk_name in names:
+            raise ValueError(f'Primary key {meta.pk_name} can not be deferred')
+        self.deferred |= names
+        self.fields_names = self._fields_names()
+        self.sql = self._build_sql()
+        return self
+
+    def undefer(self, *fields):
+        """ Loads lazy fields (all if not passed) for the whole result set at once """
+        if fields:
+            self.deferred -= {f if isinstance(f, str) else f.name for f in fields}
+        else:
+            self.deferred = set()
+        self.fields_names = self._fields_names()
+        self.sql = self._build_sql()
+        return self
+
+    def shard(self, shard_key_value):
+        """ Restricts sharded select to the shard of the key instead of fan-out """
+        self.shard_key_value = shard_key_value
         return self
 
     def __iter__(self):
-        return iter(self.execute(self.model_cls.meta.database))
+        return iter(self.execute())
 
     def get(self):
         # todo: handle DoesNotExists case
-        return self.execute(self.model_cls.meta.database)[0]
+        return self.execute()[0]
+
+
+class SearchQuery(SelectQuery):
+    """
+    Full-text search query over Meta.fts fields,
+    allows usage like Model.search('query').where(expression).order_by_rank()
+
+    matching rowids are taken from the fts5 index, so there is no full scan
+    """
+    fts_alias = '_fts'
+
+    def __init__(self, model_cls: Type["Model"], match: str):
+        if not model_cls.meta.fts:
+            raise ValueError(f'There is no fts fields in {model_cls.__name__}.Meta')
+        super().__init__(model_cls, params=(match,))
+
+    def _from_sql(self):
+        meta = self.model_cls.meta
+        fts_table = TableSchema.fts_table_name(self.model_cls)
+        return (f'{meta.table_name} JOIN (SELECT rowid, rank FROM {fts_table} '
+                f'WHERE {fts_table} MATCH ?) AS {self.fts_alias} '
+                f'ON {self.fts_alias}.rowid = {meta.table_name}.{meta.pk_name}')
+
+    def order_by_rank(self):
+        # bm25 rank, the lower is the better
+        # (ranks of different shards are not comparable, so they are not merged)
+        self.orderings = []
+        self._order_by = [f'{self.fts_alias}.rank']
+        self.sql = self._build_sql()
+        return self
 
 
 class InsertQuery(Query):
     """ Insert query """
+    is_write = True
+
     def __init__(self, model_cls, **insert_fields):
         super().__init__(model_cls)
         self.insert_fields = insert_fields
+        if model_cls.meta.shard_key:
+            self.shard_key_value = insert_fields.get(model_cls.meta.shard_key)
 
-    def _execute(self, database: "DBDriver"):
+    def compile(self):
         meta = self.model_cls.meta
 
         # filtering autoincrement keys
-        fields = [f_name for f_name, f in meta.fields.items() if not isinstance(f, AutoField)]
-        values = [self.insert_fields[f_name] for f_name in fields]
+        fields = [f for f in meta.fields.values() if not isinstance(f, AutoField)]
+        params = tuple(f.db_value(self.insert_fields[f.name]) for f in fields)
 
-        fields = ','.join(str(v) for v in fields)
-        values = ','.join(repr(v) for v in values)
+        columns = ','.join(f.name for f in fields)
+        placeholders = ','.join('?' for _ in fields)
 
-        sql = f'INSERT INTO {meta.table_name}({fields}) VALUES ({values})'
+        sql = f'INSERT INTO {meta.table_name}({columns}) VALUES ({placeholders})'
+        return sql, params
 
-        cursor = database.execute_sql(sql)
+    def _execute(self, database: "DBDriver"):
+        sql, params = self.compile()
+        cursor = database.execute_sql(sql, params)
         last_insert_id = database.last_insert_id(cursor)
         return last_insert_id
 
 
+class InsertManyQuery(Query):
+    """ Bulk insert query, validates rows column-wise and inserts them by batches """
+    is_write = True
+
+    def __init__(self, model_cls, rows, batch_size=1000, with_pk=False):
+        super().__init__(model_cls)
+        self.rows = rows
+        self.batch_size = batch_size
+        # e.g. for moving tables with their ids
+        self.with_pk = with_pk
+
+    def _execute(self, database: "DBDriver"):
+        meta = self.model_cls.meta
+
+        # filtering autoincrement keys
+        fields = [
+            f_name for f_name, f in meta.fields.items()
+            if not isinstance(f, AutoField) or self.with_pk and f_name == meta.pk_name
+        ]
+        exclude = (meta.pk_name,) if self.with_pk else ()
+        columns = ','.join(fields)
+        placeholders = ','.join('?' for _ in fields)
+        sql = f'INSERT INTO {meta.table_name}({columns}) VALUES ({placeholders})'
+
+        inserted = 0
+        rows = iter(self.rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            columns = self.model_cls.validate_many(batch, exclude=exclude)
+            shard_keys = columns[meta.shard_key] if meta.shard_key else None
+            for f_name in fields:
+                field = meta.fields[f_name]
+                if field.converts_db_value:
+                    columns[f_name] = list(map(field.db_value, columns[f_name]))
+            params = zip(*(columns[f_name] for f_name in fields))
+            if isinstance(database, ShardedDBDriver):
+                database.execute_many_sharded(sql, params, shard_keys)
+            else:
+                database.execute_many_sql(sql, params)
+            inserted += len(batch)
+        return inserted
+
+
 class UpdateQuery(Query):
     """ Update query """
+    is_write = True
+
     def __init__(self, model_cls, **update_fields):
         super().__init__(model_cls)
+        shard_key = model_cls.meta.shard_key
+        if shard_key in update_fields:
+            raise ValueError(f'Shard key {shard_key!r} can not be updated, '
+                             f'rows are not moved between shards')
+        # without shard key (it's set by Model.save) update goes to all shards
         self.insert_fields = update_fields
         self.sql = None  # todo
+        self.params = ()
 
     def where(self, expression):
         meta = self.model_cls.meta
 
-        # filtering autoincrement keys
-        fields = [f_name for f_name, f in meta.fields.items() if not isinstance(f, AutoField)]
-        values = [self.insert_fields[f_name] for f_name in fields]
+        # filtering autoincrement keys, only passed fields are updated
+        fields = [f for f in meta.fields.values()
+                  if not isinstance(f, AutoField) and f.name in self.insert_fields]
+        self.params = tuple(f.db_value(self.insert_fields[f.name]) for f in fields)
 
-        update_set_sql = ', '.join(
-            f'{f_name} = {f_value!r}'
-            for f_name, f_value in zip(fields, values)
-        )
+        update_set_sql = ', '.join(f'{f.name} = ?' for f in fields)
 
         self.sql = f'UPDATE {meta.table_name} SET {update_set_sql} WHERE {expression}'
         return self
 
+    def compile(self):
+        return self.sql, self.params
+
     def _execute(self, database):
-        cursor = database.execute_sql(self.sql)
+        cursor = database.execute_sql(self.sql, self.params)
         last_insert_id = database.last_insert_id(cursor)
         return last_insert_id
 
 
 class DeleteQuery(Query):
     """ Delete query """
+    is_write = True
+
     def __init__(self, model_cls):
         super().__init__(model_cls)
         self.sql = None  # todo
@@ -458,12 +1344,240 @@ class DeleteQuery(Query):
         self.sql = f'DELETE FROM {self.model_cls.meta.table_name} WHERE {expression}'
         return self
 
+    def compile(self):
+        return self.sql, ()
+
     def _execute(self, database):
         cursor = database.execute_sql(self.sql)
         last_insert_id = database.last_insert_id(cursor)
         return last_insert_id
 
 
+class BufferedWriteError(RuntimeError):
+    """ Writes of the BufferedWriter failed since the last flush, carries the errors """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f'{len(errors)} buffered writes failed, the first one: '
+                         f'{errors[0]!r}')
+
+
+@dataclass
+class _BufferedWrite:
+    """ Write query waiting in the BufferedWriter buffer """
+    sql: str
+    params: tuple
+    model_cls: Type["Model"]
+    future: Future
+
+
+class BufferedWriter:
+    """
+    Write-behind writer for high-frequency Model.save/create traffic
+
+    Attaches to the driver, after that inserts, updates and deletes of models
+    are queued from any thread and written on the background thread by batches,
+    one transaction per batch (by batch_size or every flush_interval seconds).
+    If the buffer is full callers are blocked (back-pressure).
+
+    Writer uses its own connection, so only file databases are supported.
+    Ids of inserted objects are assigned after their batch is committed,
+    flush() waits for everything queued before it and raises BufferedWriteError
+    if some writes failed since the previous flush (e.g. updates from Model.save,
+    whose futures are not returned), close() flushes and stops the thread.
+    If the writer thread fails (e.g. can't connect), all queued writes fail with
+    its error and the writer is closed
+    """
+    def __init__(self, database: DBDriver, batch_size=500, flush_interval=0.5,
+                 max_buffer=10000, put_timeout=None):
+        if database.database == ':memory:':
+            raise ValueError('BufferedWriter needs file database, not :memory:')
+        if database.writer is not None:
+            raise RuntimeError('Database already has a writer')
+
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._buffer = queue.Queue(maxsize=max_buffer)
+        self._closed = False
+        self._error: Exception = None  # writer thread has failed with it
+        self._failed: List[Exception] = []  # errors of writes since the last flush
+        self._failed_lock = threading.Lock()
+
+        self.flushes = 0
+        self.written = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f'BufferedWriter({database.database})', daemon=True
+        )
+        self._thread.start()
+        database.writer = self
+
+    def submit(self, query: Query) -> Future:
+        """ Queues compiled write query, future result is the last insert id """
+        self._check_open()
+        sql, params = query.compile()
+        write = _BufferedWrite(sql, params, query.model_cls, Future())
+        # blocks when buffer is full, raises queue.Full after put_timeout
+        self._put(write, timeout=self.put_timeout)
+        return write.future
+
+    def flush(self, timeout=None):
+        """ Durability barrier, waits until everything queued before is committed """
+        self._check_open()
+        barrier = Future()
+        self._put(barrier)
+        barrier.result(timeout)
+        self._raise_failed()
+
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        try:
+            if self._error is None:
+                self.flush(timeout)
+        finally:
+            self._closed = True
+            if self._error is None:
+                self._buffer.put(None)
+                self._thread.join(timeout)
+            self.database.writer = None
+
+    def _check_open(self):
+        if self._error is not None:
+            raise RuntimeError('BufferedWriter has failed') from self._error
+        if self._closed:
+            raise RuntimeError('BufferedWriter is closed')
+
+    def _put(self, item, timeout=None):
+        self._buffer.put(item, timeout=timeout)
+        if self._error is not None:  # writer has died while we were putting
+            self._fail_queued()
+
+    def _raise_failed(self):
+        with self._failed_lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            raise BufferedWriteError(failed)
+
+    def _run(self):
+        try:
+            conn = self.database._connect()
+        except Exception as e:
+            logging.exception('BufferedWriter failed to connect')
+            self._fail(e)
+            return
+        batch, barrier = [], None
+        try:
+            while True:
+                batch, barrier, stop = self._collect()
+                if batch:
+                    self._write(conn, batch)
+                if barrier is not None:
+                    barrier.set_result(None)
+                if stop:
+                    return
+        except Exception as e:
+            logging.exception('BufferedWriter failed')
+            self._fail(e, batch + [barrier])
+        finally:
+            conn.close()
+
+    def _fail(self, error: Exception, taken=()):
+        # error is set before the draining, so the racing puts drain after themselves
+        self._error = error
+        for item in taken:
+            self._fail_item(item)
+        self._fail_queued()
+
+    def _fail_queued(self):
+        while True:
+            try:
+                item = self._buffer.get_nowait()
+            except queue.Empty:
+                return
+            self._fail_item(item)
+
+    def _fail_item(self, item):
+        future = item.future if isinstance(item, _BufferedWrite) else item
+        if future is not None and not future.done():
+            future.set_exception(self._error)
+
+    def _collect(self):
+        # waits for the first write, then collects batch until size or interval limit
+        batch = []
+        item = self._buffer.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is None:
+                return batch, None, True
+            if isinstance(item, Future):
+                return batch, item, False
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, None, False
+            try:
+                item = self._buffer.get(timeout=remaining)
+            except queue.Empty:
+                return batch, None, False
+
+    def _write(self, conn, batch: List[_BufferedWrite]):
+        try:
+            cursor = conn.cursor()
+            results = []
+            for write in batch:
+                cursor.execute(write.sql, write.params)
+                results.append(cursor.lastrowid)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # one bad write should not fail the whole batch
+            logging.exception('Batch write failed, retrying writes one by one')
+            for write in batch:
+                self._write_one(conn, write)
+        else:
+            for write, result in zip(batch, results):
+                write.future.set_result(result)
+        finally:
+            self._invalidate(batch)
+
+        self.flushes += 1
+        self.written += len(batch)
+
+    def _write_one(self, conn, write: _BufferedWrite):
+        try:
+            cursor = conn.execute(write.sql, write.params)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            write.future.set_exception(e)
+            with self._failed_lock:
+                self._failed.append(e)
+        else:
+            write.future.set_result(cursor.lastrowid)
+
+    @staticmethod
+    def _invalidate(batch: List[_BufferedWrite]):
+        for model_cls in {write.model_cls for write in batch}:
+            model_cls.meta.query_cache.invalidate(model_cls.meta.table_name)
+
+
+TRANSFER_FORMATS = ('jsonl', 'csv')
+
+
+@dataclass
+class TransferStats:
+    """ Import/export statistics container """
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
 class TableSchema:
     """ Class for table schema generation """
     def __init__(self, model_cls: Type["Model"]):
@@ -484,6 +1598,48 @@ class TableSchema:
         sql = f'DROP TABLE {self.model_cls.meta.table_name}'
         return sql
 
+    @staticmethod
+    def fts_table_name(model_cls: Type["Model"]):
+        return f'{model_cls.meta.table_name}_fts'
+
+    def create_fts(self) -> List[str]:
+        """
+        External content fts5 table over Meta.fts fields and triggers,
+        that keep it in sync with the model table on every insert/update/delete
+        """
+        meta = self.model_cls.meta
+        if not meta.fts:
+            return []
+        table, pk = meta.table_name, meta.pk_name
+        fts_table = self.fts_table_name(self.model_cls)
+        columns = ', '.join(meta.fts)
+        new_values = ', '.join(f'new.{f_name}' for f_name in meta.fts)
+        old_values = ', '.join(f'old.{f_name}' for f_name in meta.fts)
+
+        insert_sql = (f'INSERT INTO {fts_table}(rowid, {columns}) '
+                      f'VALUES (new.{pk}, {new_values});')
+        delete_sql = (f'INSERT INTO {fts_table}({fts_table}, rowid, {columns}) '
+                      f"VALUES ('delete', old.{pk}, {old_values});")
+        return [
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5('
+            f"{columns}, content='{table}', content_rowid='{pk}')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} '
+            f'BEGIN {insert_sql} END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} '
+            f'BEGIN {delete_sql} END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table} '
+            f'BEGIN {delete_sql} {insert_sql} END',
+        ]
+
+    def rebuild_fts(self):
+        # e.g. after fts was added to the model with existing rows
+        fts_table = self.fts_table_name(self.model_cls)
+        return f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"
+
+    def drop_fts(self):
+        # triggers are dropped together with the model table
+        return f'DROP TABLE IF EXISTS {self.fts_table_name(self.model_cls)}'
+
 
 class Model(metaclass=ModelMeta):
     """ Base class for all orm models """
@@ -496,15 +1652,141 @@ class Model(metaclass=ModelMeta):
 
         self._pk = None
 
+    @classmethod
+    def from_db(cls, row: dict) -> "Model":
+        """ Hydrates object from already converted db row, bypassing validation """
+        inst = cls.__new__(cls)
+        inst.__dict__.update(row)
+        inst._pk = row.get(cls.meta.pk_name)
+        if cls.meta.shard_key:
+            inst._saved_shard_key = row.get(cls.meta.shard_key)
+        return inst
+
     @classmethod
     def create_table(cls):
-        sql = TableSchema(cls).create_table()
-        return cls.meta.database.execute_sql(sql)
+        schema = TableSchema(cls)
+        cursor = cls.meta.database.execute_sql(schema.create_table())
+        for sql in schema.create_fts():
+            cls.meta.database.execute_sql(sql)
+        return cursor
+
+    @classmethod
+    def rebuild_fts(cls):
+        return cls.meta.database.execute_sql(TableSchema(cls).rebuild_fts())
+
+    @classmethod
+    def search(cls, match: str) -> SearchQuery:
+        return SearchQuery(cls, match)
 
     @classmethod
     def insert(cls, **insert_fields):
         return InsertQuery(cls, **insert_fields)
 
+    @classmethod
+    def insert_many(cls, rows, batch_size=1000, with_pk=False):
+        return InsertManyQuery(cls, rows, batch_size, with_pk)
+
+    @classmethod
+    def export(cls, path, format='jsonl', batch_size=1000) -> "TransferStats":
+        """ Streams the whole table to jsonl or csv file """
+        if format not in TRANSFER_FORMATS:
+            raise ValueError(f'Unknown export format {format!r}, '
+                             f'expected one of {TRANSFER_FORMATS}')
+        started = time.monotonic()
+
+        fields = list(cls.meta.fields.values())
+        names = [field.name for field in fields]
+        serializers = [field.serialize for field in fields]
+
+        query = cls.select().undefer()
+        database = cls.meta.router.db_for_query(query).route(query)
+        # sharded tables are streamed shard by shard
+        if isinstance(database, ShardedDBDriver):
+            databases = database.shards
+        else:
+            databases = [database]
+
+        exported = 0
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if format == 'csv':
+                writer = csv.writer(f)
+                writer.writerow(names)
+            for database in databases:
+                cursor = database.execute_sql(query.sql, query.params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    exported += len(rows)
+                    rows = ([serialize(v) for serialize, v in zip(serializers, row)]
+                            for row in rows)
+                    if format == 'csv':
+                        writer.writerows(rows)
+                    else:
+                        f.writelines(json.dumps(dict(zip(names, row))) + '\n'
+                                     for row in rows)
+                cursor.close()
+
+        stats = TransferStats(exported, time.monotonic() - started)
+        logging.info('Exported %s rows of %s to %s, %.1f rows/sec',
+                     stats.rows, cls.meta.table_name, path, stats.rows_per_sec)
+        return stats
+
+    @classmethod
+    def import_(cls, path, format=None, batch_size=1000,
+                with_pk=False) -> "TransferStats":
+        """
+        Streams rows from jsonl or csv file (format is guessed by extension if not set)
+        to the table through bulk insert, one transaction per batch
+        """
+        format = format or ('csv' if str(path).endswith('.csv') else 'jsonl')
+        if format not in TRANSFER_FORMATS:
+            raise ValueError(f'Unknown import format {format!r}, '
+                             f'expected one of {TRANSFER_FORMATS}')
+        started = time.monotonic()
+
+        # without with_pk ids from the file are dropped and generated again
+        deserializers = {f_name: f.deserialize for f_name, f in cls.meta.fields.items()
+                         if with_pk or f_name != cls.meta.pk_name}
+
+        with open(path, newline='', encoding='utf-8') as f:
+            if format == 'csv':
+                records = csv.DictReader(f)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            rows = ({f_name: deserializers[f_name](value)
+                     for f_name, value in record.items() if f_name in deserializers}
+                    for record in records)
+            imported = cls.insert_many(rows, batch_size, with_pk).execute()
+
+        stats = TransferStats(imported, time.monotonic() - started)
+        logging.info('Imported %s rows to %s from %s, %.1f rows/sec',
+                     stats.rows, cls.meta.table_name, path, stats.rows_per_sec)
+        return stats
+
+    @classmethod
+    def validate_many(cls, rows: List[dict], exclude=()) -> dict:
+        """
+        Validates rows column by column instead of instance by instance,
+        returns columns dict {field_name: values} or raises ValidationError with all
+        the errors
+
+        fields from exclude are collected to columns without validation
+        """
+        columns = {}
+        errors = []
+        for field_name, field in cls.meta.fields.items():
+            column = [row.get(field_name) for row in rows]
+            columns[field_name] = column
+            if field_name in exclude:
+                continue
+            errors.extend((i, field_name, msg) for i, msg in field.validate_many(column))
+
+        if errors:
+            errors.sort(key=lambda e: e[0])
+            raise ValidationError(errors)
+        return columns
+
     @classmethod
     def update(cls, **update_fields):
         return UpdateQuery(cls, **update_fields)
@@ -528,24 +1810,134 @@ class Model(metaclass=ModelMeta):
         return DeleteQuery(cls)
 
     def delete_instance(self):
-        return self.delete().where(self._pk_expr()).execute(self.meta.database)
+        self._wait_pending_insert()
+        query = self.delete().where(self._pk_expr())
+        if self.meta.shard_key:
+            query.shard_key_value = self._shard_key_value()
+        database = self.meta.router.db_for_query(query).route(query)
+        if database.writer is not None:
+            return database.writer.submit(query)
+        return query.execute(database)
 
     def save(self):
-        field_dict = {f_name: getattr(self, f_name) for f_name in self.meta.fields}
+        self._wait_pending_insert()
+        shard_key = self.meta.shard_key
+        if shard_key:
+            shard_key_value = self._shard_key_value()  # can't route without it
+        # deferred fields, that weren't loaded, are not changed, so they are not saved
+        field_dict = {f_name: self.__dict__[f_name] for f_name in self.meta.fields
+                      if f_name in self.__dict__}
         if not self._pk:
-            last_insert_id = self.insert(**field_dict).execute(self.meta.database)
+            if shard_key:
+                self._saved_shard_key = shard_key_value
+            query = self.insert(**field_dict)
+            database = self.meta.router.db_for_query(query).route(query)
+            if database.writer is not None:
+                # id will be assigned after the write-behind flush
+                self._pending_insert = database.writer.submit(query)
+                self._pending_insert.add_done_callback(self._set_pk_from_insert)
+                return 1
+            last_insert_id = query.execute(database)
             self._pk = last_insert_id
             setattr(self, self.meta.pk_name, self._pk)
             return 1
         else:
-            self.update(**field_dict).where(self._pk_expr()).execute(self.meta.database)
+            if shard_key:
+                if field_dict.pop(shard_key) != shard_key_value:
+                    raise ValueError(f'Shard key {shard_key!r} can not be changed, '
+                                     f'rows are not moved between shards')
+            if not any(f_name != self.meta.pk_name for f_name in field_dict):
+                return 0  # only pk is loaded, so there is nothing to update
+            query = self.update(**field_dict).where(self._pk_expr())
+            if shard_key:
+                query.shard_key_value = shard_key_value
+            database = self.meta.router.db_for_query(query).route(query)
+            if database.writer is not None:
+                database.writer.submit(query)
+                return 1
+            query.execute(database)
             return 1
 
+    def _shard_key_value(self):
+        # the key the row was saved with, the instance value may be changed since
+        saved = self.__dict__.get('_saved_shard_key')
+        return saved if saved is not None else getattr(self, self.meta.shard_key)
+
+    def _set_pk_from_insert(self, future: Future):
+        if future.exception() is None:
+            self._pk = future.result()
+            setattr(self, self.meta.pk_name, self._pk)
+
+    def _wait_pending_insert(self):
+        # object can't be updated or deleted until its buffered insert is written
+        pending_insert = self.__dict__.pop('_pending_insert', None)
+        if pending_insert is not None:
+            pending_insert.result()
+
     def __repr__(self):
         model_name = type(self).__name__
-        kwargs = ', '.join(f'{f}={getattr(self, f, None)!r}' for f in sorted(self.meta.fields))
+        kwargs = ', '.join(
+            f'{f}={getattr(self, f)!r}' if f in self.__dict__ else f'{f}=<deferred>'
+            for f in sorted(self.meta.fields)
+        )
         return f'{model_name}({kwargs})'
 
+    def load_deferred_field(self, field: Field):
+        if self._pk is None:
+            raise AttributeError(
+                f'{type(self).__name__} object has no value for {field.name}'
+            )
+        self.load_deferred([self], field)
+        if field.name not in self.__dict__:  # row is deleted or filtered out
+            raise AttributeError(
+                f'{type(self).__name__} row with {self.meta.pk_name}={self._pk!r} '
+                f'is not found for loading {field.name}'
+            )
+        return getattr(self, field.name)
+
+    @classmethod
+    def load_deferred(cls, instances: List["Model"], *fields, batch_size=500):
+        """
+        Loads deferred fields (all not loaded lazy fields if not passed)
+        for already fetched instances by batched selects
+        """
+        meta = cls.meta
+        if fields:
+            names = [f if isinstance(f, str) else f.name for f in fields]
+        else:
+            names = [f_name for f_name, f in meta.fields.items() if f.lazy]
+        converters = [(f_name, meta.fields[f_name].python_value) for f_name in names
+                      if meta.fields[f_name].converts_python_value]
+        columns = ','.join([meta.pk_name] + names)
+
+        # ids are unique only within a shard, so sharded instances are loaded by shards
+        groups = defaultdict(list)
+        for inst in instances:
+            if inst._pk is not None:
+                key = inst.__dict__.get(meta.shard_key) if meta.shard_key else None
+                groups[key].append(inst)
+
+        for shard_key_value, group in groups.items():
+            for i in range(0, len(group), batch_size):
+                batch = {inst._pk: inst for inst in group[i:i + batch_size]}
+                placeholders = ','.join('?' for _ in batch)
+                query = SelectQuery(
+                    cls,
+                    sql=f'SELECT {columns} FROM {meta.table_name} '
+                        f'WHERE {meta.pk_name} IN ({placeholders})',
+                    params=tuple(batch),
+                ).shard(shard_key_value)
+                database = meta.router.db_for_query(query).route(query)
+                for row in query._fetch(database).fetchall():
+                    values = dict(zip(names, row[1:]))
+                    for f_name, python_value in converters:
+                        values[f_name] = python_value(values[f_name])
+                    inst = batch.get(row[0])
+                    if inst is not None:
+                        for f_name, value in values.items():
+                            # don't overwrite changed values
+                            inst.__dict__.setdefault(f_name, value)
+
     def _pk_expr(self):
         # util for using .where for current obj
         return self.meta.pk_field == self._pk
@@ -558,7 +1950,10 @@ class Model(metaclass=ModelMeta):
     @classmethod
     def drop_table(cls):
         if cls.table_exists():
-            sql = TableSchema(cls).drop_table()
-            return cls.meta.database.execute_sql(sql)
+            schema = TableSchema(cls)
+            cls.meta.query_cache.invalidate(cls.meta.table_name)
+            if cls.meta.fts:
+                cls.meta.database.execute_sql(schema.drop_fts())
+            return cls.meta.database.execute_sql(schema.drop_table())
         else:
             return None
@@ -0,0 +1,12 @@
+import pytest
+
+from hw_1_orm.orm import SQLiteDBDriver
+
+
+@pytest.fixture
+def db(tmp_path):
+    # file database, e.g. buffered writer and replicas need a file
+    database = SQLiteDBDriver(str(tmp_path / 'test.db'))
+    database.connect()
+    yield database
+    database.close()
@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+
+import pytest
+
+from hw_1_orm.orm import (
+    Model, CharField, SQLiteDBDriver, BufferedWriter, BufferedWriteError,
+)
+
+
+@pytest.fixture
+def user_model(db):
+    class User(Model):
+        name = CharField()
+
+        class Meta:
+            database = db
+
+    db.create_tables([User])
+    return User
+
+
+def test_creates_are_written_by_batches(db, user_model):
+    writer = BufferedWriter(db, batch_size=50, flush_interval=0.05)
+    threads = [
+        threading.Thread(target=lambda k=k: [user_model.create(name=f'{k}-{i}')
+                                             for i in range(100)])
+        for k in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.flush()
+    assert len(list(user_model.select())) == 400
+    assert writer.written == 400
+    assert writer.flushes < 400
+    writer.close()
+    assert db.writer is None
+
+
+def test_pk_is_assigned_after_flush(db, user_model):
+    writer = BufferedWriter(db)
+    user = user_model.create(name='a')
+    writer.flush()
+    assert user.id is not None
+    user.name = 'b'
+    user.save()
+    writer.close()
+    assert user_model.get(user_model.meta.pk_field == user.id).name == 'b'
+
+
+def test_failed_update_is_raised_on_flush(db, user_model):
+    writer = BufferedWriter(db)
+    user = user_model.create(name='a')
+    writer.flush()
+    db.execute_sql('CREATE TRIGGER no_updates BEFORE UPDATE ON user '
+                   "BEGIN SELECT RAISE(ABORT, 'read only'); END")
+    user.name = 'b'
+    user.save()  # future is not returned to the caller
+    with pytest.raises(BufferedWriteError) as error:
+        writer.flush()
+    assert isinstance(error.value.errors[0], sqlite3.IntegrityError)
+    writer.flush()  # errors are reported once
+    writer.close()
+
+
+def test_submit_and_flush_after_close_raise(db, user_model):
+    writer = BufferedWriter(db)
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.flush(timeout=1)
+    with pytest.raises(RuntimeError):
+        writer.submit(user_model.insert(name='a'))
+
+
+def test_failed_connect_fails_writes_instead_of_hanging(tmp_path, user_model):
+    broken = SQLiteDBDriver(str(tmp_path / 'no' / 'such' / 'dir.db'))
+    writer = BufferedWriter(broken)
+    writer._thread.join(1)
+    with pytest.raises(RuntimeError) as error:
+        writer.flush(timeout=1)
+    assert isinstance(error.value.__cause__, sqlite3.OperationalError)
+    with pytest.raises(RuntimeError):
+        writer.submit(user_model.insert(name='a'))
+    writer.close()
+    assert broken.writer is None
+
+
+def test_queued_writes_fail_when_writer_dies(tmp_path, user_model):
+    broken = SQLiteDBDriver(str(tmp_path / 'no' / 'such' / 'dir.db'))
+    connected = threading.Event()
+    connect = broken._connect
+
+    def slow_connect():
+        connected.wait(1)
+        return connect()
+
+    broken._connect = slow_connect
+    writer = BufferedWriter(broken)
+    future = writer.submit(user_model.insert(name='a'))
+    connected.set()
+    with pytest.raises(sqlite3.OperationalError):
+        future.result(timeout=1)
@@ -0,0 +1,47 @@
+import pytest
+
+from hw_1_orm.orm import Model, CharField, IntegerField, ValidationError
+
+
+@pytest.fixture
+def user_model(db):
+    class User(Model):
+        name = CharField()
+        age = IntegerField(null=True)
+
+        class Meta:
+            database = db
+
+    db.create_tables([User])
+    return User
+
+
+def test_validate_many_returns_columns(user_model):
+    columns = user_model.validate_many([{'name': 'a', 'age': 1}, {'name': 'b'}])
+    assert columns['name'] == ['a', 'b']
+    assert columns['age'] == [1, None]
+
+
+def test_validate_many_reports_all_errors(user_model):
+    with pytest.raises(ValidationError) as e:
+        rows = [{'name': 'a'}, {'name': 1}, {}, {'id': 5, 'name': 'c'}]
+        user_model.validate_many(rows)
+    assert [(i, name) for i, name, _ in e.value.errors] == [
+        (1, 'name'), (2, 'name'), (3, 'id')
+    ]
+    assert isinstance(e.value, ValueError)
+
+
+def test_insert_many_by_batches(user_model):
+    rows = ({'name': f'u{i}', 'age': i} for i in range(25))
+    assert user_model.insert_many(rows, batch_size=10).execute() == 25
+    users = list(user_model.select().order_by(user_model.age.desc()))
+    assert len(users) == 25
+    assert (users[0].name, users[0].age) == ('u24', 24)
+
+
+def test_insert_many_does_not_insert_invalid_batch(user_model):
+    rows = [{'name': 'ok'}, {'name': None}]
+    with pytest.raises(ValidationError):
+        user_model.insert_many(rows).execute()
+    assert list(user_model.select()) == []
@@ -0,0 +1,109 @@
+import datetime
+
+import pytest
+
+from hw_1_orm.orm import (
+    Model, CharField, FloatField, BooleanField, DateTimeField, BlobField, JSONField,
+    ValidationError,
+)
+
+MOMENT = datetime.datetime(2020, 5, 17, 12, 30, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def event_model(db):
+    class Event(Model):
+        title = CharField()
+        score = FloatField()
+        active = BooleanField()
+        at = DateTimeField()
+        data = BlobField()
+        payload = JSONField(null=True)
+
+        class Meta:
+            database = db
+
+    db.create_tables([Event])
+    return Event
+
+
+def test_typed_values_round_trip(event_model):
+    event_model.create(title="it's", score=1.5, active=True, at=MOMENT,
+                       data=b'\x00\x01', payload={'tags': ['a', 'b']})
+    event = event_model.select().where(event_model.title == "it's").get()
+    assert event.score == 1.5
+    assert event.active is True
+    assert event.at == MOMENT
+    assert isinstance(event.data, memoryview)
+    assert bytes(event.data) == b'\x00\x01'
+    assert event.payload == {'tags': ['a', 'b']}
+
+
+def test_null_and_empty_values_round_trip(event_model):
+    event_model.create(title='t', score=0, active=False, at=MOMENT,
+                       data=b'', payload=None)
+    event = event_model.select().get()
+    assert event.active is False
+    assert bytes(event.data) == b''
+    assert event.payload is None
+
+
+def test_json_is_decoded_lazily_and_saved_as_is(event_model):
+    event_model.create(title='t', score=0, active=True, at=MOMENT, data=b'',
+                       payload=[1, 2])
+    event = event_model.select().get()
+    assert type(event.__dict__['payload']).__name__ == '_LazyJSON'
+    event.title = 'renamed'
+    event.save()
+    assert event_model.select().get().payload == [1, 2]
+
+
+@pytest.mark.parametrize('field, value', [
+    ('score', 'fast'),
+    ('active', 1),
+    ('at', '2020-05-17'),
+    ('data', 'text'),
+    ('payload', {1, 2}),
+])
+def test_bad_values_are_rejected(event_model, field, value):
+    row = dict(title='t', score=0.5, active=True, at=MOMENT, data=b'', payload=None)
+    row[field] = value
+    with pytest.raises(ValueError):
+        event_model.create(**row)
+    with pytest.raises(ValidationError):
+        event_model.validate_many([row])
+
+
+@pytest.fixture
+def optional_event_model(db):
+    class OptionalEvent(Model):
+        score = FloatField(null=True)
+        active = BooleanField(null=True)
+        at = DateTimeField(null=True)
+        data = BlobField(null=True)
+
+        class Meta:
+            database = db
+
+    db.create_tables([OptionalEvent])
+    return OptionalEvent
+
+
+def test_nullable_fields_take_nulls(optional_event_model):
+    optional_event_model.create(score=None, active=None, at=None, data=None)
+    event = optional_event_model.select().get()
+    assert (event.score, event.active, event.at, event.data) == (None,) * 4
+
+
+@pytest.mark.parametrize('field, value', [
+    ('score', 'fast'),
+    ('active', 'yes'),
+    ('at', '2020-05-17'),
+    ('data', 'text'),
+])
+def test_nullable_fields_reject_bad_values(optional_event_model, field, value):
+    with pytest.raises(ValueError):
+        optional_event_model.create(**{field: value})
+    with pytest.raises(ValidationError):
+        optional_event_model.validate_many([{field: value}])
+    assert list(optional_event_model.select()) == []
@@ -0,0 +1,75 @@
+import pytest
+
+from hw_1_orm.orm import Model, CharField, IntegerField
+
+
+@pytest.fixture
+def post_model(db):
+    class Post(Model):
+        title = CharField()
+        body = CharField()
+        views = IntegerField()
+
+        class Meta:
+            database = db
+            fts = ['title', 'body']
+
+    db.create_tables([Post])
+    Post.create(title='python orm', body='about sqlite', views=1)
+    Post.create(title='cooking', body='python recipes, python tips', views=2)
+    Post.create(title='travel', body='mountains', views=3)
+    return Post
+
+
+def test_search_finds_matching_rows(post_model):
+    titles = {p.title for p in post_model.search('python')}
+    assert titles == {'python orm', 'cooking'}
+    titles = {p.title for p in post_model.search('sqlite OR mount*')}
+    assert titles == {'python orm', 'travel'}
+
+
+def test_search_with_where_and_rank(post_model):
+    posts = list(post_model.search('python').where('views > 1'))
+    assert [p.title for p in posts] == ['cooking']
+    ranked = [p.title for p in post_model.search('python').order_by_rank()]
+    assert ranked == ['cooking', 'python orm']
+
+
+def test_index_follows_updates_and_deletes(post_model):
+    post = post_model.search('travel').get()
+    post.title = 'hiking'
+    post.save()
+    assert list(post_model.search('travel')) == []
+    assert post_model.search('hiking').get().body == 'mountains'
+
+    post_model.delete().where(post_model.title == 'hiking').execute()
+    assert list(post_model.search('mountains')) == []
+
+
+def test_rebuild_indexes_existing_rows(post_model, db):
+    db.execute_sql(f"INSERT INTO {post_model.meta.table_name}_fts"
+                   f"({post_model.meta.table_name}_fts) VALUES ('delete-all')")
+    assert list(post_model.search('python')) == []
+    post_model.rebuild_fts()
+    assert len(list(post_model.search('python'))) == 2
+
+
+def test_search_without_fts_fields_raises(db):
+    class Note(Model):
+        text = CharField()
+
+        class Meta:
+            database = db
+
+    with pytest.raises(ValueError):
+        Note.search('text')
+
+
+def test_unknown_fts_field_raises(db):
+    with pytest.raises(ValueError):
+        class Note(Model):
+            text = CharField()
+
+            class Meta:
+                database = db
+                fts = ['missing']
@@ -0,0 +1,64 @@
+import pytest
+
+from hw_1_orm.orm import Model, CharField, IntegerField, JSONField
+
+
+@pytest.fixture
+def post_model(db):
+    class Post(Model):
+        title = CharField()
+        views = IntegerField()
+        body = CharField(lazy=True)
+        meta_info = JSONField(lazy=True)
+
+        class Meta:
+            database = db
+
+    db.create_tables([Post])
+    for i in range(5):
+        Post.create(title=f't{i}', views=i, body=f'b{i}', meta_info={'i': i})
+    return Post
+
+
+def test_lazy_fields_are_not_selected(post_model):
+    post = post_model.select().where(post_model.title == 't1').get()
+    assert 'body' not in post.__dict__
+    assert 'deferred' in repr(post)
+    assert post.body == 'b1'
+    assert post.meta_info == {'i': 1}
+
+
+def test_undefer_loads_all_at_once(post_model, db):
+    posts = list(post_model.select().undefer())
+    assert all('body' in p.__dict__ for p in posts)
+
+    posts = list(post_model.select().defer('views'))
+    post_model.load_deferred(posts, 'views')
+    assert [p.views for p in posts] == list(range(5))
+
+
+def test_pk_can_not_be_deferred(post_model):
+    with pytest.raises(ValueError):
+        post_model.select().defer('id')
+
+
+def test_save_does_not_overwrite_not_loaded_fields(post_model):
+    post = post_model.select().where(post_model.title == 't2').get()
+    post.title = 'changed'
+    post.save()
+    post = post_model.select().undefer().where(post_model.title == 'changed').get()
+    assert post.body == 'b2'
+
+
+def test_save_with_only_pk_loaded_is_noop(post_model):
+    post = post_model.select().defer('title', 'views').where('views = 3').get()
+    assert post.save() == 0
+
+
+def test_deferred_field_of_deleted_row_raises(post_model):
+    post = post_model.select().where(post_model.title == 't4').get()
+    post_model.delete().where('views = 4').execute()
+    with pytest.raises(AttributeError):
+        post.body
+    with pytest.raises(AttributeError):
+        post.meta_info
@@ -0,0 +1,70 @@
+import pytest
+
+from hw_1_orm.orm import Model, CharField, IntegerField, QueryCache
+
+
+@pytest.fixture
+def cache():
+    return QueryCache()
+
+
+@pytest.fixture
+def user_model(db, cache):
+    class User(Model):
+        name = CharField()
+        age = IntegerField()
+
+        class Meta:
+            database = db
+            query_cache = cache
+
+    db.create_tables([User])
+    return User
+
+
+def test_repeated_select_is_cached(user_model, cache):
+    user_model.create(name='u1', age=42)
+    for _ in range(3):
+        users = list(user_model.select().where(user_model.age == 42).cached())
+        assert [u.name for u in users] == ['u1']
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.stats()['entries'] == 1
+
+
+def test_writes_invalidate_the_table(user_model, cache):
+    user = user_model.create(name='u1', age=42)
+    assert len(list(user_model.select().cached())) == 1
+    user_model.create(name='u2', age=1)
+    assert len(list(user_model.select().cached())) == 2
+
+    user.name = 'renamed'
+    user.save()
+    assert {u.name for u in user_model.select().cached()} == {'renamed', 'u2'}
+    assert cache.invalidations == 2
+    assert cache.hits == 0
+
+
+def test_select_racing_write_is_not_stored(cache):
+    generation = cache.generation('users')
+    cache.invalidate('users')
+    cache.set('key', 'users', generation, (), [(1,)])
+    assert cache.get('key') is None
+
+
+def test_expired_entries_are_missed(cache, monkeypatch):
+    cache.set('key', 'users', cache.generation('users'), (), [(1,)], ttl=10)
+    assert cache.get('key') is not None
+    monkeypatch.setattr('hw_1_orm.orm.time.monotonic', lambda: float('inf'))
+    assert cache.get('key') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_is_bounded_by_size():
+    cache = QueryCache(max_size=2000)
+    rows = [(i, 'x' * 10) for i in range(5)]
+    for i in range(10):
+        cache.set(i, 'users', 0, (), rows)
+    assert cache.size <= 2000
+    assert cache.evictions > 0
+    assert cache.get(9) is not None
+    assert cache.get(0) is None
@@ -0,0 +1,66 @@
+import sqlite3
+
+import pytest
+
+from hw_1_orm.orm import (
+    Model, CharField, SQLiteDBDriver, DatabaseRouter, ReadReplicaRouter,
+)
+
+
+@pytest.fixture
+def replica_dbs(db):
+    replicas = [SQLiteDBDriver(db.database, read_only=True) for _ in range(2)]
+    for replica in replicas:
+        replica.connect()
+    yield replicas
+    for replica in replicas:
+        replica.close()
+
+
+@pytest.fixture
+def user_model(db, replica_dbs):
+    class User(Model):
+        name = CharField()
+
+        class Meta:
+            database = db
+            replicas = replica_dbs
+
+    db.create_tables([User])
+    return User
+
+
+def test_selects_go_to_replicas_by_round_robin(user_model, db, replica_dbs):
+    user_model.create(name='u1')
+    router = user_model.meta.router
+    assert isinstance(router, ReadReplicaRouter)
+
+    select = user_model.select()
+    assert [router.db_for_query(select) for _ in range(3)] == [
+        replica_dbs[0], replica_dbs[1], replica_dbs[0]
+    ]
+    assert router.db_for_query(user_model.insert(name='u2')) is db
+    assert [u.name for u in user_model.select()] == ['u1']
+
+
+def test_replica_is_read_only(user_model, replica_dbs):
+    with pytest.raises(sqlite3.OperationalError):
+        user_model.insert(name='u1').execute(replica_dbs[0])
+
+
+def test_custom_router(db):
+    class EverythingToMain(DatabaseRouter):
+        pass
+
+    class Log(Model):
+        text = CharField()
+
+        class Meta:
+            database = db
+            router = EverythingToMain
+
+    db.create_tables([Log])
+    Log.create(text='t')
+    assert isinstance(Log.meta.router, EverythingToMain)
+    assert Log.meta.router.db_for_query(Log.select()) is db
+    assert [log.text for log in Log.select()] == ['t']
@@ -0,0 +1,103 @@
+import pytest
+
+from hw_1_orm.orm import (
+    Model, CharField, IntegerField, SQLiteDBDriver, ShardedDBDriver,
+)
+
+
+@pytest.fixture
+def sharded_db(tmp_path):
+    database = ShardedDBDriver(
+        [SQLiteDBDriver(str(tmp_path / f'shard_{i}.db')) for i in range(3)]
+    )
+    database.connect()
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def purchase_model(sharded_db):
+    class Purchase(Model):
+        user = CharField()
+        status = CharField()
+        amount = IntegerField()
+        note = CharField(lazy=True)
+
+        class Meta:
+            database = sharded_db
+            shard_key = 'user'
+
+    sharded_db.create_tables([Purchase])
+    for i in range(20):
+        Purchase.create(user=f'u{i % 7}', status='new', amount=i, note=f'n{i}')
+    return Purchase
+
+
+def rows_per_shard(database, table):
+    return [shard.execute_sql(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            for shard in database.shards]
+
+
+def test_rows_are_spread_by_key(sharded_db, purchase_model):
+    counts = rows_per_shard(sharded_db, 'purchase')
+    assert sum(counts) == 20
+    assert sum(1 for count in counts if count) > 1
+    shard = sharded_db.shard_for('u3')
+    rows = shard.execute_sql("SELECT user FROM purchase WHERE user = 'u3'").fetchall()
+    assert len(rows) == 3
+
+
+def test_fan_out_select_is_merged_by_order_and_limit(purchase_model):
+    amounts = [p.amount for p in purchase_model.select()
+               .order_by(purchase_model.amount.desc()).limit(5)]
+    assert amounts == [19, 18, 17, 16, 15]
+
+
+def test_fan_out_order_by_not_selected_field(purchase_model):
+    query = purchase_model.select().order_by(purchase_model.note.desc()).limit(3)
+    purchases = list(query)
+    assert [p.amount for p in purchases] == [9, 8, 7]
+    assert 'note' not in purchases[0].__dict__  # still deferred
+    assert purchases[0].note == 'n9'
+
+    query = purchase_model.select().defer('amount').order_by(purchase_model.amount)
+    assert [p.amount for p in query][:3] == [0, 1, 2]
+
+
+def test_single_shard_select(purchase_model):
+    purchases = list(purchase_model.select()
+                     .where(purchase_model.user == 'u1').shard('u1'))
+    assert sorted(p.amount for p in purchases) == [1, 8, 15]
+
+
+def test_bulk_update_goes_to_all_shards(sharded_db, purchase_model):
+    purchase_model.update(status='done').where("status = 'new'").execute()
+    statuses = {p.status for p in purchase_model.select()}
+    assert statuses == {'done'}
+
+
+def test_update_of_shard_key_is_rejected(purchase_model):
+    with pytest.raises(ValueError):
+        purchase_model.update(user='u0').where("status = 'new'")
+
+    purchase = purchase_model.select().where(purchase_model.user == 'u2').get()
+    purchase.user = 'u5'
+    with pytest.raises(ValueError):
+        purchase.save()
+
+
+def test_save_and_delete_go_to_the_instance_shard(sharded_db, purchase_model):
+    purchase = purchase_model.select().where(purchase_model.user == 'u4').get()
+    purchase.amount = 100
+    purchase.save()
+    amounts = [p.amount for p in purchase_model.select()
+               .where(purchase_model.user == 'u4').shard('u4')]
+    assert 100 in amounts
+
+    purchase.delete_instance()
+    assert sum(rows_per_shard(sharded_db, 'purchase')) == 19
+
+
+def test_insert_without_key_is_rejected(purchase_model):
+    with pytest.raises(ValueError):
+        purchase_model.insert(user=None, status='new', amount=1, note='').execute()
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from hw_1_orm.orm import (
+    Model, CharField, IntegerField, JSONField, ValidationError,
+)
+
+
+@pytest.fixture
+def models(db):
+    class Item(Model):
+        name = CharField()
+        count = IntegerField(null=True)
+        payload = JSONField()
+        extra = JSONField(null=True)
+
+        class Meta:
+            database = db
+
+    class ItemCopy(Item):
+        pass
+
+    db.create_tables([Item, ItemCopy])
+    return Item, ItemCopy
+
+
+@pytest.mark.parametrize('format', ['jsonl', 'csv'])
+def test_export_import_round_trip(models, tmp_path, format):
+    item, item_copy = models
+    item.insert_many([
+        {'name': f'n{i}', 'count': i if i % 2 else None,
+         'payload': {'i': i}, 'extra': None}
+        for i in range(10)
+    ]).execute()
+
+    path = tmp_path / f'items.{format}'
+    assert item.export(path, format=format).rows == 10
+    assert item_copy.import_(path).rows == 10
+
+    got = [(i.name, i.count, i.payload, i.extra) for i in item_copy.select()]
+    assert got == [(f'n{i}', i if i % 2 else None, {'i': i}, None) for i in range(10)]
+
+
+def test_unknown_format(models, tmp_path):
+    item, _ = models
+    with pytest.raises(ValueError):
+        item.export(tmp_path / 'items.xml', format='xml')
+    with pytest.raises(ValueError):
+        item.import_(tmp_path / 'items.xml', format='xml')
+
+
+def test_empty_csv_json_cell_is_null_only_for_nullable(models, tmp_path):
+    _, item_copy = models
+    path = tmp_path / 'items.csv'
+    path.write_text('name,count,payload,extra\nn,1,"{""a"": 1}",\n')
+    item_copy.import_(path)
+    assert item_copy.select().get().extra is None
+
+    path.write_text('name,count,payload,extra\nn,1,,\n')
+    with pytest.raises(json.JSONDecodeError):
+        item_copy.import_(path)
+
+
+def test_import_validates_rows(models, tmp_path):
+    _, item_copy = models
+    path = tmp_path / 'items.jsonl'
+    path.write_text(json.dumps({'name': 'n', 'payload': None}) + '\n')
+    with pytest.raises(ValidationError):
+        item_copy.import_(path)
+    assert list(item_copy.select()) == []
+
+
+def test_nullable_json_field_is_still_validated(models):
+    item, _ = models
+    with pytest.raises(ValidationError):
+        item.validate_many([{'name': 'n', 'payload': {}, 'extra': {1, 2}}])
+    with pytest.raises(ValueError):
+        item(name='n', payload={}, extra={1, 2})
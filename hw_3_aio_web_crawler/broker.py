@@ -0,0 +1,302 @@
+"""
+Stand-in broker for the distributed crawling, instead of redis/rabbit
+
+Keeps the shared queue and the shared seen set of all the crawler processes
+(see CrawlerQueueBroker). Urls that were taken and not acked during the
+visibility timeout go back to the queue, so urls of the dead crawler process
+are crawled by the others. It's in-memory, a restart of the broker loses the
+crawl.
+
+Urls are split to partitions by the hash of their host, and the partition is
+leased to one crawler process while it has urls of it, so every host is crawled
+by one process at a time and its rps limit and robots.txt are respected.
+Processes share the partitions with urls evenly, the one with more than its
+share gives away the partitions that have nothing taken. Partitions of the
+process that is disconnected or silent for the visibility timeout are given
+to the others.
+
+    python -m hw_3_aio_web_crawler.broker unix:/tmp/crawler.sock
+    CRAWLER_BROKER_ADDRESS=unix:/tmp/crawler.sock python -m hw_3_aio_web_crawler.crawler
+
+Protocol is json lines, one response line for every request line:
+    {"op": "sync", "put": [[url, depth], ...], "ack": [id, ...]} -> {"added": n}
+    {"op": "get", "max": n, "visibility_timeout": secs} -> {"items": [[id, url, depth]]}
+    {"op": "renew", "ids": [id, ...], "visibility_timeout": secs} -> {"renewed": n}
+    {"op": "release", "ids": [id, ...]} -> {"released": n}
+    {"op": "stats"} -> {"ready": n, "in_flight": n, ...}
+Bad request gets {"error": "..."}
+"""
+import json
+import zlib
+import heapq
+import asyncio
+import logging
+import argparse
+import itertools
+from collections import deque
+
+from hw_3_aio_web_crawler.crawler import (
+    FingerprintSeenSet,
+    PolitenessScheduler,
+    BROKER_STREAM_LIMIT,
+    parse_broker_address,
+)
+
+
+class CrawlerBroker:
+    """ Shared queue with acks, visibility timeouts and host leases, and seen set """
+
+    def __init__(
+        self, address, visibility_timeout=300, partitions=256, logger=None, loop=None
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+        self.address = address
+        self.visibility_timeout = visibility_timeout
+        self.partitions = partitions
+
+        self.seen = FingerprintSeenSet()
+        self._ready = {}  # partition -> deque of (url, depth), only not empty ones
+        self._in_flight = {}  # id -> (url, depth, deadline, partition, client)
+        self._deadlines = []  # heap of (deadline, id), acked and renewed are skipped
+        self._ids = itertools.count(1)
+
+        self._clients = {}  # client id -> time of its last request
+        self._owned = {}  # client id -> set of partitions, for clients that get
+        self._owners = {}  # partition -> client id
+        self._taken = {}  # partition -> count of its in-flight urls
+        self._client_ids = itertools.count(1)
+
+        self._server: asyncio.AbstractServer = None
+        self._expire_task: asyncio.Task = None
+
+        self.acked = 0
+        self.redelivered = 0
+
+    async def start(self):
+        kind, target = parse_broker_address(self.address)
+        if kind == "unix":
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, target, limit=BROKER_STREAM_LIMIT
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_client, *target, limit=BROKER_STREAM_LIMIT
+            )
+        self._expire_task = self.loop.create_task(self._expire_loop())
+        self.logger.info("Broker is listening on %s", self.address)
+
+    async def close(self):
+        self._expire_task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle_client(self, reader, writer):
+        client = self.connect()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError as exception:  # too long line, stream is broken
+                    response = {"error": f"Bad request line: {exception}"}
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                response = self.handle(client, line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(client)
+            writer.close()
+
+    def handle(self, client, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request is not a json object")
+            op = request.pop("op", None)
+            handler = getattr(self, f"op_{op}", None) if isinstance(op, str) else None
+            if handler is None:
+                raise ValueError(f"unknown op {op!r}")
+            self._clients[client] = self.loop.time()
+            return handler(client, **request)
+        except Exception as exception:  # bad request, the client gets it
+            self.logger.warning("Bad request of client %s: %r", client, exception)
+            return {"error": repr(exception)}
+
+    def connect(self) -> int:
+        client = next(self._client_ids)
+        self._clients[client] = self.loop.time()
+        return client
+
+    def disconnect(self, client):
+        # urls of the gone process are crawled by the others right away
+        self._clients.pop(client, None)
+        for partition in self._owned.pop(client, ()):
+            del self._owners[partition]
+        ids = [
+            task_id for task_id, task in self._in_flight.items() if task[4] == client
+        ]
+        self.redelivered += self._requeue(ids)
+
+    def partition_of(self, url) -> int:
+        host = PolitenessScheduler.host_of(url)
+        return zlib.crc32(host.encode()) % self.partitions
+
+    def _requeue(self, ids) -> int:
+        requeued = 0
+        for task_id in ids:
+            task = self._pop_in_flight(task_id)
+            if task is not None:
+                url, depth, _, partition, _ = task
+                self._ready.setdefault(partition, deque()).appendleft((url, depth))
+                requeued += 1
+        return requeued
+
+    def _pop_in_flight(self, task_id):
+        task = self._in_flight.pop(task_id, None)
+        if task is not None:
+            partition = task[3]
+            self._taken[partition] -= 1
+            if not self._taken[partition]:
+                del self._taken[partition]
+        return task
+
+    def _lease_partitions(self, client) -> list:
+        # partitions the client gets urls of: it keeps the busiest ones within
+        # its share, gives away the idle ones and takes the free ones with urls
+        owned = self._owned.setdefault(client, set())
+        busy = len(self._ready.keys() | self._taken.keys())
+        share = max(-(-busy // len(self._owned)), 1)
+        for partition in list(owned):
+            if partition not in self._ready and partition not in self._taken:
+                owned.discard(partition)
+                del self._owners[partition]
+        by_load = sorted(owned, key=lambda p: self._taken.get(p, 0), reverse=True)
+        for partition in by_load[share:]:
+            if partition not in self._taken:  # busy ones are given after the acks
+                owned.discard(partition)
+                del self._owners[partition]
+        leased = by_load[:share]
+        for partition in self._ready:
+            if len(leased) >= share:
+                break
+            if partition not in self._owners:
+                self._owners[partition] = client
+                owned.add(partition)
+                leased.append(partition)
+        return leased
+
+    def op_sync(self, client, put=(), ack=()) -> dict:
+        # puts are before acks, so the crawl is never seen finished in between
+        added = 0
+        for url, depth in put:
+            if self.seen.add(url):
+                partition = self.partition_of(url)
+                self._ready.setdefault(partition, deque()).append((url, depth))
+                added += 1
+        for task_id in ack:
+            if self._pop_in_flight(task_id) is not None:
+                self.acked += 1
+        return {"added": added}
+
+    def op_get(self, client, max=1, visibility_timeout=None) -> dict:  # NOSONAR
+        deadline = self.loop.time() + (visibility_timeout or self.visibility_timeout)
+        partitions = [p for p in self._lease_partitions(client) if p in self._ready]
+        items = []
+        while partitions and len(items) < max:  # round robin of the partitions
+            for partition in list(partitions):
+                urls = self._ready[partition]
+                url, depth = urls.popleft()
+                if not urls:
+                    del self._ready[partition]
+                    partitions.remove(partition)
+                task_id = next(self._ids)
+                self._in_flight[task_id] = (url, depth, deadline, partition, client)
+                self._taken[partition] = self._taken.get(partition, 0) + 1
+                heapq.heappush(self._deadlines, (deadline, task_id))
+                items.append((task_id, url, depth))
+                if len(items) >= max:
+                    break
+        return {"items": items}
+
+    def op_renew(self, client, ids=(), visibility_timeout=None) -> dict:
+        # urls wait in the local buffer of the crawler, they are still taken
+        deadline = self.loop.time() + (visibility_timeout or self.visibility_timeout)
+        renewed = 0
+        for task_id in ids:
+            task = self._in_flight.get(task_id)
+            if task is not None and task[4] == client:
+                self._in_flight[task_id] = task[:2] + (deadline,) + task[3:]
+                heapq.heappush(self._deadlines, (deadline, task_id))
+                renewed += 1
+        return {"renewed": renewed}
+
+    def op_release(self, client, ids=()) -> dict:
+        return {"released": self._requeue(ids)}
+
+    def op_stats(self, client=None) -> dict:
+        return {
+            "ready": sum(len(urls) for urls in self._ready.values()),
+            "in_flight": len(self._in_flight),
+            "seen": len(self.seen),
+            "acked": self.acked,
+            "redelivered": self.redelivered,
+            "clients": len(self._clients),
+            "leased_partitions": len(self._owners),
+        }
+
+    def expire(self):
+        now = self.loop.time()
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, task_id = heapq.heappop(self._deadlines)
+            task = self._in_flight.get(task_id)
+            if task is not None and task[2] <= now:  # not acked or renewed in time
+                expired.append(task_id)
+        self.redelivered += self._requeue(expired)
+        # partitions of the silent process go to the others, it may be hung
+        for client, last_request in list(self._clients.items()):
+            if last_request + self.visibility_timeout <= now:
+                for partition in self._owned.pop(client, ()):
+                    del self._owners[partition]
+
+    async def _expire_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(1)
+                self.expire()
+            except asyncio.CancelledError:
+                break
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("address", help="unix:/path/to.sock or host:port")
+    arg_parser.add_argument("--visibility-timeout", type=float, default=300)
+    arg_parser.add_argument("--partitions", type=int, default=256)
+    args = arg_parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        broker = CrawlerBroker(args.address, args.visibility_timeout, args.partitions)
+        await broker.start()
+        try:
+            while True:
+                await asyncio.sleep(10)
+                broker.logger.info("Stats: %s", broker.op_stats())
+        finally:
+            await broker.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,27 @@ from utils.config_base import ConfigBase, EnvStringValue, EnvIntValue
 class Config(ConfigBase):
     CRAWLER_MAX_WORKERS = EnvIntValue(default_value=3)
     CRAWLER_MAX_RPS_PER_DOMAIN = EnvIntValue(default_value=3)
+    CRAWLER_MAX_BURST_PER_DOMAIN = EnvIntValue(default_value=1)
     CRAWLER_MAX_RETRIES = EnvIntValue(default_value=3)
     CRAWLER_MAX_PARSING_WORKERS = EnvIntValue(default_value=os.cpu_count())
+    CRAWLER_MAX_BODY_SIZE = EnvIntValue(default_value=10 * 1024 * 1024)
+    CRAWLER_STREAM_LINKS = EnvIntValue(default_value=0)
+    CRAWLER_CONNECTIONS_LIMIT = EnvIntValue(default_value=100)
+    CRAWLER_CONNECTIONS_LIMIT_PER_HOST = EnvIntValue(default_value=4)
+    CRAWLER_USER_AGENT = EnvStringValue(default_value="hw3-crawler/1.0")
+    CRAWLER_OBEY_ROBOTS = EnvIntValue(default_value=1)
+    CRAWLER_USE_SITEMAPS = EnvIntValue(default_value=0)
+    # sqlite file for the persistent frontier, crawl is resumed from it on restart
+    CRAWLER_FRONTIER_PATH = EnvStringValue(default_value="")
+    # shared queue of many crawler processes, e.g. unix:/tmp/crawler.sock or host:port
+    # of the running `python -m hw_3_aio_web_crawler.broker <address>`
+    CRAWLER_BROKER_ADDRESS = EnvStringValue(default_value="")
+    # priority queue instead of fifo: shallow, linked, fresh urls first
+    CRAWLER_PRIORITY_QUEUE = EnvIntValue(default_value=0)
+    # 0 - exact fingerprints set, otherwise bloom filter of this initial capacity
+    CRAWLER_SEEN_BLOOM_CAPACITY = EnvIntValue(default_value=0)
+    # sqlite file with etags, last-modified and hashes of pages for the recrawls
+    CRAWLER_PAGE_STORE_PATH = EnvStringValue(default_value="")
 
     CRAWLER_ELASTICSEARCH_HOST = EnvStringValue(default_value="localhost")
     CRAWLER_ELASTICSEARCH_PORT = EnvIntValue(default_value=9200)
@@ -12,17 +12,30 @@
 # todo: remove weird shit with max_redirect and do flex with max_depth + depth
 import os
 import re
-import time
+import json
+import math
+import zlib
+import heapq
+import hashlib
+import sqlite3
 import asyncio
 import logging
+import itertools
 import urllib.parse
+from array import array
+from collections import deque, OrderedDict
 from dataclasses import dataclass
-from typing import Tuple, Optional
+from datetime import datetime, timezone
+from typing import Tuple, Optional, Union, Iterable, AsyncIterator
+from concurrent.futures.thread import ThreadPoolExecutor
 from concurrent.futures.process import ProcessPoolExecutor
 
 import bs4
 import aiohttp
+import lxml.etree
+import lxml.html
 from aioelasticsearch import Elasticsearch
+from elasticsearch import TransportError
 
 from hw_3_aio_web_crawler.config import config as c
 
@@ -34,6 +47,27 @@ class CrawlerConfig:
     max_workers: int
     max_rps_per_domain: int
     max_retries: int
+    max_burst_per_domain: int = 1
+    max_parse_batch_size: int = 32
+    max_parse_batch_delay: float = 0.01
+    max_body_size: int = 10 * 1024 * 1024
+    stream_links: bool = False  # take links from the body while it's downloading
+    # http client, per host limit keeps slow hosts from taking all the sockets
+    connections_limit: int = 100
+    connections_limit_per_host: int = 4
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30
+    connect_timeout: float = 10
+    read_timeout: float = 30
+    total_timeout: float = 60
+    compression: bool = True
+    user_agent: str = "hw3-crawler/1.0"
+    obey_robots: bool = True
+    use_sitemaps: bool = False
+    # urls taken from the queue and waiting for their host's turn in the scheduler,
+    # None is 10000, or a few per worker for the queues that decide what's fetched
+    # next (priority) or share urls with other processes (CrawlerQueue.takes_few)
+    max_scheduled_urls: Optional[int] = None
 
 
 class CrawlerHelper:
@@ -56,6 +90,10 @@ class CrawlerQueue:
     in case if i will move to redis/rabbit queue instead of simple asyncio.Queue()
     """
 
+    # crawler takes only a few urls ahead of its workers from such a queue,
+    # the urls moved to the scheduler are fetched in fifo order of their host
+    takes_few = False
+
     def __init__(self, logger=None, loop=None):
         self.loop = loop or asyncio.get_event_loop()
         self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
@@ -66,7 +104,9 @@ class CrawlerQueue:
     async def get(self) -> Tuple[str, str]:
         raise NotImplementedError
 
-    async def put(self, url, depth=None):
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
+        # returns False if the url is dropped (e.g. the queue is full),
+        # so it's not known yet and could be put again later
         raise NotImplementedError
 
     async def ack(self, task=None):
@@ -81,6 +121,18 @@ class CrawlerQueue:
     async def purge(self):
         raise NotImplementedError
 
+    async def seen_urls(self) -> AsyncIterator[str]:
+        # urls that were put to the queue before (e.g. by the previous run)
+        for url in ():
+            yield url
+
+    async def rediscover(self, url, depth=None, lastmod: datetime = None):
+        # known url is found again, e.g. by one more link to it
+        pass
+
+    async def close(self):
+        await self.purge()
+
 
 class CrawlerQueueAsyncioQueue(CrawlerQueue):
     """ CrawlerQueue implementation by asyncio.Queue() """
@@ -96,8 +148,9 @@ class CrawlerQueueAsyncioQueue(CrawlerQueue):
     async def get(self) -> Tuple[str, str]:
         return await self._queue.get()
 
-    async def put(self, url, depth=None):
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
         self._queue.put_nowait((url, depth))
+        return True
 
     async def ack(self, task=None):
         self._queue.task_done()
@@ -113,6 +166,726 @@ class CrawlerQueueAsyncioQueue(CrawlerQueue):
         await self.init()
 
 
+class CrawlerQueueHostFrontier(CrawlerQueue):
+    """
+    Host-partitioned frontier for crawling many sites at once
+
+    Urls are kept in per-host back queues and hosts are served by round-robin,
+    so one big site can't push all the others out of the crawl. Memory is bounded
+    by max_urls_per_host, urls above the limit are dropped (and counted), they are
+    not remembered as known, so they are put again when found after the host drains
+    """
+
+    def __init__(self, max_urls_per_host=10000, logger=None, loop=None):
+        super().__init__(logger, loop)
+        self.max_urls_per_host = max_urls_per_host
+
+        self._hosts: dict = None  # host -> deque of (url, depth)
+        self._round_robin: deque = None  # hosts with queued urls
+        self._size = 0
+        self._unfinished = 0
+        self._not_empty: asyncio.Event = None
+        self._finished: asyncio.Event = None
+
+        self.dropped = 0
+
+    async def init(self, loop=None):
+        await super().init(loop=loop)
+        self._hosts = {}
+        self._round_robin = deque()
+        self._size = 0
+        self._unfinished = 0
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    async def get(self) -> Tuple[str, int]:
+        while not self._round_robin:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        host = self._round_robin.popleft()
+        urls = self._hosts[host]
+        url, depth = urls.popleft()
+        if urls:
+            self._round_robin.append(host)
+        else:
+            del self._hosts[host]
+        self._size -= 1
+        return url, depth
+
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
+        host = (urllib.parse.urlparse(url).hostname or "").lower()
+        urls = self._hosts.get(host)
+        if urls is None:
+            urls = self._hosts[host] = deque()
+            self._round_robin.append(host)
+        elif len(urls) >= self.max_urls_per_host:
+            self.dropped += 1
+            self.logger.debug("Host %r queue is full, url %r is dropped", host, url)
+            return False
+        urls.append((url, depth))
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        return True
+
+    async def ack(self, task=None):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    async def len(self):
+        return self._size
+
+    async def hosts_len(self):
+        return len(self._hosts)
+
+    async def purge(self):
+        await self.init()
+
+
+class CrawlerQueueSQLite(CrawlerQueue):
+    """
+    Persistent frontier stored in sqlite database, crawl can be resumed after restart
+
+    Every url that was ever put is kept in the table, so it's also the checkpoint
+    of the seen urls. Puts and acks are buffered and written by batches, gets are
+    served from the in-memory window of the next queued urls. Urls that were taken
+    but not acked before the crash will be fetched again on resume
+    """
+
+    def __init__(
+        self,
+        path,
+        batch_size=500,
+        window_size=1000,
+        checkpoint_interval=1.0,
+        logger=None,
+        loop=None,
+    ):
+        super().__init__(logger, loop)
+        self.path = path
+        self.batch_size = batch_size
+        self.window_size = window_size
+        self.checkpoint_interval = checkpoint_interval
+
+        # all the sqlite calls go through the single thread
+        self._executor: ThreadPoolExecutor = None
+        self._conn: sqlite3.Connection = None
+        self._lock: asyncio.Lock = None
+        self._checkpoint_task: asyncio.Task = None
+
+        self._pending_puts: list = []  # [(url, depth)]
+        self._pending_acks: list = []  # [row id]
+        self._window: deque = deque()  # (row id, url, depth)
+        self._taken: dict = {}  # url -> row id, for acks
+        self._last_loaded_id = 0
+        self._exhausted = False  # all queued rows of the table are loaded
+        self._unfinished = 0
+        self._not_empty: asyncio.Event = None
+        self._finished: asyncio.Event = None
+
+    async def init(self, loop=None):
+        await super().init(loop=loop)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(1)
+            self._conn = await self._run(self._connect)
+        self._lock = asyncio.Lock()
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._pending_puts, self._pending_acks = [], []
+        self._window, self._taken = deque(), {}
+        self._last_loaded_id = 0
+        self._exhausted = False
+        self._unfinished = await self._run(self._count_queued)
+        if self._unfinished:
+            self.logger.info("Resuming frontier with %s queued urls", self._unfinished)
+        else:
+            self._finished.set()
+        self._checkpoint_task = self.loop.create_task(self._checkpoint_loop())
+
+    async def _run(self, func, *args):
+        return await self.loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "url TEXT NOT NULL UNIQUE, "
+            "depth INTEGER, "
+            "done INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_queued ON frontier (id) WHERE done = 0"
+        )
+        conn.commit()
+        return conn
+
+    def _count_queued(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM frontier WHERE done = 0"
+        ).fetchone()[0]
+
+    def _write(self, puts, acks) -> int:
+        with self._conn:
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO frontier (url, depth) VALUES (?, ?)", puts
+            ).rowcount
+            self._conn.executemany(
+                "UPDATE frontier SET done = 1 WHERE id = ?", ((i,) for i in acks)
+            )
+        return inserted
+
+    def _load(self, after_id, limit) -> list:
+        return self._conn.execute(
+            "SELECT id, url, depth FROM frontier "
+            "WHERE done = 0 AND id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+
+    async def checkpoint(self):
+        """ Writes buffered puts and acks to the database """
+        async with self._lock:
+            puts, self._pending_puts = self._pending_puts, []
+            acks, self._pending_acks = self._pending_acks, []
+            if not puts and not acks:
+                return
+            inserted = await self._run(self._write, puts, acks)
+            if inserted:
+                self._exhausted = False
+        duplicates = len(puts) - inserted
+        if duplicates:  # they were counted at put, but are already in the table
+            self._unfinished -= duplicates
+            self._check_finished()
+
+    async def _checkpoint_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self.checkpoint_interval)
+                await self.checkpoint()
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                self.logger.exception("Frontier checkpoint failed")
+
+    async def _refill(self):
+        await self.checkpoint()  # so the fresh urls are visible
+        async with self._lock:
+            if self._window:
+                return
+            rows = await self._run(self._load, self._last_loaded_id, self.window_size)
+            if rows:
+                self._last_loaded_id = rows[-1][0]
+                self._window.extend(rows)
+            self._exhausted = len(rows) < self.window_size
+
+    async def get(self) -> Tuple[str, int]:
+        while not self._window:
+            if self._pending_puts or not self._exhausted:
+                await self._refill()
+            else:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+        row_id, url, depth = self._window.popleft()
+        self._taken[url] = row_id
+        return url, depth
+
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
+        self._pending_puts.append((url, depth))
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        if len(self._pending_puts) >= self.batch_size:
+            await self.checkpoint()
+        return True
+
+    async def ack(self, task=None):
+        row_id = self._taken.pop(task, None)
+        if row_id is not None:
+            self._pending_acks.append(row_id)
+            if len(self._pending_acks) >= self.batch_size:
+                await self.checkpoint()
+        self._unfinished -= 1
+        self._check_finished()
+
+    def _check_finished(self):
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    async def len(self):
+        return max(self._unfinished - len(self._taken), 0)
+
+    def _load_seen(self, after_id, limit) -> list:
+        return self._conn.execute(
+            "SELECT id, url FROM frontier WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+
+    async def seen_urls(self) -> AsyncIterator[str]:
+        # by batches, so the whole table is never in memory at once
+        await self.checkpoint()
+        last_id = 0
+        while True:
+            rows = await self._run(self._load_seen, last_id, self.batch_size)
+            for _, url in rows:
+                yield url
+            if len(rows) < self.batch_size:
+                break
+            last_id = rows[-1][0]
+
+    async def purge(self):
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+        await self._run(self._conn.executescript, "DELETE FROM frontier; VACUUM;")
+        await self.init()
+
+    async def close(self):
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+        await self.checkpoint()
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+        self._executor = self._conn = None
+
+
+BROKER_STREAM_LIMIT = 16 * 1024 * 1024  # max json line of the broker protocol
+
+
+def parse_broker_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """ unix:/path/to.sock -> ("unix", path), host:port -> ("tcp", (host, port)) """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition("//")[2].rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Bad broker address {address!r}")
+    return "tcp", (host, int(port))
+
+
+class CrawlerQueueBroker(CrawlerQueue):
+    """
+    Shared frontier of many crawler processes (or machines), see broker.py
+
+    Broker hands the urls out with the visibility timeout, url that is not acked
+    in time goes to another process. Leases of the taken urls (and of their hosts)
+    are renewed while they wait in the scheduler, so slow hosts are not fetched
+    twice. Broker also dedups the puts, so it's the shared seen set, and local known
+    urls are just a cache of it. Puts and acks are sent by batches, gets are
+    prefetched by the small window. Crawl is finished when nothing is queued or
+    taken in all the processes
+    """
+
+    takes_few = True  # the process doesn't take urls it can't fetch soon
+
+    def __init__(
+        self,
+        address,
+        prefetch=16,
+        batch_size=200,
+        sync_interval=0.05,
+        visibility_timeout=300,
+        poll_interval=0.2,
+        logger=None,
+        loop=None,
+    ):
+        super().__init__(logger, loop)
+        self.address = address
+        self.prefetch = prefetch
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._lock: asyncio.Lock = None  # one request at a time on the connection
+        self._sync_task: asyncio.Task = None
+        self._renew_task: asyncio.Task = None
+
+        self._pending_puts: list = []  # [(url, depth)]
+        self._pending_acks: list = []  # [task id]
+        self._window: deque = deque()  # (task id, url, depth)
+        self._taken: dict = {}  # url -> deque of task ids, url may be redelivered
+
+    async def init(self, loop=None):
+        await super().init(loop=loop)
+        if self._writer is None:
+            kind, target = parse_broker_address(self.address)
+            if kind == "unix":
+                self._reader, self._writer = await asyncio.open_unix_connection(
+                    target, limit=BROKER_STREAM_LIMIT
+                )
+            else:
+                self._reader, self._writer = await asyncio.open_connection(
+                    *target, limit=BROKER_STREAM_LIMIT
+                )
+        self._lock = asyncio.Lock()
+        self._pending_puts, self._pending_acks = [], []
+        self._window, self._taken = deque(), {}
+        self._sync_task = self.loop.create_task(self._sync_loop())
+        self._renew_task = self.loop.create_task(self._renew_loop())
+
+    async def _request(self, op, **params) -> dict:
+        async with self._lock:
+            self._writer.write(json.dumps({"op": op, **params}).encode() + b"\n")
+            await self._writer.drain()
+            line = await self._reader.readline()
+        if not line:
+            raise ConnectionError(f"Broker {self.address} has closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(f"Broker {self.address} error: {response['error']}")
+        return response
+
+    async def sync(self):
+        """ Sends buffered puts and acks to the broker """
+        while self._pending_puts or self._pending_acks:
+            puts = self._pending_puts[:self.batch_size]
+            del self._pending_puts[:self.batch_size]
+            # acks go only after all the puts before them, otherwise another
+            # process may see the crawl finished while the links are still here
+            acks = []
+            if not self._pending_puts:
+                acks, self._pending_acks = self._pending_acks, []
+            try:
+                await self._request("sync", put=puts, ack=acks)
+            except Exception:
+                self._pending_puts[:0] = puts
+                self._pending_acks[:0] = acks
+                raise
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self.sync_interval)
+                await self.sync()
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                self.logger.exception("Sync with the broker failed")
+
+    async def renew(self):
+        """ Extends the visibility timeout of the prefetched and taken urls """
+        ids = [task_id for task_id, _, _ in self._window]
+        for task_ids in self._taken.values():
+            ids.extend(task_ids)
+        response = await self._request(
+            "renew", ids=ids, visibility_timeout=self.visibility_timeout
+        )
+        if response["renewed"] < len(ids):
+            self.logger.warning(
+                "%s urls were redelivered before renewal", len(ids) - response["renewed"]
+            )
+
+    async def _renew_loop(self):
+        # it's the heartbeat too, hosts of the process are not given to others
+        while True:
+            try:
+                await asyncio.sleep(self.visibility_timeout / 3)
+                await self.renew()
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                self.logger.exception("Renewal of the leases failed")
+
+    async def get(self) -> Tuple[str, int]:
+        while not self._window:
+            await self.sync()  # own fresh urls may be the next ones
+            response = await self._request(
+                "get", max=self.prefetch, visibility_timeout=self.visibility_timeout
+            )
+            if response["items"]:
+                self._window.extend(response["items"])
+            else:  # other processes may still put some
+                await asyncio.sleep(self.poll_interval)
+        task_id, url, depth = self._window.popleft()
+        self._taken.setdefault(url, deque()).append(task_id)
+        return url, depth
+
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
+        self._pending_puts.append((url, depth))
+        if len(self._pending_puts) >= self.batch_size:
+            await self.sync()
+        return True
+
+    async def ack(self, task=None):
+        task_ids = self._taken.get(task)
+        if task_ids:
+            self._pending_acks.append(task_ids.popleft())
+            if not task_ids:
+                del self._taken[task]
+            if len(self._pending_acks) >= self.batch_size:
+                await self.sync()
+
+    async def join(self):
+        while True:
+            await self.sync()
+            stats = await self.stats()
+            if not stats["ready"] and not stats["in_flight"]:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def len(self):
+        return (await self.stats())["ready"] + len(self._window)
+
+    async def stats(self) -> dict:
+        return await self._request("stats")
+
+    async def purge(self):
+        # only the local part, the shared queue belongs to the other processes too,
+        # taken and not acked urls go back to it without waiting for the timeout
+        ids = [task_id for task_id, _, _ in self._window]
+        for task_ids in self._taken.values():
+            ids.extend(task_ids)
+        self._window.clear()
+        self._taken.clear()
+        self._pending_puts.clear()
+        if ids:
+            await self._request("release", ids=ids)
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+        await self.sync()
+        await self.purge()
+        self.logger.info("Broker stats: %s", await self.stats())
+        self._writer.close()
+        self._reader = self._writer = None
+
+
+@dataclass
+class UrlScorer:
+    """
+    Score of the url for the priority queue, more valuable urls have higher one
+
+    Shallow urls, urls with more in-links and recently modified (by sitemap
+    lastmod) ones are the valuable, the weights set what is more important
+    """
+
+    depth_weight: float = 1.0
+    inlinks_weight: float = 0.5
+    freshness_weight: float = 1.0
+    freshness_half_life_days: float = 30.0
+
+    def __call__(self, depth, inlinks, lastmod: Optional[datetime]) -> float:
+        score = -self.depth_weight * (depth or 0)
+        score += self.inlinks_weight * math.log1p(inlinks)
+        if lastmod is not None:
+            age_days = (datetime.now(timezone.utc) - lastmod).total_seconds() / 86400
+            half_lives = max(age_days, 0) / self.freshness_half_life_days
+            score += self.freshness_weight * 0.5 ** half_lives
+        return score
+
+
+class CrawlerQueuePriority(CrawlerQueue):
+    """
+    Priority queue, urls with the higher score are taken first
+
+    Score is updated when the url is rediscovered (one more in-link, smaller
+    depth, fresher lastmod), so the crawl that is stopped early has the most
+    valuable pages crawled. Heap entries of the updated urls are not removed,
+    they are marked as stale and skipped on get
+    """
+
+    takes_few = True  # the queue decides what's fetched next, not the scheduler
+
+    def __init__(self, scorer: UrlScorer = None, logger=None, loop=None):
+        super().__init__(logger, loop)
+        self.scorer = scorer or UrlScorer()
+
+        self._heap = []  # (-score, seq, url)
+        self._entries = {}  # url -> [score, seq, depth, inlinks, lastmod]
+        self._seq = itertools.count()
+        self._unfinished = 0
+        self._not_empty: asyncio.Event = None
+        self._finished: asyncio.Event = None
+
+    async def init(self, loop=None):
+        await super().init(loop=loop)
+        self._heap = []
+        self._entries = {}
+        self._unfinished = 0
+        self._not_empty = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def _push(self, url, entry):
+        entry[0] = self.scorer(entry[2], entry[3], entry[4])
+        entry[1] = next(self._seq)
+        heapq.heappush(self._heap, (-entry[0], entry[1], url))
+
+    async def get(self) -> Tuple[str, int]:
+        while True:
+            while not self._heap:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            _, seq, url = heapq.heappop(self._heap)
+            entry = self._entries.get(url)
+            if entry is not None and entry[1] == seq:  # not stale
+                del self._entries[url]
+                return url, entry[2]
+
+    async def put(self, url, depth=None, lastmod: datetime = None) -> bool:
+        if url in self._entries:
+            await self.rediscover(url, depth, lastmod)
+            return True
+        entry = [0, 0, depth, 0, lastmod]
+        self._entries[url] = entry
+        self._push(url, entry)
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+        return True
+
+    async def rediscover(self, url, depth=None, lastmod: datetime = None):
+        entry = self._entries.get(url)
+        if entry is None:  # it's taken already
+            return
+        entry[3] += 1
+        if depth is not None and (entry[2] is None or depth < entry[2]):
+            entry[2] = depth
+        if lastmod is not None and (entry[4] is None or lastmod > entry[4]):
+            entry[4] = lastmod
+        self._push(url, entry)  # the old heap entry becomes stale
+        if len(self._heap) > 2 * len(self._entries) + 1000:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [
+            (-entry[0], entry[1], url) for url, entry in self._entries.items()
+        ]
+        heapq.heapify(self._heap)
+
+    async def ack(self, task=None):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    async def len(self):
+        return len(self._entries)
+
+    async def purge(self):
+        await self.init()
+
+
+@dataclass
+class PageState:
+    """ What we know about the page from the last crawl, for conditional recrawl """
+
+    url: str
+    depth: int = 0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+class CrawlerPageStore(CrawlerHelper):
+    """ Store of page states, in memory one is useful within a single crawl only """
+
+    def __init__(self, logger=None, loop=None):
+        super().__init__(logger, loop)
+        self._pages = {}
+
+    async def get(self, url) -> Optional[PageState]:
+        return self._pages.get(url)
+
+    async def set(self, page_state: PageState):
+        self._pages[page_state.url] = page_state
+
+    async def urls(self) -> Iterable[Tuple[str, int]]:
+        # (url, depth) of all the pages, they are seeds for the recrawl
+        return [(page.url, page.depth) for page in self._pages.values()]
+
+
+class CrawlerPageStoreSQLite(CrawlerPageStore):
+    """ Page states in sqlite, writes are buffered and done by batches """
+
+    def __init__(self, path, batch_size=500, logger=None, loop=None):
+        super().__init__(logger, loop)
+        self.path = path
+        self.batch_size = batch_size
+        self._executor: ThreadPoolExecutor = None
+        self._conn: sqlite3.Connection = None
+
+    async def init(self, loop=None):
+        await super().init(loop=loop)
+        self._executor = ThreadPoolExecutor(1)
+        self._conn = await self._run(self._connect)
+
+    async def _run(self, func, *args):
+        return await self.loop.run_in_executor(self._executor, func, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, depth INTEGER, "
+            "etag TEXT, last_modified TEXT, content_hash TEXT)"
+        )
+        conn.commit()
+        return conn
+
+    def _select(self, url) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT url, depth, etag, last_modified, content_hash "
+            "FROM pages WHERE url = ?",
+            (url,),
+        ).fetchone()
+
+    def _write(self, rows):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    async def get(self, url) -> Optional[PageState]:
+        page_state = self._pages.get(url)  # not written yet
+        if page_state is None:
+            row = await self._run(self._select, url)
+            page_state = PageState(*row) if row else None
+        return page_state
+
+    async def set(self, page_state: PageState):
+        await super().set(page_state)
+        if len(self._pages) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        pages, self._pages = self._pages, {}
+        if pages:
+            rows = [
+                (p.url, p.depth, p.etag, p.last_modified, p.content_hash)
+                for p in pages.values()
+            ]
+            await self._run(self._write, rows)
+
+    async def urls(self) -> Iterable[Tuple[str, int]]:
+        await self.flush()
+        return await self._run(
+            lambda: self._conn.execute("SELECT url, depth FROM pages").fetchall()
+        )
+
+    async def close(self):
+        await self.flush()
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=True)
+
+
 @dataclass
 class FetchReport:
     """ Simple container for the reports after url fetching """
@@ -122,266 +895,1714 @@ class FetchReport:
     status: int
     text: Optional[str]
 
-    unsuccess_msg: Optional[str] = None
+    unsuccess_msg: Optional[str] = None
+
+    exception: Optional[Exception] = None
+
+
+class NearDuplicateDetector:
+    """
+    Finds near-duplicate pages (mirrors, print versions) by SimHash of their text
+
+    SimHash is 64-bit fingerprint of word shingles, similar texts have close
+    fingerprints. Pages within max_distance differing bits are duplicates.
+    Fingerprints are split to max_distance + 1 bands, two close fingerprints
+    have at least one equal band, so only pages with the same band are compared
+
+    Pages are remembered by the short id given by the caller (es document id),
+    not by url, and only max_pages least recently seen ones are kept
+    """
+
+    def __init__(self, max_distance=3, shingle_size=3, min_words=20, max_pages=1000000):
+        self.max_distance = max_distance
+        self.shingle_size = shingle_size
+        self.min_words = min_words  # too short texts are alike too often
+        self.max_pages = max_pages
+
+        self.bands_count = max_distance + 1
+        self.band_bits = 64 // self.bands_count
+        self._fingerprints = OrderedDict()  # page id -> simhash, in lru order
+        self._bands = [{} for _ in range(self.bands_count)]  # band -> set of ids
+
+    def simhash(self, words: list) -> int:
+        shingles = {
+            " ".join(words[i:i + self.shingle_size])
+            for i in range(max(len(words) - self.shingle_size + 1, 1))
+        }
+        hashes = [
+            hashlib.blake2b(shingle.encode(), digest_size=8).hexdigest()
+            for shingle in shingles
+        ]
+        # ones are counted in each bit position by columns of binary strings,
+        # it's much faster than bit by bit
+        hashes = [format(int(h, 16), "064b") for h in hashes]
+        threshold = len(hashes) / 2
+        bits = "".join("1" if c.count("1") > threshold else "0" for c in zip(*hashes))
+        return int(bits, 2)
+
+    def _bands_of(self, fingerprint: int) -> list:
+        mask = (1 << self.band_bits) - 1
+        return [
+            (fingerprint >> (i * self.band_bits)) & mask
+            for i in range(self.bands_count)
+        ]
+
+    def find_duplicate(self, page_id, text) -> Optional[str]:
+        # returns id of the page that is near-duplicate of this one, if any;
+        # if there is no such page, this one is remembered
+        words = text.lower().split()
+        if len(words) < self.min_words:
+            return None
+        fingerprint = self.simhash(words)
+        bands = self._bands_of(fingerprint)
+
+        for band_index, band in enumerate(bands):
+            for other_id in self._bands[band_index].get(band, ()):
+                if other_id == page_id:  # page is recrawled, it's not a duplicate
+                    continue
+                distance = bin(fingerprint ^ self._fingerprints[other_id]).count("1")
+                if distance <= self.max_distance:
+                    self._fingerprints.move_to_end(other_id)
+                    return other_id
+
+        self.forget(page_id)
+        self._fingerprints[page_id] = fingerprint
+        for band_index, band in enumerate(bands):
+            self._bands[band_index].setdefault(band, set()).add(page_id)
+        while len(self._fingerprints) > self.max_pages:
+            self.forget(next(iter(self._fingerprints)))
+        return None
+
+    def forget(self, page_id):
+        fingerprint = self._fingerprints.pop(page_id, None)
+        if fingerprint is None:
+            return
+        for band_index, band in enumerate(self._bands_of(fingerprint)):
+            ids = self._bands[band_index][band]
+            ids.discard(page_id)
+            if not ids:
+                del self._bands[band_index][band]
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+
+class CrawlerReporter:
+    """ Base class for reporters """
+
+    def __init__(self, logger=None, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+
+    async def init(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+
+    async def close(self):
+        pass
+
+    async def do_report(self, report: FetchReport):
+        # todo: think about necessity of reporting non 200 fetch results
+        raise NotImplementedError
+
+
+class StdOutCrawlerReporter(CrawlerReporter):
+    """ Simple reporting to stdout for debug purposes """
+
+    async def do_report(self, report: FetchReport):
+        if report.status == 200 and report.text:
+            print(f"Url {report.url} text: {report.text!r}")
+
+
+class ElasticSearchCrawlerReporter(CrawlerReporter):
+    """
+    Reporter that indexes fetch reports
+
+    Document id is derived from url, so reindexing of the page overwrites it.
+    With near_duplicates detector near-duplicate pages are dropped, or indexed
+    without text and with the id of the original document (collapse_duplicates)
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        index,
+        doc_type,
+        near_duplicates: NearDuplicateDetector = None,
+        collapse_duplicates=False,
+        logger=None,
+        loop=None,
+    ):
+        super().__init__(logger, loop)
+        self.host = host
+        self.port = port
+
+        self.es: Elasticsearch = None
+
+        self.index = index
+        self.doc_type = doc_type
+
+        self.near_duplicates = near_duplicates
+        self.collapse_duplicates = collapse_duplicates
+        self.duplicates = 0
+
+    async def init(self, loop=None):
+        await super().init(loop)
+        self.es = Elasticsearch(
+            hosts=[{"host": self.host, "port": self.port}], loop=self.loop
+        )
+
+    async def close(self):
+        await self.es.close()
+
+    @staticmethod
+    def is_indexable(report: FetchReport) -> bool:
+        return report.status == 200 and bool(report.text)
+
+    @staticmethod
+    def document_id(report: FetchReport) -> str:
+        return hashlib.blake2b(report.url.encode(), digest_size=16).hexdigest()
+
+    def document(self, report: FetchReport) -> Optional[dict]:
+        # returns None if the report should not be indexed
+        document = {"root_url": report.root_url, "url": report.url, "text": report.text}
+        if self.near_duplicates is None:
+            return document
+        original_id = self.near_duplicates.find_duplicate(
+            self.document_id(report), report.text
+        )
+        if original_id is None:
+            return document
+        self.duplicates += 1
+        self.logger.debug("%r is near-duplicate of document %s", report.url, original_id)
+        if not self.collapse_duplicates:
+            return None
+        document["text"] = None
+        document["duplicate_of"] = original_id
+        return document
+
+    async def do_report(self, report: FetchReport):
+        if self.is_indexable(report):
+            body = self.document(report)
+            if body is None:
+                return
+            self.logger.debug('Indexing "ok" fetching result to elasticsearch')
+            indexing_result = await self.es.index(
+                index=self.index,
+                doc_type=self.doc_type,
+                body=body,
+                id=self.document_id(report),
+            )
+            self.logger.debug("Indexing result: %s", indexing_result)
+        else:
+            self.logger.debug(
+                "Report is not suitable for indexing: %s", report.unsuccess_msg
+            )
+
+
+class ElasticSearchBulkCrawlerReporter(ElasticSearchCrawlerReporter):
+    """
+    Reporter that indexes fetch reports by the _bulk api
+
+    Documents are buffered and flushed by max_docs, max_bytes or each
+    flush_interval secs. Flushes are done by background tasks (up to
+    max_concurrent_flushes at once), so crawler workers don't wait for es.
+    Documents that failed with the retryable status (429, 5xx) are retried
+    with backoff. When max_pending_docs are buffered or being flushed, the
+    do_report waits, so crawling slows down to the speed of es
+    """
+
+    retryable_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        host,
+        port,
+        index,
+        doc_type,
+        max_docs=500,
+        max_bytes=5 * 1024 * 1024,
+        flush_interval=1.0,
+        max_concurrent_flushes=2,
+        max_pending_docs=5000,
+        max_retries=3,
+        retry_backoff=0.5,
+        near_duplicates: NearDuplicateDetector = None,
+        collapse_duplicates=False,
+        logger=None,
+        loop=None,
+    ):
+        super().__init__(
+            host,
+            port,
+            index,
+            doc_type,
+            near_duplicates=near_duplicates,
+            collapse_duplicates=collapse_duplicates,
+            logger=logger,
+            loop=loop,
+        )
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_concurrent_flushes = max_concurrent_flushes
+        self.max_pending_docs = max_pending_docs
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._buffer: list = []  # (action line, source line) pairs of ndjson
+        self._buffer_bytes = 0
+        self._pending_docs = 0  # buffered and being flushed
+        self._has_room: asyncio.Event = None
+        self._flush_semaphore: asyncio.Semaphore = None
+        self._flush_tasks: set = set()
+        self._interval_task: asyncio.Task = None
+
+        self.indexed = 0
+        self.failed = 0
+        self.flushes = 0
+
+    async def init(self, loop=None):
+        await super().init(loop)
+        self._has_room = asyncio.Event()
+        self._has_room.set()
+        self._flush_semaphore = asyncio.Semaphore(self.max_concurrent_flushes)
+        self._interval_task = self.loop.create_task(self._flush_by_interval())
+
+    async def close(self):
+        self._interval_task.cancel()
+        self._flush()
+        while self._flush_tasks:
+            await asyncio.wait(list(self._flush_tasks))
+        self.logger.info(
+            "Bulk indexing stats: %s indexed, %s failed by %s flushes, "
+            "%s near-duplicates",
+            self.indexed,
+            self.failed,
+            self.flushes,
+            self.duplicates,
+        )
+        await super().close()
+
+    def action(self, report: FetchReport) -> dict:
+        return {
+            "index": {
+                "_index": self.index,
+                "_type": self.doc_type,
+                "_id": self.document_id(report),
+            }
+        }
+
+    async def do_report(self, report: FetchReport):
+        if not self.is_indexable(report):
+            self.logger.debug(
+                "Report is not suitable for indexing: %s", report.unsuccess_msg
+            )
+            return
+        while self._pending_docs >= self.max_pending_docs:  # back-pressure
+            self._has_room.clear()
+            await self._has_room.wait()
+        document = self.document(report)
+        if document is None:
+            return
+        item = (
+            json.dumps(self.action(report)),
+            json.dumps(document, ensure_ascii=False),
+        )
+        self._buffer.append(item)
+        self._buffer_bytes += len(item[0]) + len(item[1]) + 2
+        self._pending_docs += 1
+        if len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes:
+            self._flush()
+
+    async def _flush_by_interval(self):
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                self._flush()
+            except asyncio.CancelledError:
+                break
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        items, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        task = self.loop.create_task(self._send(items))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _send(self, items):
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                if attempt > 1:
+                    await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 2))
+                items = await self._send_bulk(items)
+                if not items:
+                    return
+                self.logger.info(
+                    "Bulk try %s: %s documents to retry", attempt, len(items)
+                )
+            self.failed += len(items)
+            self.logger.error("%s documents are not indexed, out of tries", len(items))
+        except Exception:
+            self.failed += len(items)
+            self.logger.exception("Bulk indexing of %s documents failed", len(items))
+        finally:
+            self._pending_docs -= len(items)
+            self._has_room.set()
+
+    async def _send_bulk(self, items) -> list:
+        # returns items that should be retried
+        body = "".join(f"{action}\n{source}\n" for action, source in items)
+        async with self._flush_semaphore:
+            self.flushes += 1
+            try:
+                result = await self.es.bulk(body=body)
+            except TransportError as error:
+                if error.status_code in self.retryable_statuses or not isinstance(
+                    error.status_code, int
+                ):  # N/A status is for the connection errors
+                    self.logger.warning("Bulk request failed: %r", error)
+                    return items
+                raise
+        if not result.get("errors"):
+            self.indexed += len(items)
+            self._pending_docs -= len(items)
+            self._has_room.set()
+            return []
+        retry_items = []
+        for item, response in zip(items, result["items"]):
+            status = next(iter(response.values()))["status"]
+            if status in self.retryable_statuses:
+                retry_items.append(item)
+            elif status >= 300:
+                self.failed += 1
+                self.logger.error("Document is not indexed: %s", response)
+            else:
+                self.indexed += 1
+        self._pending_docs -= len(items) - len(retry_items)
+        self._has_room.set()
+        return retry_items
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites urls to the canonical form, so the same page is fetched only once
+
+    e.g. 'HTTP://Host:80/a/../b?utm_source=x&b=2&a=1#top' -> 'http://host/b?a=1&b=2'
+    """
+
+    default_strip_params = (
+        "gclid",
+        "fbclid",
+        "yclid",
+        "msclkid",
+        "_ga",
+        "mc_cid",
+        "mc_eid",
+        "sid",
+        "sessionid",
+        "session_id",
+        "jsessionid",
+        "phpsessid",
+    )
+    default_strip_params_prefixes = ("utm_",)
+    default_ports = {"http": 80, "https": 443}
+    session_path_param_re = re.compile(r";(jsessionid|phpsessid|sid)=[^/?#]*", re.I)
+
+    def __init__(
+        self,
+        remove_default_port=True,
+        resolve_dot_segments=True,
+        sort_query=True,
+        strip_params: Iterable[str] = default_strip_params,
+        strip_params_prefixes: Iterable[str] = default_strip_params_prefixes,
+        remove_trailing_slash=False,
+    ):
+        self.remove_default_port = remove_default_port
+        self.resolve_dot_segments = resolve_dot_segments
+        self.sort_query = sort_query
+        self.strip_params = {param.lower() for param in strip_params}
+        self.strip_params_prefixes = tuple(p.lower() for p in strip_params_prefixes)
+        self.remove_trailing_slash = remove_trailing_slash
+
+        self.canonicalized = 0
+        self.rewritten = 0
+
+    def __call__(self, url: str) -> str:
+        return self.canonicalize(url)
+
+    def canonicalize(self, url: str) -> str:
+        self.canonicalized += 1
+        try:
+            parsed_url = urllib.parse.urlsplit(url)
+            port = parsed_url.port
+        except ValueError:  # bad port or smth, let it be as it is
+            return url
+        scheme = parsed_url.scheme.lower()
+
+        netloc = (parsed_url.hostname or "").lower()
+        if ":" in netloc:  # ipv6
+            netloc = f"[{netloc}]"
+        if port is not None and not (
+            self.remove_default_port and self.default_ports.get(scheme) == port
+        ):
+            netloc = f"{netloc}:{port}"
+        userinfo, at, _ = parsed_url.netloc.rpartition("@")
+        if at:
+            netloc = f"{userinfo}@{netloc}"
+
+        path = self.session_path_param_re.sub("", parsed_url.path)
+        if self.resolve_dot_segments:
+            path = self.remove_dot_segments(path)
+        if self.remove_trailing_slash and len(path) > 1:
+            path = path.rstrip("/") or "/"
+        path = path or "/"
+
+        query = self.canonicalize_query(parsed_url.query)
+
+        canonical_url = urllib.parse.urlunsplit((scheme, netloc, path, query, ""))
+        if canonical_url != url:
+            self.rewritten += 1
+        return canonical_url
+
+    def canonicalize_query(self, query: str) -> str:
+        # raw pairs are kept as is, the decoding & encoding back may change the url
+        params = []
+        for param in query.split("&"):
+            if not param:
+                continue
+            name = urllib.parse.unquote_plus(param.partition("=")[0]).lower()
+            if name in self.strip_params or name.startswith(self.strip_params_prefixes):
+                continue
+            params.append(param)
+        if self.sort_query:
+            params.sort()
+        return "&".join(params)
+
+    @staticmethod
+    def remove_dot_segments(path: str) -> str:
+        # https://tools.ietf.org/html/rfc3986#section-5.2.4
+        if "." not in path:
+            return path
+        segments = path.split("/")
+        output = []
+        for segment in segments:
+            if segment == ".":
+                continue
+            if segment == "..":
+                if len(output) > 1:
+                    output.pop()
+                continue
+            output.append(segment)
+        if segments[-1] in (".", ".."):
+            output.append("")  # '/a/b/..' -> '/a/'
+        return "/".join(output)
+
+    def stats(self) -> dict:
+        return {"canonicalized": self.canonicalized, "rewritten": self.rewritten}
+
+
+class CrawlerParser:
+    """ Html parser for getting urls list and getting text from html """
+
+    # xml is not a page, sitemaps are read by the SitemapLoader
+    parsable_content_types = ["text/html"]
+    # during html parsing you better ignore this elements bc they have no text
+    ignore_text_elements_list = [
+        "style",
+        "script",
+        "head",
+        "title",
+        "meta",
+        "[document]",
+    ]
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+
+    def parse_text_and_urls_from_html(
+        self, html: str, base_url: str, root_domain: str
+    ) -> Tuple[str, set]:
+        raise NotImplementedError
+
+    async def parse(
+        self,
+        html: str,
+        base_url: str,
+        root_domain: str,
+        url_exclude_pattern=None,
+        pool=None,
+        loop=None,
+    ) -> Tuple[str, set]:
+        loop = loop or asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            pool,
+            self.parse_text_and_urls_from_html,
+            html,
+            base_url,
+            root_domain,
+            url_exclude_pattern,
+        )
+
+    def is_parsable(self, content_type):
+        if content_type in self.parsable_content_types:
+            return True
+        return False
+
+    def link_stream(self, base_url: str, encoding=None) -> Optional["LinkStream"]:
+        # incremental links parser for the body chunks, if parser can do it
+        return None
+
+    # signatures of the things that are mislabeled as html sometimes
+    binary_signatures = (
+        b"%PDF",
+        b"\x89PNG",
+        b"GIF8",
+        b"\xff\xd8\xff",
+        b"PK\x03\x04",
+        b"\x1f\x8b",
+        b"Rar!",
+        b"7z\xbc\xaf",
+        b"\x7fELF",
+        b"MZ",
+        b"ID3",
+        b"OggS",
+        b"RIFF",
+        b"\x00\x00\x00",
+    )
+
+    @classmethod
+    def is_binary_body(cls, first_chunk: bytes) -> bool:
+        if first_chunk.startswith(cls.binary_signatures):
+            return True
+        if first_chunk.startswith((b"\xff\xfe", b"\xfe\xff")):  # utf-16 text
+            return False
+        return b"\x00" in first_chunk[:1024]
+
+    @staticmethod
+    def trim_and_cleanup_text(text: str) -> str:
+        # e.g. '\n\n\nsome\ntext     with\nspaces\n\n'
+
+        # trimming leading and trailing whitespace at each line
+        lines = (line.strip() for line in text.splitlines())
+        # finding space chains ('     ') and reducing them
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        # creating test with a lot of line terminators
+        result = "\n".join(chunk for chunk in chunks if chunk)
+        return result
+
+    @staticmethod
+    def normalize_urls(urls: set, base_url: str) -> set:
+        normalized_urls = set()
+        for url in urls:
+            normalized_url = urllib.parse.urljoin(base_url, url)
+            normalized_url, _ = urllib.parse.urldefrag(normalized_url)
+            normalized_urls.add(normalized_url)
+        return normalized_urls
+
+    def filter_urls(
+        self,
+        urls: set,
+        root_domain: str,
+        url_exclude_pattern=None,
+        robots: "RobotsCache" = None,
+    ):
+        filtered_urls = set()
+        for url in urls:
+            if not self.is_url_allowed(url, root_domain, url_exclude_pattern):
+                continue
+            if robots is not None and not robots.is_allowed_cached(url):
+                continue
+            filtered_urls.add(url)
+        return filtered_urls
+
+    @staticmethod
+    def is_redirect(response):
+        # decided that this function will fit ok in that class instead of
+        # creating utils.py with a single function
+        return response.status in (300, 301, 302, 303, 307)
+
+    @staticmethod
+    def is_url_allowed(url, root_domain=None, exclude_pattern=None):
+        # without root_domain any host is allowed (e.g. scope is checked by crawler)
+        if exclude_pattern and re.search(exclude_pattern, url):
+            # contains smth that we excluding
+            return False
+
+        parsed_url = urllib.parse.urlparse(url)
+        if parsed_url.scheme not in ("http", "https"):
+            # not http scheme, will skip url
+            return False
+
+        host, _ = urllib.parse.splitport(parsed_url.netloc)
+        host = host.lower()
+        if root_domain is not None and host != root_domain:
+            # not root host, will skip url
+            return False
+
+        return True
+
+    @staticmethod
+    def is_url_valid(url):
+        try:
+            parsed_url = urllib.parse.urlparse(url)
+            return all([parsed_url.scheme, parsed_url.netloc])
+        except (AttributeError, TypeError):
+            return False
+
+
+class BSCrawlerParser(CrawlerParser):
+    """ Parser implementation by BeautifulSoup """
+
+    html_parser = "html.parser"
+
+    def _tag_visible(self, element):
+        if element.parent.name in self.ignore_text_elements_list:
+            return False
+        if isinstance(element, bs4.element.Comment):
+            return False
+        return True
+
+    def parse_text_and_urls_from_html(
+        self, html: str, base_url: str, root_domain: str, url_exclude_pattern=None
+    ) -> Tuple[str, set]:
+        soup = bs4.BeautifulSoup(html, self.html_parser)
+
+        links = set()
+        for link in soup.find_all("a"):
+            href = link.get("href")
+            if href:
+                links.add(href)
+        links = self.normalize_urls(links, base_url)
+        links = self.filter_urls(links, root_domain, url_exclude_pattern)
+
+        # better than [s.extract() for s in soup(self.ignore_text_elements_list)]
+        tags_with_text = soup.find_all(text=True)
+        tags_with_visible_text = filter(self._tag_visible, tags_with_text)
+        text = "".join(tags_with_visible_text)
+        text = self.trim_and_cleanup_text(text)
+
+        return text, links
+
+
+class LinkStream:
+    """
+    Takes links from the html body by chunks, while it's downloading
+    """
+
+    def __init__(self, parser: "CrawlerParser", base_url: str, encoding=None):
+        self.parser = parser
+        self.base_url = base_url
+        self._parser = lxml.etree.HTMLPullParser(
+            events=("start",), tag="a", encoding=encoding
+        )
+
+    def feed(self, chunk: bytes) -> set:
+        self._parser.feed(chunk)
+        return self._read_links()
+
+    def close(self) -> set:
+        try:
+            self._parser.close()
+        except lxml.etree.XMLSyntaxError:  # e.g. empty document
+            pass
+        return self._read_links()
+
+    def _read_links(self) -> set:
+        links = set()
+        for _, element in self._parser.read_events():
+            href = element.get("href")
+            if href:
+                links.add(href)
+        links = self.parser.normalize_urls(links, self.base_url)
+        return self.parser.filter_urls(links, None)
+
+
+class LxmlCrawlerParser(CrawlerParser):
+    """
+    Parser implementation by lxml (libxml2 html parser)
+
+    Links and visible text are taken in the single walk over the tree, it's
+    several times faster than BSCrawlerParser, see parser_benchmark.py
+    """
+
+    def parse_text_and_urls_from_html(
+        self, html: str, base_url: str, root_domain: str, url_exclude_pattern=None
+    ) -> Tuple[str, set]:
+        try:
+            root = lxml.html.document_fromstring(html)
+        except ValueError:  # str with xml encoding declaration is not allowed
+            root = lxml.html.document_fromstring(html.encode())
+        except lxml.etree.ParserError:  # e.g. empty document
+            return "", set()
+
+        ignored = set(self.ignore_text_elements_list)
+        links = set()
+        texts = []
+        # text is taken on element's start, tail (text after the element) on it's
+        # end, so the text order is the same as in the document
+        for event, element in lxml.etree.iterwalk(root, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag == "a":
+                    href = element.get("href")
+                    if href:
+                        links.add(href)
+                # comments and processing instructions have no str tag
+                if element.text and isinstance(tag, str) and tag not in ignored:
+                    texts.append(element.text)
+            elif element.tail:
+                parent = element.getparent()
+                if parent is not None and parent.tag not in ignored:
+                    texts.append(element.tail)
+
+        links = self.normalize_urls(links, base_url)
+        links = self.filter_urls(links, root_domain, url_exclude_pattern)
+
+        text = self.trim_and_cleanup_text("".join(texts))
+        return text, links
+
+    def link_stream(self, base_url: str, encoding=None) -> Optional[LinkStream]:
+        return LinkStream(self, base_url, encoding)
+
+
+def parse_pages_batch(parser: CrawlerParser, pages: list) -> list:
+    # runs in the pool process, pages are (body, base_url, encoding, exclude_pattern)
+    # body may be raw bytes, then it's decoded here and not in the event loop
+    results = []
+    for body, base_url, encoding, url_exclude_pattern in pages:
+        try:
+            if isinstance(body, bytes):
+                body = body.decode(encoding or "utf-8", errors="replace")
+            results.append(
+                parser.parse_text_and_urls_from_html(
+                    body, base_url, None, url_exclude_pattern
+                )
+            )
+        except Exception as exception:  # exception is returned to it's page only
+            results.append(exception)
+    return results
+
+
+class CrawlerParseBatcher:
+    """
+    Gathers pages for parsing and sends them to the pool by batches
+
+    The batch is sent when there are batch_size pages or after max_delay secs.
+    Batch size adapts to the pool load: while all the workers are busy it grows
+    up to max_batch_size (less pickling and IPC per page), and when the pool is
+    idle it shrinks back, so pages are not waiting for the batch to fill
+    """
+
+    def __init__(
+        self,
+        parser: CrawlerParser,
+        pool: ProcessPoolExecutor,
+        max_batch_size=32,
+        max_delay=0.01,
+        pool_workers=None,
+        logger=None,
+        loop=None,
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+        self.parser = parser
+        self.pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.pool_workers = pool_workers or os.cpu_count()
+
+        self.batch_size = 1
+        self._pages: list = []  # (page, future)
+        self._timer: asyncio.TimerHandle = None
+        self._in_flight = 0  # batches sent to the pool and not done yet
+
+        self.batches = 0
+        self.pages = 0
+
+    async def init(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+
+    async def close(self):
+        self._flush()
+
+    async def parse(
+        self,
+        body: Union[str, bytes],
+        base_url: str,
+        encoding=None,
+        url_exclude_pattern=None,
+    ) -> Tuple[str, set]:
+        future = self.loop.create_future()
+        self._pages.append(((body, base_url, encoding, url_exclude_pattern), future))
+        if len(self._pages) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _adapt_batch_size(self):
+        if self._in_flight >= self.pool_workers:
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+        elif self._in_flight < self.pool_workers // 2:
+            self.batch_size = max(self.batch_size // 2, 1)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pages:
+            return
+        batch, self._pages = self._pages, []
+        self._adapt_batch_size()
+        pages, futures = zip(*batch)
+        try:
+            pool_future = self.pool.submit(parse_pages_batch, self.parser, list(pages))
+        except Exception as exception:  # e.g. BrokenProcessPool
+            # it may be called by the timer, so nobody else would see the exception
+            self.logger.error("Parse batch submit failed: %r", exception)
+            self._set_exception(futures, exception)
+            return
+        self._in_flight += 1
+        self.batches += 1
+        self.pages += len(pages)
+        asyncio.wrap_future(pool_future, loop=self.loop).add_done_callback(
+            lambda done: self._set_results(done, futures)
+        )
+
+    @staticmethod
+    def _set_exception(futures, exception):
+        for future in futures:
+            if not future.done():
+                future.set_exception(exception)
+
+    def _set_results(self, done: asyncio.Future, futures):
+        self._in_flight -= 1
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        if done.exception() is not None:
+            self._set_exception(futures, done.exception())
+            return
+        results = done.result()
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "pages": self.pages,
+            "avg_batch_size": self.pages / self.batches if self.batches else 0,
+            "batch_size": self.batch_size,
+        }
+
+
+class TokenBucket:
+    """ Token bucket, refilled by `rate` tokens per second up to `capacity` """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+    def delay(self, now) -> float:
+        """ Seconds until the next token is available """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class PolitenessScheduler:
+    """
+    Per-host politeness scheduler
+
+    Urls are kept in per-host delay queues, hosts are ordered in a heap by the time
+    when their token bucket allows the next request. Workers get the url of any
+    host, that is ready, so the slow (or crawl-delayed) host never stalls the others,
+    and nobody holds a lock while sleeping.
+
+    Optional max_rps limits the overall rate across all hosts.
+    """
+
+    def __init__(
+        self,
+        max_rps_per_host: float,
+        burst=1,
+        max_rps=None,
+        max_buffered=10000,
+        logger=None,
+        loop=None,
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+
+        self.max_rps_per_host = max_rps_per_host
+        self.burst = burst
+        self.max_rps = max_rps
+        self.max_buffered = max_buffered
+
+        self._buckets = {}  # host -> TokenBucket
+        self._crawl_delays = {}  # host -> seconds, e.g. from robots.txt
+        self._global_bucket: TokenBucket = None
+
+        self._urls = {}  # host -> deque of (url, depth)
+        self._heap = []  # (ready_at, seq, host), every host with urls is here once
+        self._seq = itertools.count()
+        self._size = 0
+
+        self._wakeup: asyncio.Event = None
+        self._not_full: asyncio.Event = None
+
+        # buckets of idle hosts are dropped, so memory doesn't grow with crawled hosts
+        self.max_idle_buckets = 10000
+
+    async def init(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        self._not_full = asyncio.Event()
+        if self.max_rps:
+            self._global_bucket = TokenBucket(self.max_rps, 1, self.loop.time())
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def host_of(url) -> str:
+        return (urllib.parse.urlparse(url).hostname or "").lower()
+
+    def set_crawl_delay(self, host, delay: Optional[float]):
+        """ Crawl-delay overrides the per-host rate if it is slower """
+        host = host.lower()
+        if delay:
+            self._crawl_delays[host] = delay
+        else:
+            self._crawl_delays.pop(host, None)
+        self._buckets.pop(host, None)  # will be recreated with the new rate
+
+    def _bucket(self, host, now) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, capacity = self.max_rps_per_host, self.burst
+            crawl_delay = self._crawl_delays.get(host)
+            if crawl_delay and 1 / crawl_delay < rate:
+                rate, capacity = 1 / crawl_delay, 1
+            bucket = self._buckets[host] = TokenBucket(rate, capacity, now)
+        return bucket
+
+    def _delay(self, host, now) -> float:
+        delay = self._bucket(host, now).delay(now)
+        if self._global_bucket is not None:
+            delay = max(delay, self._global_bucket.delay(now))
+        return delay
+
+    def _take(self, host, now):
+        self._bucket(host, now).take(now)
+        if self._global_bucket is not None:
+            self._global_bucket.take(now)
+
+    def _schedule(self, host, now):
+        ready_at = now + self._delay(host, now)
+        heapq.heappush(self._heap, (ready_at, next(self._seq), host))
+
+    async def put(self, url, depth=None):
+        # back-pressure for the feeder
+        while self._size >= self.max_buffered:
+            self._not_full.clear()
+            await self._not_full.wait()
+
+        host = self.host_of(url)
+        urls = self._urls.get(host)
+        if urls is None:
+            now = self.loop.time()
+            if len(self._buckets) > len(self._urls) + self.max_idle_buckets:
+                self._prune_buckets(now)
+            urls = self._urls[host] = deque()
+            self._schedule(host, now)
+        urls.append((url, depth))
+        self._size += 1
+        self._wakeup.set()
+
+    async def get(self) -> Tuple[str, int]:
+        while True:
+            now = self.loop.time()
+            timeout = None
+            if self._heap:
+                ready_at, _, host = self._heap[0]
+                if ready_at <= now:
+                    heapq.heappop(self._heap)
+                    delay = self._delay(host, now)
+                    if delay > 0:  # e.g. global limit or crawl-delay was changed
+                        heapq.heappush(self._heap, (now + delay, next(self._seq), host))
+                        continue
+                    return self._pop(host, now)
+                timeout = ready_at - now
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune_buckets(self, now):
+        # full bucket of the host without urls is the same as the new one
+        for host, bucket in list(self._buckets.items()):
+            if host not in self._urls and bucket.is_full(now):
+                del self._buckets[host]
+
+    def _pop(self, host, now) -> Tuple[str, int]:
+        self._take(host, now)
+        urls = self._urls[host]
+        url, depth = urls.popleft()
+        if urls:
+            self._schedule(host, now)
+        else:
+            del self._urls[host]
+        self._size -= 1
+        self._not_full.set()
+        return url, depth
+
+    async def acquire(self, host):
+        """ Waits for the host token, e.g. for retries of already scheduled url """
+        host = host.lower()
+        while True:
+            now = self.loop.time()
+            delay = self._delay(host, now)
+            if delay <= 0:
+                self._take(host, now)
+                return
+            self.logger.debug("Host %r is not ready, will sleep for %s", host, delay)
+            await asyncio.sleep(delay)
+
+
+class CrawlerSeenSet:
+    """
+    Base class for the set of urls that crawler already knows
+
+    Urls are stored as 64-bit fingerprints, not as strings
+    """
+
+    def add(self, url) -> bool:
+        # returns True if url is new
+        return self.add_fingerprint(self.fingerprint(url))
+
+    def add_fingerprint(self, fingerprint: int) -> bool:
+        raise NotImplementedError
+
+    def __contains__(self, url):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    @property
+    def nbytes(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"urls": len(self), "bytes": self.nbytes}
+
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        digest = hashlib.blake2b(url.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1  # zero is the empty slot mark
+
+
+class FingerprintSeenSet(CrawlerSeenSet):
+    """
+    Exact (up to fingerprint collisions) seen set
+
+    Open addressing hash set over array of uint64, so it's 8 bytes per slot,
+    16-32 bytes per url with the default load, instead of 100+ for a set of str
+    """
+
+    def __init__(self, capacity=1024, max_load=0.5):
+        self.max_load = max_load
+        size = 8
+        while size * max_load < capacity:
+            size *= 2
+        self._table = array("Q", [0]) * size
+        self._mask = size - 1
+        self._len = 0
+
+    def _slot(self, fingerprint: int) -> int:
+        table, mask = self._table, self._mask
+        i = fingerprint & mask
+        while table[i] and table[i] != fingerprint:
+            i = (i + 1) & mask
+        return i
+
+    def _grow(self):
+        old_table = self._table
+        self._table = array("Q", [0]) * (len(old_table) * 2)
+        self._mask = len(self._table) - 1
+        for fingerprint in old_table:
+            if fingerprint:
+                self._table[self._slot(fingerprint)] = fingerprint
+
+    def add_fingerprint(self, fingerprint: int) -> bool:
+        i = self._slot(fingerprint)
+        if self._table[i]:
+            return False
+        self._table[i] = fingerprint
+        self._len += 1
+        if self._len > len(self._table) * self.max_load:
+            self._grow()
+        return True
 
-    exception: Optional[Exception] = None
+    def has_fingerprint(self, fingerprint: int) -> bool:
+        return bool(self._table[self._slot(fingerprint)])
 
+    def __contains__(self, url):
+        return self.has_fingerprint(self.fingerprint(url))
 
-class CrawlerReporter:
-    """ Base class for reporters """
+    def __len__(self):
+        return self._len
 
-    def __init__(self, logger=None, loop=None):
-        self.loop = loop or asyncio.get_event_loop()
-        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+    @property
+    def nbytes(self) -> int:
+        return len(self._table) * self._table.itemsize
 
-    async def init(self, loop=None):
-        self.loop = loop or asyncio.get_event_loop()
 
-    async def close(self):
-        pass
+class BloomFilter:
+    """ Plain bloom filter over 64-bit fingerprints, k positions by double hashing """
 
-    async def do_report(self, report: FetchReport):
-        # todo: think about necessity of reporting non 200 fetch results
-        raise NotImplementedError
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
 
+    def _positions(self, fingerprint: int):
+        h1, h2 = fingerprint & 0xFFFFFFFF, (fingerprint >> 32) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
 
-class StdOutCrawlerReporter(CrawlerReporter):
-    """ Simple reporting to stdout for debug purposes """
+    def add(self, fingerprint: int):
+        for pos in self._positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
 
-    async def do_report(self, report: FetchReport):
-        if report.status == 200 and report.text:
-            print(f"Url {report.url} text: {report.text!r}")
+    def __contains__(self, fingerprint: int):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
 
 
-class ElasticSearchCrawlerReporter(CrawlerReporter):
-    """ Reporter that indexes fetch reports """
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by adding new filters when the last one is full
 
-    def __init__(self, host, port, index, doc_type, logger=None, loop=None):
-        super().__init__(logger, loop)
-        self.host = host
-        self.port = port
+    Every next filter is bigger (growth) and tighter (tightening), so the total
+    false positive rate stays under error_rate however many urls are added
+    """
 
-        self.es: Elasticsearch = None
+    def __init__(self, capacity=100000, error_rate=0.001, growth=2, tightening=0.5):
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(capacity, error_rate * (1 - tightening))]
+
+    def add(self, fingerprint: int):
+        last = self.filters[-1]
+        if last.count >= last.capacity:
+            last = BloomFilter(
+                last.capacity * self.growth, last.error_rate * self.tightening
+            )
+            self.filters.append(last)
+        last.add(fingerprint)
 
-        self.index = index
-        self.doc_type = doc_type
+    def __contains__(self, fingerprint: int):
+        return any(fingerprint in bloom for bloom in reversed(self.filters))
 
-    async def init(self, loop=None):
-        await super().init(loop)
-        self.es = Elasticsearch(
-            hosts=[{"host": self.host, "port": self.port}], loop=self.loop
-        )
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
 
-    async def close(self):
-        await self.es.close()
+    @property
+    def nbytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters)
 
-    async def do_report(self, report: FetchReport):
-        if report.status == 200 and report.text:
-            self.logger.debug('Indexing "ok" fetching result to elasticsearch')
-            body = {"root_url": report.root_url, "url": report.url, "text": report.text}
-            indexing_result = await self.es.index(
-                index=self.index, doc_type=self.doc_type, body=body
-            )
-            self.logger.debug("Indexing result: %s", indexing_result)
-        else:
-            self.logger.debug(
-                "Report is not suitable for indexing: %s", report.unsuccess_msg
-            )
 
+class BloomSeenSet(CrawlerSeenSet):
+    """
+    Seen set on top of scalable bloom filter, ~2 bytes per url for 0.1% errors
 
-class CrawlerParser:
-    """ Html parser for getting urls list and getting text from html """
+    False positive means that new url is taken as seen and won't be crawled.
+    To know how often it happens, 1 of sample_rate urls (sampled by independent
+    hash) is also kept in the exact set and lookups of them are checked
+    """
 
-    parsable_content_types = ["text/html", "application/xml"]
-    # during html parsing you better ignore this elements bc they have no text
-    ignore_text_elements_list = [
-        "style",
-        "script",
-        "head",
-        "title",
-        "meta",
-        "[document]",
-    ]
+    def __init__(self, capacity=100000, error_rate=0.001, sample_rate=64):
+        self.bloom = ScalableBloomFilter(capacity, error_rate)
+        self.sample_rate = sample_rate
+        self.sample = FingerprintSeenSet()
+        self.sampled_lookups = 0  # lookups of sampled urls that were not seen
+        self.false_positives = 0
 
-    def __init__(self, logger=None):
-        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+    def _is_sampled(self, url) -> bool:
+        return zlib.crc32(url.encode()) % self.sample_rate == 0
 
-    def parse_text_and_urls_from_html(
-        self, html: str, base_url: str, root_domain: str
-    ) -> Tuple[str, set]:
-        raise NotImplementedError
+    def add(self, url) -> bool:
+        fingerprint = self.fingerprint(url)
+        if self._is_sampled(url):
+            self.sample.add_fingerprint(fingerprint)
+        return self.add_fingerprint(fingerprint)
 
-    async def parse(
-        self,
-        html: str,
-        base_url: str,
-        root_domain: str,
-        url_exclude_pattern=None,
-        pool=None,
-        loop=None,
-    ) -> Tuple[str, set]:
-        loop = loop or asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            pool,
-            self.parse_text_and_urls_from_html,
-            html,
-            base_url,
-            root_domain,
-            url_exclude_pattern,
-        )
+    def add_fingerprint(self, fingerprint: int) -> bool:
+        if fingerprint in self.bloom:
+            return False
+        self.bloom.add(fingerprint)
+        return True
 
-    def is_parsable(self, content_type):
-        if content_type in self.parsable_content_types:
-            return True
-        return False
+    def __contains__(self, url):
+        fingerprint = self.fingerprint(url)
+        seen = fingerprint in self.bloom
+        if self._is_sampled(url) and not self.sample.has_fingerprint(fingerprint):
+            self.sampled_lookups += 1
+            if seen:
+                self.false_positives += 1
+            return False
+        return seen
 
-    @staticmethod
-    def trim_and_cleanup_text(text: str) -> str:
-        # e.g. '\n\n\nsome\ntext     with\nspaces\n\n'
+    def __len__(self):
+        return len(self.bloom)
 
-        # trimming leading and trailing whitespace at each line
-        lines = (line.strip() for line in text.splitlines())
-        # finding space chains ('     ') and reducing them
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        # creating test with a lot of line terminators
-        result = "\n".join(chunk for chunk in chunks if chunk)
-        return result
+    @property
+    def nbytes(self) -> int:
+        return self.bloom.nbytes + self.sample.nbytes
 
-    @staticmethod
-    def normalize_urls(urls: set, base_url: str) -> set:
-        normalized_urls = set()
-        for url in urls:
-            normalized_url = urllib.parse.urljoin(base_url, url)
-            normalized_url, _ = urllib.parse.urldefrag(normalized_url)
-            normalized_urls.add(normalized_url)
-        return normalized_urls
+    @property
+    def false_positive_rate(self) -> Optional[float]:
+        if not self.sampled_lookups:
+            return None
+        return self.false_positives / self.sampled_lookups
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(
+            filters=len(self.bloom.filters),
+            false_positives=self.false_positives,
+            sampled_lookups=self.sampled_lookups,
+            false_positive_rate=self.false_positive_rate,
+        )
+        return stats
 
-    def filter_urls(self, urls: set, root_domain: str, url_exclude_pattern=None):
-        filtered_urls = set()
-        for url in urls:
-            if self.is_url_allowed(url, root_domain, url_exclude_pattern):
-                filtered_urls.add(url)
-        return filtered_urls
 
-    @staticmethod
-    def is_redirect(response):
-        # decided that this function will fit ok in that class instead of
-        # creating utils.py with a single function
-        return response.status in (300, 301, 302, 303, 307)
+class RobotsRules:
+    """
+    Compiled rules of the robots.txt for one user agent
 
-    @staticmethod
-    def is_url_allowed(url, root_domain, exclude_pattern=None):
-        if exclude_pattern and re.search(exclude_pattern, url):
-            # contains smth that we excluding
-            return False
+    The longest matching rule wins, allow wins on the tie (like google does).
+    Rules without wildcards are matched by str.startswith, others by regexps
+    """
 
-        parsed_url = urllib.parse.urlparse(url)
-        if parsed_url.scheme not in ("http", "https"):
-            # not http scheme, will skip url
-            return False
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        # rules are (pattern, allow), sorted here by precedence
+        self.rules = []
+        for pattern, allow in sorted(rules, key=lambda r: (-len(r[0]), not r[1])):
+            if "*" in pattern or pattern.endswith("$"):
+                self.rules.append((self.compile_pattern(pattern).match, allow))
+            else:
+                self.rules.append((pattern, allow))
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
 
-        host, _ = urllib.parse.splitport(parsed_url.netloc)
-        host = host.lower()
-        if host != root_domain:
-            # not root host, will skip url
-            return False
+    @classmethod
+    def allow_all(cls) -> "RobotsRules":
+        return cls()
 
-        return True
+    @classmethod
+    def disallow_all(cls) -> "RobotsRules":
+        return cls([("/", False)])
 
     @staticmethod
-    def is_url_valid(url):
-        try:
-            parsed_url = urllib.parse.urlparse(url)
-            return all([parsed_url.scheme, parsed_url.netloc])
-        except (AttributeError, TypeError):
-            return False
+    def compile_pattern(pattern: str):
+        anchored = pattern.endswith("$")
+        if anchored:
+            pattern = pattern[:-1]
+        regexp = ".*".join(re.escape(part) for part in pattern.split("*"))
+        return re.compile(regexp + ("\\Z" if anchored else ""))
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str) -> "RobotsRules":
+        agent = user_agent.split("/")[0].lower()
+        groups = []  # [agents, rules, crawl_delay]
+        sitemaps = []
+        group = None
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            field, _, value = line.partition(":")
+            field, value = field.strip().lower(), value.strip()
+            if field == "sitemap":
+                sitemaps.append(value)
+            elif field == "user-agent":
+                if group is None or group[1] or group[2] is not None:
+                    group = [set(), [], None]
+                    groups.append(group)
+                group[0].add(value.lower())
+            elif group is None:
+                continue
+            elif field in ("allow", "disallow") and value:
+                group[1].append((value, field == "allow"))
+            elif field == "crawl-delay":
+                try:
+                    group[2] = float(value)
+                except ValueError:
+                    pass
+
+        # the most specific group of our agent, or '*' one, groups are merged
+        def agent_match_len(group) -> int:
+            return max((len(a) for a in group[0] if a != "*" and a in agent), default=0)
+
+        best = max(map(agent_match_len, groups), default=0)
+        if best:
+            selected = [g for g in groups if agent_match_len(g) == best]
+        else:
+            selected = [g for g in groups if "*" in g[0]]
+        rules = [rule for g in selected for rule in g[1]]
+        delays = [g[2] for g in selected if g[2] is not None]
+        return cls(rules, max(delays) if delays else None, sitemaps)
+
+    def is_allowed(self, url) -> bool:
+        parsed_url = urllib.parse.urlsplit(url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path = f"{path}?{parsed_url.query}"
+        for matcher, allow in self.rules:
+            if path.startswith(matcher) if isinstance(matcher, str) else matcher(path):
+                return allow
+        return True
 
 
-class BSCrawlerParser(CrawlerParser):
-    """ Parser implementation by BeautifulSoup """
+class RobotsCache:
+    """
+    Per host cache of robots.txt rules, each robots.txt is fetched once per ttl
 
-    html_parser = "html.parser"
+    Missing robots.txt (4xx) allows everything, server errors (5xx) disallow
+    everything for error_ttl secs. on_rules callback is called with the host and
+    the fresh rules, e.g. to apply the crawl-delay
+    """
 
-    def _tag_visible(self, element):
-        if element.parent.name in self.ignore_text_elements_list:
-            return False
-        if isinstance(element, bs4.element.Comment):
-            return False
-        return True
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        user_agent: str,
+        ttl=24 * 60 * 60,
+        error_ttl=10 * 60,
+        max_size=512 * 1024,
+        on_rules=None,
+        logger=None,
+        loop=None,
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+        self.session = session
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        self.on_rules = on_rules
 
-    def parse_text_and_urls_from_html(
-        self, html: str, base_url: str, root_domain: str, url_exclude_pattern=None
-    ) -> Tuple[str, set]:
-        soup = bs4.BeautifulSoup(html, self.html_parser)
+        self._rules = {}  # host -> (expires_at, RobotsRules)
+        self._fetching = {}  # host -> future, so robots.txt is fetched only once
 
-        links = set()
-        for link in soup.find_all("a"):
-            href = link.get("href")
-            if href:
-                links.add(href)
-        links = self.normalize_urls(links, base_url)
-        links = self.filter_urls(links, root_domain, url_exclude_pattern)
+        self.fetched = 0
 
-        # better than [s.extract() for s in soup(self.ignore_text_elements_list)]
-        tags_with_text = soup.find_all(text=True)
-        tags_with_visible_text = filter(self._tag_visible, tags_with_text)
-        text = "".join(tags_with_visible_text)
-        text = self.trim_and_cleanup_text(text)
+    @staticmethod
+    def host_of(url) -> str:
+        parsed_url = urllib.parse.urlsplit(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc.lower()}"
+
+    def cached(self, url) -> Optional[RobotsRules]:
+        expires_at, rules = self._rules.get(self.host_of(url), (0, None))
+        return rules if expires_at > self.loop.time() else None
+
+    def is_allowed_cached(self, url) -> bool:
+        # for urls of not yet known hosts it's True, they are checked before fetch
+        rules = self.cached(url)
+        return rules is None or rules.is_allowed(url)
+
+    async def is_allowed(self, url) -> bool:
+        return (await self.get(url)).is_allowed(url)
+
+    async def get(self, url) -> RobotsRules:
+        rules = self.cached(url)
+        if rules is not None:
+            return rules
+        host = self.host_of(url)
+        future = self._fetching.get(host)
+        if future is None:
+            future = self._fetching[host] = self.loop.create_task(self._fetch(host))
+            future.add_done_callback(lambda _: self._fetching.pop(host, None))
+        return await asyncio.shield(future)
+
+    async def _read_body(self, resp: aiohttp.ClientResponse) -> bytes:
+        # content.read(n) gives only the chunk at hand, the rest is read till eof,
+        # the body over max_size is cut as google does
+        body = bytearray()
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            body += chunk[:self.max_size - len(body)]
+            if len(body) >= self.max_size:
+                break
+        return bytes(body)
 
-        return text, links
+    async def _fetch(self, host) -> RobotsRules:
+        ttl = self.ttl
+        try:
+            async with self.session.get(f"{host}/robots.txt", max_redirects=5) as resp:
+                if resp.status >= 500:
+                    rules, ttl = RobotsRules.disallow_all(), self.error_ttl
+                elif resp.status >= 400:
+                    rules = RobotsRules.allow_all()
+                else:
+                    body = await self._read_body(resp)
+                    text = body.decode(resp.charset or "utf-8", errors="replace")
+                    rules = RobotsRules.parse(text, self.user_agent)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            self.logger.info("Can't fetch robots.txt of %s: %r", host, error)
+            rules, ttl = RobotsRules.allow_all(), self.error_ttl
+        self.fetched += 1
+        self._rules[host] = (self.loop.time() + ttl, rules)
+        if self.on_rules is not None:
+            self.on_rules(urllib.parse.urlsplit(host).hostname, rules)
+        return rules
+
+
+class SitemapLoader:
+    """
+    Enumerates page urls of the site by its sitemaps
+
+    Sitemaps are taken from robots.txt, or it's /sitemap.xml. Sitemap indexes
+    are followed, gzipped sitemaps are supported. Sitemaps are parsed while they
+    are downloading, by chunks, and parsed elements are dropped, so even the
+    big ones (50k urls) don't take much memory
 
+    Sitemaps are fetched politely too, if the scheduler is given, they wait for
+    the token of their host, as the pages do
+    """
 
-class AsyncRateLimiter:
-    """ RPS limiter """
+    max_sitemap_size = 50 * 1024 * 1024  # uncompressed, as the protocol says
 
-    def __init__(self, max_calls: int, period=1.0, logger=None, loop=None):
-        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        robots: RobotsCache = None,
+        scheduler: PolitenessScheduler = None,
+        max_sitemaps=100,
+        max_urls=1000000,
+        logger=None,
+        loop=None,
+    ):
         self.loop = loop or asyncio.get_event_loop()
+        self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
+        self.session = session
+        self.robots = robots
+        self.scheduler = scheduler
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+
+        self.sitemaps_fetched = 0
+        self.urls_found = 0
+
+    async def discover(self, root_url) -> list:
+        if self.robots is not None:
+            sitemaps = (await self.robots.get(root_url)).sitemaps
+            if sitemaps:
+                return sitemaps
+        return [urllib.parse.urljoin(root_url, "/sitemap.xml")]
+
+    async def urls(self, root_url) -> AsyncIterator[Tuple[str, Optional[datetime]]]:
+        # yields (url, lastmod) of all the sitemaps of the site
+        sitemaps = deque(await self.discover(root_url))
+        seen_sitemaps = set()
+        urls_count = 0
+        while sitemaps and len(seen_sitemaps) < self.max_sitemaps:
+            sitemap_url = sitemaps.popleft()
+            if sitemap_url in seen_sitemaps:
+                continue
+            seen_sitemaps.add(sitemap_url)
+            async for is_sitemap, loc, lastmod in self._read(sitemap_url):
+                if is_sitemap:  # it's sitemap index
+                    sitemaps.append(loc)
+                    continue
+                yield loc, lastmod
+                urls_count += 1
+                if urls_count >= self.max_urls:
+                    return
+
+    async def _read(self, sitemap_url):
+        # yields (is_sitemap, loc, lastmod) of the entries of the sitemap
+        self.logger.info("Reading sitemap %r", sitemap_url)
+        parser = lxml.etree.XMLPullParser(
+            events=("end",), resolve_entities=False, no_network=True
+        )
+        decompressor = None
+        size = 0
+        try:
+            await self._wait_turn(sitemap_url)
+            async with self.session.get(sitemap_url) as response:
+                if response.status != 200:
+                    status = response.status
+                    self.logger.info("Sitemap %r status %s", sitemap_url, status)
+                    return
+                self.sitemaps_fetched += 1
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    if size == 0 and chunk.startswith(b"\x1f\x8b"):  # gzip
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    if decompressor is not None:
+                        chunk = decompressor.decompress(chunk)
+                    size += len(chunk)
+                    if size > self.max_sitemap_size:
+                        self.logger.info("Sitemap %r is too large", sitemap_url)
+                        return
+                    parser.feed(chunk)
+                    for entry in self._entries(parser):
+                        yield entry
+            if decompressor is not None:  # the rest of the data it buffers
+                parser.feed(decompressor.flush())
+            parser.close()
+            for entry in self._entries(parser):
+                yield entry
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            self.logger.info("Can't fetch sitemap %r: %r", sitemap_url, error)
+        except (lxml.etree.XMLSyntaxError, zlib.error) as error:
+            self.logger.info("Bad sitemap %r: %r", sitemap_url, error)
+
+    async def _wait_turn(self, sitemap_url):
+        if self.scheduler is None:
+            return
+        if self.robots is not None:  # so Crawl-delay of the host is known
+            await self.robots.get(sitemap_url)
+        await self.scheduler.acquire(self.scheduler.host_of(sitemap_url))
+
+    def _entries(self, parser):
+        for _, element in parser.read_events():
+            tag = self.local_name(element.tag)
+            if tag not in ("url", "sitemap"):
+                continue
+            fields = {self.local_name(child.tag): child.text for child in element}
+            loc = (fields.get("loc") or "").strip()
+            lastmod = self.parse_lastmod(fields.get("lastmod"))
+            # parsed elements are dropped, the tree doesn't grow
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+            if loc:
+                self.urls_found += tag == "url"
+                yield tag == "sitemap", loc, lastmod
 
-        self.max_calls = max_calls
-        self.period = period
+    @staticmethod
+    def local_name(tag) -> str:
+        return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
 
-        self.last_reset = time.time()
-        self.num_calls = 0
+    @staticmethod
+    def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+        # w3c datetime, e.g. 2019-01-02 or 2019-01-02T10:00:00Z
+        if not value:
+            return None
+        try:
+            lastmod = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if lastmod.tzinfo is None:
+            lastmod = lastmod.replace(tzinfo=timezone.utc)
+        return lastmod
 
-        self.lock = asyncio.Lock(loop=self.loop)
 
-    async def __aenter__(self):
-        while True:
-            async with self.lock:
-                now = time.time()
-                elapsed = now - self.last_reset
-                period_remaining = self.period - elapsed
-
-                if period_remaining <= 0:
-                    self.num_calls = 0
-                    self.last_reset = time.time()
-
-                self.num_calls += 1
-
-                if self.num_calls > self.max_calls:
-                    self.logger.debug(
-                        "Rate limit is exceeded, will sleep for %s", period_remaining
-                    )
-                    await asyncio.sleep(period_remaining)
-                    continue
-                else:
-                    return self
+class ConnectionStats:
+    """
+    Per host counters of new and reused connections, collected by aiohttp tracing
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        pass
+    Reuse ratio shows how well the handshakes (tcp, tls) are amortized by keepalive
+    """
+
+    def __init__(self):
+        self.new = {}
+        self.reused = {}
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+        return trace_config
+
+    async def _on_request_start(self, session, context, params):
+        context.host = params.url.host
+
+    async def _on_connection_create_end(self, session, context, params):
+        host = getattr(context, "host", None)
+        self.new[host] = self.new.get(host, 0) + 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        host = getattr(context, "host", None)
+        self.reused[host] = self.reused.get(host, 0) + 1
+
+    async def _on_dns_cache_hit(self, session, context, params):
+        self.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context, params):
+        self.dns_cache_misses += 1
+
+    def host_stats(self, host) -> dict:
+        new, reused = self.new.get(host, 0), self.reused.get(host, 0)
+        total = new + reused
+        reuse_ratio = reused / total if total else 0
+        return {"new": new, "reused": reused, "reuse_ratio": reuse_ratio}
+
+    def stats(self) -> dict:
+        hosts = set(self.new) | set(self.reused)
+        return {
+            "hosts": {host: self.host_stats(host) for host in hosts},
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
 
 
 class AsyncCrawler:
     """
     Finally, the thing that composes all this guys up
 
-    Crawls the domain, reports it's text, has rps limiting, depth limiting
+    Crawls the domain (or many domains if root_url is a list of seed urls),
+    reports it's text, has rps limiting, depth limiting
     """
 
     def __init__(
         self,  # NOSONAR
-        root_url: str,
+        root_url: Union[str, Iterable[str]],
         max_rps: int,
         max_depth: int,
         config: CrawlerConfig,
@@ -389,6 +2610,9 @@ class AsyncCrawler:
         parser: CrawlerParser,
         parser_pool_executor: ProcessPoolExecutor,
         reporter: CrawlerReporter,
+        seen_urls: CrawlerSeenSet = None,
+        canonicalizer: UrlCanonicalizer = None,
+        page_store: CrawlerPageStore = None,
         logger=None,
         loop=None,
     ):
@@ -396,15 +2620,30 @@ class AsyncCrawler:
         self.loop = loop or asyncio.get_event_loop()
         self.logger = logger or logging.getLogger(f"hw_3.{type(self).__name__}")
 
-        self.root_url = root_url
+        self.seed_urls = [root_url] if isinstance(root_url, str) else list(root_url)
+        if not self.seed_urls:
+            raise TypeError("There is no urls for crawling")
+        self.root_url = self.seed_urls[0]
         self.max_rps = max_rps
         self.max_depth = max_depth
 
-        self.limiter: AsyncRateLimiter = None
+        self.scheduler: PolitenessScheduler = None
+        self._feeder_task: asyncio.Task = None
+        self.parse_batcher: CrawlerParseBatcher = None
 
         self.config = config
 
         self.session: aiohttp.ClientSession = None
+        self.connection_stats = ConnectionStats()
+        self.robots: RobotsCache = None
+        self.robots_disallowed = 0
+        self.sitemaps: SitemapLoader = None
+        self._sitemaps_task: asyncio.Task = None
+
+        # with the page store pages are fetched conditionally and the unchanged
+        # ones are not parsed & reported again
+        self.page_store = page_store
+        self.recrawl_stats = {"not_modified": 0, "unchanged": 0, "changed": 0}
 
         self.queue = crawling_queue
         self.parser = parser
@@ -418,64 +2657,184 @@ class AsyncCrawler:
         # the point is that we need to control not only fetched urls, but also
         # urls that currently in queue. so we will add urls to that set before
         # their fetching for queue purity
-        self.known_urls = set()
-
-        parsed_host_url = urllib.parse.urlparse(self.root_url)
-        host, _ = urllib.parse.splitport(parsed_host_url.netloc)
-        self.root_domain = host.lower()
-
-        # some validation
-        if not self.root_domain:
-            raise TypeError(  # or AttributeError, or ValueError? hmm…
-                f"Bad root_domain {self.root_domain!r} for url {self.root_url}"
-            )
-        if not self.parser.is_url_valid(self.root_url):
-            raise TypeError(f"Bad url for crawling {self.root_url!r}")
+        self.known_urls = seen_urls if seen_urls is not None else FingerprintSeenSet()
+
+        # urls are deduplicated by their canonical form, and we count how many
+        # fetches it saved (at least): rewritten raw urls are remembered, so a
+        # variant that comes again is not counted twice
+        self.canonicalizer = canonicalizer or UrlCanonicalizer()
+        self._raw_url_variants = FingerprintSeenSet()
+        self.fetches_saved = 0
+
+        # crawling scope, host -> its seed url
+        self.root_urls = {}
+        for seed_url in self.seed_urls:
+            parsed_host_url = urllib.parse.urlparse(seed_url)
+            host, _ = urllib.parse.splitport(parsed_host_url.netloc)
+            root_domain = host.lower()
+
+            # some validation
+            if not root_domain:
+                raise TypeError(  # or AttributeError, or ValueError? hmm…
+                    f"Bad root_domain {root_domain!r} for url {seed_url}"
+                )
+            if not self.parser.is_url_valid(seed_url):
+                raise TypeError(f"Bad url for crawling {seed_url!r}")
+            self.root_urls.setdefault(root_domain, seed_url)
+        self.root_domain = next(iter(self.root_urls))
 
     async def init(self, loop=None):
         self.logger.info("Crawler initialisation")
         self.loop = loop or asyncio.get_event_loop()
 
-        self.limiter = AsyncRateLimiter(self.max_rps, loop=self.loop)
-        self.session = aiohttp.ClientSession(loop=self.loop)
+        self.scheduler = PolitenessScheduler(
+            self.config.max_rps_per_domain,
+            burst=self.config.max_burst_per_domain,
+            max_rps=self.max_rps,
+            max_buffered=self.max_scheduled_urls(),
+            loop=self.loop,
+        )
+        await self.scheduler.init(loop=self.loop)
+        self.parse_batcher = CrawlerParseBatcher(
+            self.parser,
+            self.parser_pool_executor,
+            max_batch_size=self.config.max_parse_batch_size,
+            max_delay=self.config.max_parse_batch_delay,
+            loop=self.loop,
+        )
+        await self.parse_batcher.init(loop=self.loop)
+        self.session = self.create_session()
+        if self.config.obey_robots:
+            self.robots = RobotsCache(
+                self.session,
+                self.config.user_agent,
+                on_rules=self._apply_robots_rules,
+                loop=self.loop,
+            )
 
         await self.queue.init(loop=self.loop)
         await self.reporter.init(loop=self.loop)
+        if self.page_store is not None:
+            await self.page_store.init(loop=self.loop)
 
         self.logger.info(
-            "Init crawler with putting root_domain %r to the queue", self.root_domain
+            "Init crawler with putting %s seed urls of %s domains to the queue",
+            len(self.seed_urls),
+            len(self.root_urls),
+        )
+        # the queue may keep urls of the previous run, it's the checkpoint
+        async for url in self.queue.seen_urls():
+            self.known_urls.add(url)
+        if self.known_urls:
+            self.logger.info("Restored %s known urls", len(self.known_urls))
+
+        for seed_url in self.seed_urls:
+            await self.add_url(seed_url)
+        if self.page_store is not None:  # recrawl of the pages we know
+            for url, depth in await self.page_store.urls():
+                await self.add_url(url, depth)
+
+        if self.config.use_sitemaps:
+            self.sitemaps = SitemapLoader(
+                self.session, self.robots, self.scheduler, loop=self.loop
+            )
+            self._sitemaps_task = self.loop.create_task(self.seed_from_sitemaps())
+
+    def max_scheduled_urls(self) -> int:
+        if self.config.max_scheduled_urls is not None:
+            return self.config.max_scheduled_urls
+        if self.queue.takes_few:
+            return 2 * self.config.max_workers
+        return 10000
+
+    def create_session(self) -> aiohttp.ClientSession:
+        config = self.config
+        connector = aiohttp.TCPConnector(
+            limit=config.connections_limit,
+            limit_per_host=config.connections_limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=config.dns_cache_ttl,
+            keepalive_timeout=config.keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.total_timeout,
+            sock_connect=config.connect_timeout,
+            sock_read=config.read_timeout,
+        )
+        headers = {"User-Agent": config.user_agent}
+        if config.compression:
+            headers["Accept-Encoding"] = "gzip, deflate"
+        else:
+            headers["Accept-Encoding"] = "identity"
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers=headers,
+            auto_decompress=config.compression,
+            trace_configs=[self.connection_stats.trace_config()],
+            loop=self.loop,
         )
-        await self.add_url(self.root_url)
 
     async def close(self):
+        if self._sitemaps_task is not None:
+            self._sitemaps_task.cancel()
+        self.logger.info("Dedup stats: %s", self.dedup_stats())
+        self.logger.info("Connections stats: %s", self.connection_stats.stats())
+        if self.robots is not None:
+            self.logger.info(
+                "Robots.txt of %s hosts fetched, %s urls disallowed",
+                self.robots.fetched,
+                self.robots_disallowed,
+            )
+        if self.page_store is not None:
+            self.logger.info("Recrawl stats: %s", self.recrawl_stats)
+            await self.page_store.close()
+        if self._feeder_task is not None:
+            self._feeder_task.cancel()
         await self.session.close()
-        await self.queue.purge()
+        await self.parse_batcher.close()
+        self.logger.info("Parse batching stats: %s", self.parse_batcher.stats())
+        await self.queue.close()
         await self.reporter.close()
         self.parser_pool_executor.shutdown(wait=False)
 
     async def run(self, blocking=False):
         self.logger.info("Spawn crawlers")
+        self._feeder_task = self.loop.create_task(self.feeder())
         self.workers_tasks = [
             self.loop.create_task(self.crawler())
             for _ in range(self.config.max_workers)
         ]
         if blocking:
+            if self._sitemaps_task is not None:
+                await self._sitemaps_task
             await self.queue.join()
             for w in self.workers_tasks:
                 w.cancel()
+            self._feeder_task.cancel()
+
+    async def feeder(self):
+        # moves urls from the queue to the per-host delay queues of the scheduler,
+        # they are acked by the workers after the fetching
+        self.logger.info("Start scheduler feeder loop")
+        while True:
+            try:
+                url, depth = await self.queue.get()
+                await self.scheduler.put(url, depth)
+            except asyncio.CancelledError:
+                break
 
     async def crawler(self):
         self.logger.info("Start crawler infinite loop")
         while True:
             url = None
             try:
-                url, depth = await self.queue.get()
+                url, depth = await self.scheduler.get()
                 self.logger.debug("Got url from queue %r", url)
                 if url not in self.known_urls:
-                    self.logger.debug(
-                        "Somehow there is an url %r not from known urls", url
-                    )
-                    continue
+                    # e.g. it's put to the shared queue by another crawler process
+                    self.logger.debug("Got url %r not from known urls", url)
+                    self.known_urls.add(url)
                 await self.fetch(url, depth)
             except asyncio.CancelledError:
                 break
@@ -483,32 +2842,57 @@ class AsyncCrawler:
                 await self._process_unexpected_exception(unexpected_exception)
             finally:
                 if url:
-                    await self.queue.ack()
+                    await self.queue.ack(url)
 
     async def fetch(self, url, depth):
         self.logger.debug("Fetch %r, current depth: %s", url, depth)
+        if self.robots is not None and not await self.robots.is_allowed(url):
+            self.logger.debug("%r is disallowed by robots.txt", url)
+            self.robots_disallowed += 1
+            return None
+        page_state = None
+        if self.page_store is not None:
+            page_state = await self.page_store.get(url)
+        headers = self.conditional_headers(page_state)
         try:
-            response = await self._get_url_with_retries(url)
-        except aiohttp.ClientError as client_error:
+            response = await self._get_url_with_retries(url, headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as client_error:
             await self._process_bad_response(client_error, url)
             return None
         try:
-            if self.parser.is_redirect(response):
+            if response.status == 304:
+                self.logger.debug("%r is not modified", url)
+                self.recrawl_stats["not_modified"] += 1
+            elif self.parser.is_redirect(response):
                 await self._process_redirect(response, depth)
             else:
-                await self._process_ok_response(response, depth)
+                page_state = page_state or PageState(url)
+                await self._process_ok_response(response, depth, page_state)
         finally:
             await response.release()
 
-    async def _get_url_with_retries(self, url) -> aiohttp.ClientResponse:
+    @staticmethod
+    def conditional_headers(page_state: Optional[PageState]) -> dict:
+        headers = {}
+        if page_state is not None:
+            if page_state.etag:
+                headers["If-None-Match"] = page_state.etag
+            if page_state.last_modified:
+                headers["If-Modified-Since"] = page_state.last_modified
+        return headers
+
+    async def _get_url_with_retries(self, url, headers=None) -> aiohttp.ClientResponse:
         # get url with retries
         last_client_error = None
         for attempt in range(1, self.config.max_retries + 1):
             try:
-                async with self.limiter:
-                    response = await self.session.get(url, allow_redirects=False)
+                if attempt > 1:  # the first attempt was scheduled by the scheduler
+                    await self.scheduler.acquire(self.scheduler.host_of(url))
+                response = await self.session.get(
+                    url, headers=headers, allow_redirects=False
+                )
                 return response
-            except aiohttp.ClientError as client_error:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as client_error:
                 self.logger.info("try %r for %r raised %r", attempt, url, client_error)
                 last_client_error = client_error
         else:  # if all attempts are out
@@ -520,14 +2904,17 @@ class AsyncCrawler:
             )
             raise last_client_error  # just re-raising last exception
 
-    async def _process_ok_response(self, response: aiohttp.ClientResponse, depth):
+    async def _process_ok_response(
+        self, response: aiohttp.ClientResponse, depth, page_state: PageState = None
+    ):
         url = str(response.url)
         status = response.status
         content_type = response.content_type
+        new_page_state = None
 
         if status != 200:
             report = FetchReport(  # http status is not 200
-                self.root_url,
+                self.root_url_of(url),
                 url,
                 status,
                 None,
@@ -536,31 +2923,139 @@ class AsyncCrawler:
 
         elif not self.parser.is_parsable(content_type):
             report = FetchReport(  # resp is not parsable
-                self.root_url,
+                self.root_url_of(url),
                 url,
                 status,
                 None,  # (bad content type)
                 unsuccess_msg=f"content is not parsable, {content_type!r}",
             )
         else:  # if all is ok we will
-            html = await response.text()
-            text, urls = await self.parser.parse(  # parse html and get text and urls
-                html, url, self.root_domain
-            )
-            if depth < self.max_depth:
-                for link in urls.difference(self.known_urls):
-                    await self.add_url(
-                        link, depth + 1
-                    )  # put these urls in crawling queue
+            # raw body is sent to the parser process, it's decoded there
+            body, unsuccess_msg, streamed_urls = await self._read_body(response, depth)
+            if body is None:
+                report = FetchReport(  # body is too large or binary
+                    self.root_url_of(url), url, status, None, unsuccess_msg=unsuccess_msg
+                )
             else:
-                self.logger.info(
-                    "depth limit (%s) reached on new urls from %r", self.max_depth, url
+                new_page_state, changed = self._new_page_state(
+                    page_state, response, body, depth
                 )
-            report = FetchReport(
-                self.root_url, url, status, text
-            )  # finally - generate positive report
+                if not changed:
+                    self.logger.debug("%r content is not changed", url)
+                    await self.page_store.set(new_page_state)  # fresh validators
+                    return
+                # parse html and get text and urls, the scope is checked here, so
+                # the set of all crawled domains is not sent to the parser process
+                text, urls = await self.parse_batcher.parse(body, url, response.charset)
+                # links taken while streaming are already added, the second add_url
+                # would count them as in-links twice
+                await self._add_links(urls - streamed_urls, url, depth)
+                report = FetchReport(
+                    self.root_url_of(url), url, status, text
+                )  # finally - generate positive report
 
         await self.reporter.do_report(report)
+        # only now, otherwise the page that failed in parsing or reporting would be
+        # "unchanged" (or 304) on every recrawl and never indexed
+        if new_page_state is not None:
+            await self.page_store.set(new_page_state)
+
+    def _new_page_state(
+        self, page_state: Optional[PageState], response, body: bytes, depth
+    ) -> Tuple[Optional[PageState], bool]:
+        # validators and content hash of the fetched page, and if it's changed,
+        # the stored state is not touched
+        if self.page_store is None or page_state is None:
+            return None, True
+        content_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+        changed = content_hash != page_state.content_hash
+        self.recrawl_stats["changed" if changed else "unchanged"] += 1
+        new_page_state = PageState(
+            page_state.url,
+            depth,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+            content_hash,
+        )
+        return new_page_state, changed
+
+    async def _read_body(
+        self, response: aiohttp.ClientResponse, depth
+    ) -> Tuple[Optional[bytes], Optional[str], set]:
+        # reads body by chunks up to max_body_size,
+        # returns (body, unsuccess_msg, links already added while streaming)
+        url = str(response.url)
+        max_body_size = self.config.max_body_size
+        streamed_urls = set()
+        if response.content_length and response.content_length > max_body_size:
+            return None, f"body is too large, {response.content_length} bytes", set()
+
+        link_stream = None
+        if self.config.stream_links and depth < self.max_depth:
+            link_stream = self.parser.link_stream(url, response.charset)
+
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            if not chunks and self.parser.is_binary_body(chunk):
+                response.close()  # don't download the rest
+                return None, "body looks like binary, not html", streamed_urls
+            size += len(chunk)
+            if size > max_body_size:
+                response.close()
+                return None, f"body is larger than {max_body_size} bytes", streamed_urls
+            chunks.append(chunk)
+            if link_stream is not None:
+                await self._add_streamed_links(
+                    link_stream.feed(chunk), streamed_urls, url, depth
+                )
+        if link_stream is not None:
+            await self._add_streamed_links(
+                link_stream.close(), streamed_urls, url, depth
+            )
+        return b"".join(chunks), None, streamed_urls
+
+    async def _add_streamed_links(self, urls: set, streamed_urls: set, url_from, depth):
+        # every link of the page is added once, like the links of the parsed page
+        urls = urls - streamed_urls
+        streamed_urls.update(urls)
+        await self._add_links(urls, url_from, depth)
+
+    async def seed_from_sitemaps(self):
+        # sitemap urls are one step from the root, they are not crawled deeper
+        # than the links from the root page
+        for root_url in self.root_urls.values():
+            added = 0
+            try:
+                async for url, lastmod in self.sitemaps.urls(root_url):
+                    if not self.is_url_in_scope(url):
+                        continue
+                    if self.robots and not self.robots.is_allowed_cached(url):
+                        continue
+                    added += await self.add_url(url, 1, lastmod=lastmod)
+            except Exception:
+                self.logger.exception("Sitemaps of %r failed", root_url)
+            self.logger.info("%s urls added from sitemaps of %r", added, root_url)
+
+    def _apply_robots_rules(self, host, rules: RobotsRules):
+        if rules.crawl_delay:
+            self.logger.info("Crawl-delay of %s is %s", host, rules.crawl_delay)
+        self.scheduler.set_crawl_delay(host, rules.crawl_delay)
+
+    async def _add_links(self, urls, url_from, depth):
+        if self.robots is not None:  # urls disallowed by known robots are dropped
+            urls = self.parser.filter_urls(urls, None, robots=self.robots)
+        if not urls:
+            return
+        if depth >= self.max_depth:
+            self.logger.info(
+                "depth limit (%s) reached on new urls from %r", self.max_depth, url_from
+            )
+            return
+        for link in urls:
+            if not self.is_url_in_scope(link):
+                continue
+            await self.add_url(link, depth + 1)  # put these urls in crawling queue
 
     async def _process_redirect(self, response: aiohttp.ClientResponse, depth):
         location = response.headers.get("location", "")
@@ -569,12 +3064,14 @@ class AsyncCrawler:
             "got redirect from %r , location header is %r", url_from, location
         )
         next_url = urllib.parse.urljoin(url_from, location)
-        if next_url in self.known_urls:  # for the lack of optimisation
-            self.logger.debug("redirection url %r is already known", next_url)
+        if not self.is_url_in_scope(next_url):
+            self.logger.debug("redirection url %r is out of scope", next_url)
             return
         if depth < self.max_depth:
-            self.logger.info("redirect to %r from %r", next_url, url_from)
-            await self.add_url(next_url, depth + 1)
+            if await self.add_url(next_url, depth + 1):
+                self.logger.info("redirect to %r from %r", next_url, url_from)
+            else:
+                self.logger.debug("redirection url %r is already known", next_url)
         else:
             self.logger.info(
                 "depth limit (%s) reached on redirect to %r from %r",
@@ -595,15 +3092,44 @@ class AsyncCrawler:
             "got an unexpected exception at crawler loop, %r", exception
         )
 
-    async def add_url(self, url, depth=0):
+    @staticmethod
+    def host_of(url) -> str:
+        return (urllib.parse.urlparse(url).hostname or "").lower()
+
+    def is_url_in_scope(self, url) -> bool:
+        return self.host_of(url) in self.root_urls
+
+    def root_url_of(self, url) -> str:
+        return self.root_urls.get(self.host_of(url), self.root_url)
+
+    def dedup_stats(self) -> dict:
+        return {
+            "known_urls": len(self.known_urls),
+            "fetches_saved": self.fetches_saved,
+            **self.canonicalizer.stats(),
+        }
+
+    async def add_url(self, url, depth=0, lastmod: datetime = None) -> bool:
+        # returns False if the url is already known or the queue has dropped it
+        canonical_url = self.canonicalizer(url)
+        if canonical_url in self.known_urls:
+            if canonical_url != url and self._raw_url_variants.add(url):
+                self.fetches_saved += 1
+            await self.queue.rediscover(canonical_url, depth, lastmod=lastmod)
+            return False
+        if canonical_url != url:
+            self._raw_url_variants.add(url)
         self.logger.debug(
             "Adding url %r to the queue, depth %r, max_depth %r",
-            url,
+            canonical_url,
             depth,
             self.max_depth,
         )
-        self.known_urls.add(url)
-        await self.queue.put(url, depth)
+        # dropped url is not known, so it's put again when it's found again
+        if not await self.queue.put(canonical_url, depth, lastmod=lastmod):
+            return False
+        self.known_urls.add(canonical_url)
+        return True
 
 
 if __name__ == "__main__":
@@ -621,17 +3147,42 @@ if __name__ == "__main__":
     some_site_max_depth = 10
 
     crawler_config = CrawlerConfig(
-        c.CRAWLER_MAX_WORKERS, c.CRAWLER_MAX_RPS_PER_DOMAIN, c.CRAWLER_MAX_RETRIES
+        c.CRAWLER_MAX_WORKERS,
+        c.CRAWLER_MAX_RPS_PER_DOMAIN,
+        c.CRAWLER_MAX_RETRIES,
+        max_burst_per_domain=c.CRAWLER_MAX_BURST_PER_DOMAIN,
+        max_body_size=c.CRAWLER_MAX_BODY_SIZE,
+        stream_links=bool(c.CRAWLER_STREAM_LINKS),
+        connections_limit=c.CRAWLER_CONNECTIONS_LIMIT,
+        connections_limit_per_host=c.CRAWLER_CONNECTIONS_LIMIT_PER_HOST,
+        user_agent=c.CRAWLER_USER_AGENT,
+        obey_robots=bool(c.CRAWLER_OBEY_ROBOTS),
+        use_sitemaps=bool(c.CRAWLER_USE_SITEMAPS),
     )
-    queue = CrawlerQueueAsyncioQueue()
-    crawler_parser = BSCrawlerParser(c.CRAWLER_MAX_PARSING_WORKERS)
-    crawler_reporter = ElasticSearchCrawlerReporter(
+    if c.CRAWLER_BROKER_ADDRESS:
+        queue = CrawlerQueueBroker(c.CRAWLER_BROKER_ADDRESS)
+    elif c.CRAWLER_FRONTIER_PATH:
+        queue = CrawlerQueueSQLite(c.CRAWLER_FRONTIER_PATH)
+    elif c.CRAWLER_PRIORITY_QUEUE:
+        queue = CrawlerQueuePriority()
+    else:
+        queue = CrawlerQueueHostFrontier()
+    crawler_parser = LxmlCrawlerParser()
+    crawler_reporter = ElasticSearchBulkCrawlerReporter(
         c.CRAWLER_ELASTICSEARCH_HOST,
         c.CRAWLER_ELASTICSEARCH_PORT,
         c.CRAWLER_ELASTICSEARCH_INDEX,
         c.CRAWLER_ELASTICSEARCH_DOC_TYPE,
+        near_duplicates=NearDuplicateDetector(),
     )
     # crawler_reporter = StdOutCrawlerReporter()
+    page_store = None
+    if c.CRAWLER_PAGE_STORE_PATH:
+        page_store = CrawlerPageStoreSQLite(c.CRAWLER_PAGE_STORE_PATH)
+    if c.CRAWLER_SEEN_BLOOM_CAPACITY:
+        seen_urls = BloomSeenSet(c.CRAWLER_SEEN_BLOOM_CAPACITY)
+    else:
+        seen_urls = FingerprintSeenSet()
     parser_process_pool = ProcessPoolExecutor(os.cpu_count())
 
     crawler = AsyncCrawler(
@@ -643,6 +3194,8 @@ if __name__ == "__main__":
         crawler_parser,
         parser_process_pool,
         crawler_reporter,
+        seen_urls=seen_urls,
+        page_store=page_store,
     )
 
     async def main():
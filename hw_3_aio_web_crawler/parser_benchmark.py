@@ -0,0 +1,78 @@
+"""
+Compares pages/sec of the crawler parsers over a corpus of saved pages
+
+    # save some pages to the corpus dir
+    python -m hw_3_aio_web_crawler.parser_benchmark corpus \
+        --fetch https://docs.python.org/3/ https://docs.python.org/3/library/
+    # and run the benchmark
+    python -m hw_3_aio_web_crawler.parser_benchmark corpus --rounds 5
+"""
+import time
+import pathlib
+import hashlib
+import argparse
+import urllib.request
+
+from hw_3_aio_web_crawler.crawler import BSCrawlerParser, LxmlCrawlerParser
+
+PARSERS = [BSCrawlerParser, LxmlCrawlerParser]
+
+
+def fetch_pages(corpus_dir: pathlib.Path, urls):
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for url in urls:
+        with urllib.request.urlopen(url) as response:
+            html = response.read().decode(
+                response.headers.get_content_charset() or "utf-8", "replace"
+            )
+        name = hashlib.md5(url.encode()).hexdigest()
+        (corpus_dir / f"{name}.html").write_text(html, encoding="utf-8")
+        (corpus_dir / f"{name}.url").write_text(url, encoding="utf-8")
+        print(f"Saved {url} ({len(html)} chars)")
+
+
+def load_corpus(corpus_dir: pathlib.Path):
+    pages = []
+    for html_path in sorted(corpus_dir.glob("*.html")):
+        url_path = html_path.with_suffix(".url")
+        url = url_path.read_text() if url_path.exists() else "http://localhost/"
+        pages.append((html_path.read_text(encoding="utf-8"), url))
+    return pages
+
+
+def benchmark(parser, pages, rounds) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for html, url in pages:
+            parser.parse_text_and_urls_from_html(html, url, None)
+    return len(pages) * rounds / (time.perf_counter() - started)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument("corpus_dir", type=pathlib.Path)
+    arg_parser.add_argument("--fetch", nargs="+", metavar="URL", default=[])
+    arg_parser.add_argument("--rounds", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if args.fetch:
+        fetch_pages(args.corpus_dir, args.fetch)
+    pages = load_corpus(args.corpus_dir)
+    if not pages:
+        raise SystemExit(f"There is no *.html pages in {args.corpus_dir}")
+    size_mb = sum(len(html) for html, _ in pages) / 1024 / 1024
+    print(f"Corpus: {len(pages)} pages, {size_mb:.1f} MB, rounds: {args.rounds}")
+
+    results = {}
+    for parser_cls in PARSERS:
+        parser = parser_cls()
+        results[parser_cls.__name__] = rate = benchmark(parser, pages, args.rounds)
+        print(f"{parser_cls.__name__:<20} {rate:10.1f} pages/sec")
+
+    baseline = results[BSCrawlerParser.__name__]
+    for name, rate in results.items():
+        print(f"{name:<20} {rate / baseline:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
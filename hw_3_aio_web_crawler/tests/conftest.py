@@ -0,0 +1,9 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def run():
+    """ Runs the coroutine in the fresh event loop """
+    return lambda coro: asyncio.run(asyncio.wait_for(coro, 30))
@@ -0,0 +1,56 @@
+""" Helpers for the crawler tests """
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import (
+    AsyncCrawler,
+    CrawlerConfig,
+    CrawlerReporter,
+    LxmlCrawlerParser,
+    CrawlerQueueHostFrontier,
+)
+
+
+class CollectingReporter(CrawlerReporter):
+    """ Keeps the reports in memory instead of elasticsearch """
+
+    def __init__(self):
+        super().__init__()
+        self.reports = []
+
+    async def do_report(self, report):
+        self.reports.append(report)
+
+
+def make_crawler(root_url, queue=None, reporter=None, max_depth=5, **config):
+    config.setdefault("obey_robots", False)
+    crawler_config = CrawlerConfig(
+        config.pop("max_workers", 4),
+        config.pop("max_rps_per_domain", 100),
+        config.pop("max_retries", 1),
+        **config,
+    )
+    return AsyncCrawler(
+        root_url,
+        1000,
+        max_depth,
+        crawler_config,
+        queue or CrawlerQueueHostFrontier(),
+        LxmlCrawlerParser(),
+        ThreadPoolExecutor(2),  # instead of processes, it's enough for the tests
+        reporter or CollectingReporter(),
+    )
+
+
+async def start_site(routes, host="127.0.0.1", port=0):
+    """ Runs aiohttp app with routes {path: handler}, returns (runner, base url) """
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}"
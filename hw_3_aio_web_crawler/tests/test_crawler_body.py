@@ -0,0 +1,69 @@
+from collections import Counter
+
+from aiohttp import web
+
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+LINKS = '<a href="/a">a</a><a href="/b">b</a>'
+ROOT_PAGE = f"<html><body>{LINKS * 50}</body></html>"
+
+
+async def root(request):
+    return web.Response(text=ROOT_PAGE, content_type="text/html")
+
+
+async def leaf(request):
+    return web.Response(text="<p>leaf</p>", content_type="text/html")
+
+
+async def binary(request):
+    png = b"\x89PNG\r\n\x1a\n" + b"\0" * 1000
+    return web.Response(body=png, content_type="text/html")
+
+
+async def large(request):
+    return web.Response(text="<p>" + "x" * 100000 + "</p>", content_type="text/html")
+
+
+async def crawl(stream_links, **config):
+    runner, base_url = await start_site(
+        {"/": root, "/a": leaf, "/b": binary, "/large": large}
+    )
+    crawler = make_crawler(base_url + "/", stream_links=stream_links, **config)
+    added = Counter()
+    add_url = crawler.add_url
+
+    async def counting_add_url(url, depth=0, lastmod=None):
+        added[url] += 1
+        return await add_url(url, depth, lastmod)
+
+    crawler.add_url = counting_add_url
+    await crawler.init()
+    await crawler.add_url(base_url + "/large")
+    try:
+        await crawler.run(blocking=True)
+    finally:
+        await crawler.close()
+        await runner.cleanup()
+    reports = {r.url[len(base_url):]: r for r in crawler.reporter.reports}
+    return added, reports, base_url
+
+
+def test_streamed_links_are_added_once(run):
+    added, reports, base_url = run(crawl(stream_links=True))
+    assert added[base_url + "/a"] == 1
+    assert added[base_url + "/b"] == 1
+    assert reports["/a"].text == "leaf"
+
+
+def test_links_are_added_once_without_streaming(run):
+    added, _, base_url = run(crawl(stream_links=False))
+    assert added[base_url + "/a"] == 1
+
+
+def test_binary_and_large_bodies_are_not_parsed(run):
+    _, reports, _ = run(crawl(stream_links=False, max_body_size=50000))
+    assert reports["/b"].text is None
+    assert "binary" in reports["/b"].unsuccess_msg
+    assert reports["/large"].text is None
+    assert "large" in reports["/large"].unsuccess_msg
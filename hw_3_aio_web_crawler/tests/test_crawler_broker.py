@@ -0,0 +1,149 @@
+import json
+import asyncio
+
+from hw_3_aio_web_crawler.broker import CrawlerBroker
+from hw_3_aio_web_crawler.crawler import CrawlerQueueBroker
+
+
+async def start_broker(tmp_path, **kwargs) -> CrawlerBroker:
+    broker = CrawlerBroker(f"unix:{tmp_path / 'broker.sock'}", **kwargs)
+    await broker.start()
+    return broker
+
+
+def host_of_items(items) -> set:
+    return {url.split("/")[2] for _, url, _ in items}
+
+
+def test_hosts_are_leased_to_one_client(run):
+    async def main():
+        broker = CrawlerBroker("unix:/unused", partitions=16)
+        first, second = broker.connect(), broker.connect()
+        assert broker.op_get(first)["items"] == broker.op_get(second)["items"] == []
+        urls = [[f"http://host{h}.example/{i}", 1] for h in range(8) for i in range(3)]
+        broker.op_sync(first, put=urls)
+
+        first_items = broker.op_get(first, max=100)["items"]
+        second_items = broker.op_get(second, max=100)["items"]
+        assert len(first_items) + len(second_items) == 24
+        assert first_items and second_items
+        assert not host_of_items(first_items) & host_of_items(second_items)
+
+        # new urls of the leased host go to its client only
+        first_host = host_of_items(first_items).pop()
+        broker.op_sync(second, put=[[f"http://{first_host}/new", 2]])
+        assert broker.op_get(second, max=100)["items"] == []
+        assert broker.op_get(first, max=100)["items"][0][1].endswith("/new")
+
+    run(main())
+
+
+def test_busy_partitions_are_given_away_after_acks(run):
+    async def main():
+        broker = CrawlerBroker("unix:/unused", partitions=2)
+        first = broker.connect()
+        urls = [[f"http://host{h}.example/{i}", 1] for h in range(4) for i in range(2)]
+        broker.op_sync(first, put=urls)
+        items = broker.op_get(first, max=2)["items"]  # first takes both partitions
+
+        second = broker.connect()
+        assert broker.op_get(second, max=100)["items"] == []
+        broker.op_sync(first, ack=[task_id for task_id, _, _ in items])
+        broker.op_get(first, max=100)
+        assert broker.op_get(second, max=100)["items"]
+
+    run(main())
+
+
+def test_disconnected_client_urls_are_redelivered(run):
+    async def main():
+        broker = CrawlerBroker("unix:/unused")
+        first, second = broker.connect(), broker.connect()
+        broker.op_sync(first, put=[["http://a.example/", 0]])
+        assert broker.op_get(first)["items"]
+        broker.disconnect(first)
+        assert broker.op_stats()["redelivered"] == 1
+        assert broker.op_get(second)["items"][0][1] == "http://a.example/"
+
+    run(main())
+
+
+def test_renewed_urls_are_not_redelivered(run):
+    async def main():
+        broker = CrawlerBroker("unix:/unused")
+        client = broker.connect()
+        broker.op_sync(client, put=[["http://a.example/", 0], ["http://b.example/", 0]])
+        items = broker.op_get(client, max=2, visibility_timeout=0.05)["items"]
+        assert broker.op_renew(client, ids=[items[0][0]], visibility_timeout=60) == {
+            "renewed": 1
+        }
+        await asyncio.sleep(0.1)
+        broker.expire()
+        stats = broker.op_stats()
+        assert stats["in_flight"] == 1
+        assert stats["redelivered"] == 1
+
+    run(main())
+
+
+def test_malformed_requests_get_error_replies(run, tmp_path):
+    async def main():
+        broker = await start_broker(tmp_path)
+        address = str(tmp_path / "broker.sock")
+        reader, writer = await asyncio.open_unix_connection(address)
+        requests = [b"not json", b"[1, 2]", b'{"op": "nope"}', b'{"op": "get", "x": 1}']
+        for request in requests:
+            writer.write(request + b"\n")
+            response = json.loads(await reader.readline())
+            assert "error" in response
+        writer.write(b'{"op": "stats"}\n')
+        assert json.loads(await reader.readline())["clients"] == 1
+
+        writer.write(b"x" * (2 ** 24 + 1) + b"\n")  # over the stream limit
+        assert "error" in json.loads(await reader.readline())
+        assert await reader.readline() == b""
+        writer.close()
+        await broker.close()
+
+    run(main())
+
+
+def test_redelivered_url_is_acked_by_every_task_id(run, tmp_path):
+    async def main():
+        broker = await start_broker(tmp_path)
+        queue = CrawlerQueueBroker(broker.address, visibility_timeout=60, prefetch=1)
+        await queue.init()
+        await queue.put("http://a.example/", 0)
+        url, _ = await queue.get()
+        broker._requeue(list(broker._in_flight))  # lease is lost, e.g. on timeout
+        assert await queue.get() == (url, 0)
+
+        await queue.ack(url)  # the first fetch is done, the lost lease is acked
+        await queue.sync()
+        assert broker.op_stats()["in_flight"] == 1
+        await queue.ack(url)
+        await queue.join()
+        assert broker.op_stats()["in_flight"] == 0
+        await queue.close()
+        await broker.close()
+
+    run(main())
+
+
+def test_queue_renews_leases_of_waiting_urls(run, tmp_path):
+    async def main():
+        broker = await start_broker(tmp_path)
+        queue = CrawlerQueueBroker(broker.address, visibility_timeout=0.3)
+        await queue.init()
+        await queue.put("http://a.example/", 0)
+        url, _ = await queue.get()
+        for _ in range(5):  # url waits in the scheduler longer than the timeout
+            await asyncio.sleep(0.1)
+            broker.expire()
+        assert broker.op_stats()["redelivered"] == 0
+        await queue.ack(url)
+        await queue.join()
+        await queue.close()
+        await broker.close()
+
+    run(main())
@@ -0,0 +1,128 @@
+import json
+import asyncio
+
+import pytest
+from elasticsearch import TransportError
+
+from hw_3_aio_web_crawler.crawler import ElasticSearchBulkCrawlerReporter, FetchReport
+
+
+class FakeElasticsearch:
+    """ Answers bulk requests with the given statuses, one list per request """
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.bodies = []
+        self.released = asyncio.Event()
+        self.released.set()
+
+    async def bulk(self, body):
+        await self.released.wait()
+        self.bodies.append(body)
+        statuses = self.statuses.pop(0) if self.statuses else None
+        if isinstance(statuses, Exception):
+            raise statuses
+        lines = body.splitlines()[::2]
+        statuses = statuses or [201] * len(lines)
+        return {
+            "errors": any(status >= 300 for status in statuses),
+            "items": [{"index": {"status": status}} for status in statuses],
+        }
+
+    async def close(self):
+        pass
+
+
+def report(i):
+    return FetchReport("http://a.example/", f"http://a.example/{i}", 200, f"text {i}")
+
+
+@pytest.fixture
+def make_reporter(monkeypatch):
+    async def make(es, **kwargs):
+        # the client is created by init, it gets the fake one
+        monkeypatch.setattr(
+            "hw_3_aio_web_crawler.crawler.Elasticsearch", lambda **_: es
+        )
+        kwargs.setdefault("retry_backoff", 0)
+        reporter = ElasticSearchBulkCrawlerReporter("es", 9200, "idx", "doc", **kwargs)
+        await reporter.init()
+        return reporter
+
+    return make
+
+
+def test_documents_are_sent_by_batches(run, make_reporter):
+    async def main():
+        es = FakeElasticsearch()
+        reporter = await make_reporter(es, max_docs=2)
+        for i in range(3):
+            await reporter.do_report(report(i))
+        await reporter.do_report(FetchReport("http://a.example/", "http://x", 404, None))
+        await reporter.close()
+        return es, reporter
+
+    es, reporter = run(main())
+    assert [len(body.splitlines()) for body in es.bodies] == [4, 2]
+    action, source = es.bodies[0].splitlines()[:2]
+    assert json.loads(action)["index"]["_index"] == "idx"
+    assert json.loads(source)["url"] == "http://a.example/0"
+    assert (reporter.indexed, reporter.failed, reporter.flushes) == (3, 0, 2)
+
+
+def test_retryable_documents_are_retried(run, make_reporter):
+    async def main():
+        es = FakeElasticsearch([201, 429, 400], [201])
+        reporter = await make_reporter(es, max_docs=3)
+        for i in range(3):
+            await reporter.do_report(report(i))
+        await reporter.close()
+        return es, reporter
+
+    es, reporter = run(main())
+    assert json.loads(es.bodies[1].splitlines()[1])["url"] == "http://a.example/1"
+    assert (reporter.indexed, reporter.failed) == (2, 1)
+    assert reporter._pending_docs == 0
+
+
+def test_documents_fail_when_out_of_tries(run, make_reporter):
+    async def main():
+        es = FakeElasticsearch(*[TransportError(503, "unavailable", {})] * 2)
+        reporter = await make_reporter(es, max_retries=2)
+        await reporter.do_report(report(0))
+        await reporter.close()
+        return reporter
+
+    reporter = run(main())
+    assert (reporter.indexed, reporter.failed) == (0, 1)
+    assert reporter._pending_docs == 0
+
+
+def test_not_retryable_error_fails_the_batch(run, make_reporter):
+    async def main():
+        es = FakeElasticsearch(TransportError(400, "bad request", {}))
+        reporter = await make_reporter(es)
+        await reporter.do_report(report(0))
+        await reporter.close()
+        return es, reporter
+
+    es, reporter = run(main())
+    assert len(es.bodies) == 1
+    assert reporter.failed == 1
+
+
+def test_reports_wait_when_elasticsearch_is_slow(run, make_reporter):
+    async def main():
+        es = FakeElasticsearch()
+        es.released.clear()
+        reporter = await make_reporter(es, max_docs=1, max_pending_docs=1)
+        await reporter.do_report(report(0))
+        second = asyncio.ensure_future(reporter.do_report(report(1)))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        es.released.set()
+        await asyncio.wait_for(second, 1)
+        await reporter.close()
+        return reporter
+
+    assert run(main()).indexed == 2
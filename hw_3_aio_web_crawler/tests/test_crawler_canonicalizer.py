@@ -0,0 +1,42 @@
+import pytest
+
+from hw_3_aio_web_crawler.crawler import UrlCanonicalizer
+from hw_3_aio_web_crawler.tests.helpers import make_crawler
+
+
+@pytest.mark.parametrize("url, canonical_url", [
+    ("HTTP://Host:80/a/../b?utm_source=x&b=2&a=1#top", "http://host/b?a=1&b=2"),
+    ("https://host:443", "https://host/"),
+    ("http://host:8080/./a/./b/", "http://host:8080/a/b/"),
+    ("http://host/a;jsessionid=123?gclid=1&q=x", "http://host/a?q=x"),
+    ("http://user@Host/", "http://user@host/"),
+    ("http://[::1]:80/", "http://[::1]/"),
+    ("http://host:bad/", "http://host:bad/"),  # left as it is
+])
+def test_canonicalize(url, canonical_url):
+    assert UrlCanonicalizer()(url) == canonical_url
+
+
+def test_steps_can_be_switched():
+    canonicalizer = UrlCanonicalizer(
+        remove_default_port=False, sort_query=False, remove_trailing_slash=True
+    )
+    url = "http://host:80/a/?b=1&a=2"
+    assert canonicalizer(url) == "http://host:80/a?b=1&a=2"
+    assert canonicalizer.stats()["rewritten"] == 1
+
+
+def test_crawler_dedups_canonical_urls(run):
+    async def main():
+        crawler = make_crawler("http://a.example/")
+        await crawler.init()
+        assert not await crawler.add_url("http://A.example:80/?utm_medium=x")
+        assert not await crawler.add_url("http://a.example/#top")
+        assert await crawler.add_url("http://a.example/page")
+        stats = crawler.dedup_stats()
+        await crawler.close()
+        return stats
+
+    stats = run(main())
+    assert stats["fetches_saved"] == 2
+    assert stats["known_urls"] == 2
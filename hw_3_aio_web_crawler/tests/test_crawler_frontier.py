@@ -0,0 +1,76 @@
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import CrawlerQueueHostFrontier
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+
+def test_hosts_are_served_round_robin(run):
+    async def main():
+        queue = CrawlerQueueHostFrontier()
+        await queue.init()
+        for i in range(3):
+            assert await queue.put(f"http://big.example/{i}", 1)
+        assert await queue.put("http://small.example/", 1)
+        got = [(await queue.get())[0] for _ in range(4)]
+        assert got[:2] == ["http://big.example/0", "http://small.example/"]
+        assert await queue.len() == 0
+        for _ in got:
+            await queue.ack()
+        await queue.join()
+
+    run(main())
+
+
+def test_full_host_queue_drops_url(run):
+    async def main():
+        queue = CrawlerQueueHostFrontier(max_urls_per_host=2)
+        await queue.init()
+        assert await queue.put("http://a.example/1")
+        assert await queue.put("http://a.example/2")
+        assert not await queue.put("http://a.example/3")
+        assert await queue.put("http://b.example/1")
+        assert queue.dropped == 1
+
+    run(main())
+
+
+def test_dropped_url_is_not_known_and_is_added_later(run):
+    async def main():
+        queue = CrawlerQueueHostFrontier(max_urls_per_host=1)
+        crawler = make_crawler("http://a.example/", queue=queue)
+        await queue.init()
+        assert await crawler.add_url("http://a.example/1")
+        assert not await crawler.add_url("http://a.example/2")
+        assert "http://a.example/2" not in crawler.known_urls
+
+        await queue.get()  # host queue is drained
+        assert await crawler.add_url("http://a.example/2")
+        assert "http://a.example/2" in crawler.known_urls
+        assert not await crawler.add_url("http://a.example/2")
+        crawler.parser_pool_executor.shutdown()
+
+    run(main())
+
+
+def test_multi_seed_crawl_stays_in_scope(run):
+    async def page(request):
+        links = '<a href="/p/1">1</a><a href="/p/2">2</a>'
+        links += '<a href="http://out-of-scope.example/">x</a>'
+        return web.Response(text=f"<p>page</p>{links}", content_type="text/html")
+
+    async def main():
+        runner_a, url_a = await start_site({"/": page, "/p/{i}": page})
+        runner_b, url_b = await start_site({"/": page, "/p/{i}": page}, "localhost")
+        crawler = make_crawler([url_a + "/", url_b + "/"])
+        await crawler.init()
+        try:
+            await crawler.run(blocking=True)
+        finally:
+            await crawler.close()
+            await runner_a.cleanup()
+            await runner_b.cleanup()
+        urls = sorted(r.url for r in crawler.reporter.reports)
+        assert len(urls) == 6
+        assert all(u.startswith((url_a, url_b)) for u in urls)
+
+    run(main())
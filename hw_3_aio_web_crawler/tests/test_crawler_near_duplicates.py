@@ -0,0 +1,63 @@
+from hw_3_aio_web_crawler.crawler import (
+    ElasticSearchCrawlerReporter,
+    FetchReport,
+    NearDuplicateDetector,
+)
+
+TEXT = " ".join(f"word{i}" for i in range(100))
+MIRROR = TEXT + " printed"
+OTHER = " ".join(f"other{i}" for i in range(100))
+
+
+def test_near_duplicate_is_found():
+    detector = NearDuplicateDetector()
+    assert detector.find_duplicate("page", TEXT) is None
+    assert detector.find_duplicate("mirror", MIRROR) == "page"
+    assert detector.find_duplicate("other", OTHER) is None
+    assert len(detector) == 2
+
+
+def test_recrawled_page_is_not_its_own_duplicate():
+    detector = NearDuplicateDetector()
+    assert detector.find_duplicate("page", TEXT) is None
+    assert detector.find_duplicate("page", TEXT) is None
+    assert len(detector) == 1
+
+
+def test_short_texts_are_not_remembered():
+    detector = NearDuplicateDetector()
+    assert detector.find_duplicate("page", "too short") is None
+    assert len(detector) == 0
+
+
+def test_least_recently_seen_pages_are_forgotten():
+    detector = NearDuplicateDetector(max_pages=2)
+    texts = [" ".join(f"w{n}x{i}" for i in range(50)) for n in range(3)]
+    for n, text in enumerate(texts[:2]):
+        detector.find_duplicate(n, text)
+    assert detector.find_duplicate("copy", texts[0]) == 0  # 0 is seen again
+    detector.find_duplicate(2, texts[2])
+    assert len(detector) == 2
+    assert detector.find_duplicate("copy", texts[1]) is None  # 1 is forgotten
+    assert all(len(ids) == 1 for band in detector._bands for ids in band.values())
+
+
+def test_collapsed_duplicate_refers_to_the_original_document(run):
+    async def make_reporter():
+        return ElasticSearchCrawlerReporter(
+            "localhost",
+            9200,
+            "index",
+            "doc",
+            near_duplicates=NearDuplicateDetector(),
+            collapse_duplicates=True,
+        )
+
+    reporter = run(make_reporter())
+    page = FetchReport("http://a.example/", "http://a.example/page", 200, TEXT)
+    mirror = FetchReport("http://a.example/", "http://a.example/print", 200, MIRROR)
+    assert reporter.document(page)["text"] == TEXT
+    document = reporter.document(mirror)
+    assert document["text"] is None
+    assert document["duplicate_of"] == reporter.document_id(page)
+    assert reporter.duplicates == 1
@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from hw_3_aio_web_crawler.crawler import (
+    CrawlerParseBatcher,
+    LxmlCrawlerParser,
+    parse_pages_batch,
+)
+
+PAGE = b'<html><body><p>text</p><a href="next">next</a></body></html>'
+
+
+def test_parse_pages_batch_returns_exceptions_per_page():
+    results = parse_pages_batch(
+        LxmlCrawlerParser(),
+        [
+            (PAGE, "http://a.example/", "utf-8", None),
+            (None, "http://b.example/", None, None),
+        ],
+    )
+    text, urls = results[0]
+    assert "text" in text
+    assert urls == {"http://a.example/next"}
+    assert isinstance(results[1], Exception)
+
+
+def test_pages_are_parsed_by_batches(run):
+    async def main():
+        with ThreadPoolExecutor(1) as pool:
+            batcher = CrawlerParseBatcher(
+                LxmlCrawlerParser(), pool, max_batch_size=8, pool_workers=1
+            )
+            await batcher.init()
+            batcher.batch_size = 8
+            parses = [
+                batcher.parse(PAGE, f"http://a.example/{i}/", "utf-8") for i in range(8)
+            ]
+            results = await asyncio.gather(*parses)
+            assert [urls for _, urls in results] == [
+                {f"http://a.example/{i}/next"} for i in range(8)
+            ]
+            assert batcher.stats()["batches"] == 1
+
+    run(main())
+
+
+class BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool("pool is broken")
+
+
+def test_broken_pool_fails_the_waiting_pages(run):
+    async def main():
+        batcher = CrawlerParseBatcher(LxmlCrawlerParser(), BrokenPool(), max_delay=0.01)
+        await batcher.init()
+        batcher.batch_size = 4  # so the batch is sent by the timer
+        parses = [batcher.parse(PAGE, "http://a.example/", "utf-8") for _ in range(2)]
+        for parse in asyncio.as_completed(parses, timeout=1):
+            with pytest.raises(BrokenProcessPool):
+                await parse
+
+    run(main())
@@ -0,0 +1,47 @@
+import pytest
+
+from hw_3_aio_web_crawler.crawler import BSCrawlerParser, LxmlCrawlerParser
+
+PAGE = """<html><head><title>title</title><style>p {}</style></head><body>
+<h1>Header</h1>
+<p>First <b>bold</b> tail<!-- comment --></p>
+<script>var x = 1;</script>
+<a href="/a#frag">a</a> <a href="b?x=1">b</a>
+<a href="mailto:me@a.example">mail</a>
+<a href="http://other.example/">other</a>
+<a href="/logout">logout</a>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser_cls", [BSCrawlerParser, LxmlCrawlerParser])
+def test_text_and_links(parser_cls):
+    text, urls = parser_cls().parse_text_and_urls_from_html(
+        PAGE, "http://a.example/dir/", "a.example", url_exclude_pattern="logout"
+    )
+    assert text.split("\n") == [
+        "Header", "First bold tail", "a b", "mail", "other", "logout"
+    ]
+    assert urls == {"http://a.example/a", "http://a.example/dir/b?x=1"}
+
+
+def test_lxml_gives_the_same_as_bs():
+    bs_result = BSCrawlerParser().parse_text_and_urls_from_html(PAGE, "http://a/", None)
+    lxml_result = LxmlCrawlerParser().parse_text_and_urls_from_html(
+        PAGE, "http://a/", None
+    )
+    assert lxml_result == bs_result
+
+
+def test_lxml_bad_documents():
+    parser = LxmlCrawlerParser()
+    assert parser.parse_text_and_urls_from_html("", "http://a/", None) == ("", set())
+    xml = '<?xml version="1.0" encoding="utf-8"?><html><body><p>x</p></body></html>'
+    assert parser.parse_text_and_urls_from_html(xml, "http://a/", None)[0] == "x"
+
+
+def test_link_stream_takes_links_by_chunks():
+    stream = LxmlCrawlerParser().link_stream("http://a.example/")
+    first = stream.feed(b'<html><body><a href="/1">1</a><a hr')
+    rest = stream.feed(b'ef="/2">2</a>') | stream.close()
+    assert first == {"http://a.example/1"}
+    assert rest == {"http://a.example/2"}
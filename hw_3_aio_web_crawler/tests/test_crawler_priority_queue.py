@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import CrawlerQueuePriority, UrlScorer
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+NOW = datetime.now(timezone.utc)
+
+
+def test_scorer_prefers_shallow_linked_fresh_urls():
+    score = UrlScorer()
+    assert score(1, 0, None) > score(3, 0, None)
+    assert score(2, 10, None) > score(2, 0, None)
+    assert score(2, 0, NOW) > score(2, 0, NOW - timedelta(days=90)) > score(2, 0, None)
+
+
+def test_urls_are_taken_by_score(run):
+    async def main():
+        queue = CrawlerQueuePriority()
+        await queue.init()
+        await queue.put("http://a.example/deep", 3)
+        await queue.put("http://a.example/shallow", 1)
+        await queue.put("http://a.example/linked", 2)
+        for _ in range(10):  # in-links raise the score
+            await queue.put("http://a.example/linked", 2)
+        assert await queue.len() == 3
+        got = [(await queue.get())[0] for _ in range(3)]
+        for _ in got:
+            await queue.ack()
+        await queue.join()
+        return got
+
+    assert run(main()) == [
+        "http://a.example/linked",
+        "http://a.example/shallow",
+        "http://a.example/deep",
+    ]
+
+
+def test_rediscover_keeps_the_smallest_depth(run):
+    async def main():
+        queue = CrawlerQueuePriority()
+        await queue.init()
+        await queue.put("http://a.example/", 5)
+        await queue.rediscover("http://a.example/", 1, lastmod=NOW)
+        await queue.rediscover("http://a.example/", 4)
+        url, depth = await queue.get()
+        await queue.rediscover(url, 0)  # it's taken already, nothing to update
+        assert await queue.len() == 0  # stale heap entries are not counted
+        await queue.ack()
+        await queue.join()
+        return depth
+
+    assert run(main()) == 1
+
+
+def test_crawler_fetches_by_score_with_the_default_config(run):
+    fetched = []
+
+    async def page(request):
+        fetched.append(request.path)
+        if request.path == "/":
+            links = "".join(f'<a href="/p/{i}">{i}</a>' for i in range(30))
+        elif request.path.startswith("/p/"):
+            links = '<a href="/hub">hub</a>'  # every page links to the hub
+        else:
+            links = ""
+        return web.Response(text=f"<p>page</p>{links}", content_type="text/html")
+
+    async def main():
+        runner, base_url = await start_site({"/": page, "/p/{i}": page, "/hub": page})
+        queue = CrawlerQueuePriority()
+        crawler = make_crawler(base_url + "/", queue=queue, max_workers=1)
+        await crawler.init()
+        try:
+            await crawler.run(blocking=True)
+        finally:
+            await crawler.close()
+            await runner.cleanup()
+        return crawler.max_scheduled_urls()
+
+    assert run(main()) == 2
+    assert len(fetched) == 32
+    # the hub overtakes the rest of the shallow pages as its in-links grow
+    assert fetched.index("/hub") < 20
@@ -0,0 +1,97 @@
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import (
+    PageState,
+    CrawlerPageStore,
+    CrawlerPageStoreSQLite,
+)
+from hw_3_aio_web_crawler.tests.helpers import (
+    CollectingReporter,
+    make_crawler,
+    start_site,
+)
+
+
+class FailingReporter(CollectingReporter):
+    async def do_report(self, report):
+        raise RuntimeError("elasticsearch is down")
+
+
+async def with_etag(request):
+    if request.headers.get("If-None-Match") == '"v1"':
+        return web.Response(status=304)
+    return web.Response(text="<p>etag</p>", content_type="text/html", headers={
+        "ETag": '"v1"'
+    })
+
+
+async def without_validators(request):
+    return web.Response(text="<p>same</p>", content_type="text/html")
+
+
+async def crawl(base_url, page_store, reporter=None):
+    crawler = make_crawler(base_url + "/", reporter=reporter)
+    crawler.page_store = page_store
+    await crawler.init()
+    await crawler.add_url(base_url + "/same")
+    try:
+        await crawler.run(blocking=True)
+    finally:
+        await crawler.close()
+    return crawler
+
+
+def crawl_twice(run, first_reporter=CollectingReporter):
+    async def main():
+        runner, base_url = await start_site(
+            {"/": with_etag, "/same": without_validators}
+        )
+        store = CrawlerPageStore()
+        try:
+            first = await crawl(base_url, store, first_reporter())
+            states = list(await store.urls())
+            second = await crawl(base_url, store)
+        finally:
+            await runner.cleanup()
+        return first, states, second, store
+
+    return run(main())
+
+
+def test_unchanged_pages_are_not_reported_again(run):
+    first, states, second, _ = crawl_twice(run)
+    assert len(first.reporter.reports) == 2
+    assert len(states) == 2
+    assert second.reporter.reports == []
+    assert second.recrawl_stats == {"not_modified": 1, "unchanged": 1, "changed": 0}
+
+
+def test_page_state_is_saved_only_after_the_report(run):
+    _, states, second, store = crawl_twice(run, FailingReporter)
+    assert states == []
+    assert len(second.reporter.reports) == 2
+    assert second.recrawl_stats == {"not_modified": 0, "unchanged": 0, "changed": 2}
+    assert len(list(run(store.urls()))) == 2
+
+
+def test_sqlite_page_store_keeps_states(run, tmp_path):
+    path = str(tmp_path / "pages.db")
+
+    async def save():
+        store = CrawlerPageStoreSQLite(path)
+        await store.init()
+        await store.set(PageState("http://a.example/", 1, '"v1"', None, "hash"))
+        await store.close()
+
+    async def load():
+        store = CrawlerPageStoreSQLite(path)
+        await store.init()
+        state = await store.get("http://a.example/")
+        urls = list(await store.urls())
+        await store.close()
+        return state, urls
+
+    run(save())
+    state, urls = run(load())
+    assert state == PageState("http://a.example/", 1, '"v1"', None, "hash")
+    assert urls == [("http://a.example/", 1)]
@@ -0,0 +1,141 @@
+import asyncio
+
+import aiohttp
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import RobotsCache, RobotsRules
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+ROBOTS = """
+User-agent: *
+Disallow: /private
+Crawl-delay: 5
+
+User-agent: hw3-crawler
+Disallow: /
+Allow: /public
+Allow: /*.html$
+Disallow: /public/secret  # longer rule wins
+Crawl-delay: 0.5
+
+Sitemap: http://a.example/sitemap.xml
+"""
+
+
+def test_rules_of_the_most_specific_agent():
+    rules = RobotsRules.parse(ROBOTS, "hw3-crawler/1.0")
+    assert rules.is_allowed("http://a.example/public/page")
+    assert not rules.is_allowed("http://a.example/public/secret/1")
+    assert rules.is_allowed("http://a.example/other/page.html")
+    assert not rules.is_allowed("http://a.example/other/page.html?x=1")
+    assert not rules.is_allowed("http://a.example/")
+    assert rules.crawl_delay == 0.5
+    assert rules.sitemaps == ["http://a.example/sitemap.xml"]
+
+
+def test_rules_of_any_agent():
+    rules = RobotsRules.parse(ROBOTS, "other-bot")
+    assert rules.is_allowed("http://a.example/")
+    assert not rules.is_allowed("http://a.example/private/1")
+    assert rules.crawl_delay == 5
+
+
+def test_garbage_allows_everything():
+    rules = RobotsRules.parse("<html>not robots</html>\nDisallow: /", "bot")
+    assert rules.is_allowed("http://a.example/")
+
+
+def test_robots_are_fetched_once_per_host(run):
+    fetches = []
+
+    async def robots(request):
+        fetches.append(request.path)
+        await asyncio.sleep(0.05)
+        return web.Response(text="User-agent: *\nDisallow: /no\nCrawl-delay: 2")
+
+    async def main():
+        runner, base_url = await start_site({"/robots.txt": robots})
+        delays = {}
+        async with aiohttp.ClientSession() as session:
+            cache = RobotsCache(session, "bot", on_rules=delays.__setitem__)
+            allowed = await asyncio.gather(
+                cache.is_allowed(base_url + "/yes"),
+                cache.is_allowed(base_url + "/no/1"),
+            )
+        await runner.cleanup()
+        return allowed, delays, cache
+
+    allowed, delays, cache = run(main())
+    assert allowed == [True, False]
+    assert fetches == ["/robots.txt"]
+    assert delays["127.0.0.1"].crawl_delay == 2
+    assert cache.fetched == 1
+
+
+def test_server_error_disallows_and_missing_robots_allows(run):
+    async def error(request):
+        return web.Response(status=503)
+
+    async def page(request):
+        return web.Response(text="<p>page</p>", content_type="text/html")
+
+    async def main():
+        runner, base_url = await start_site({"/robots.txt": error})
+        other_runner, other_url = await start_site({"/page": page})
+        async with aiohttp.ClientSession() as session:
+            cache = RobotsCache(session, "bot")
+            disallowed = not await cache.is_allowed(base_url + "/page")
+            missing = await cache.is_allowed(other_url + "/page")  # 404
+        await runner.cleanup()
+        await other_runner.cleanup()
+        return disallowed, missing
+
+    assert run(main()) == (True, True)
+
+
+def test_crawler_skips_disallowed_pages(run):
+    async def robots(request):
+        return web.Response(text="User-agent: *\nDisallow: /no")
+
+    async def page(request):
+        links = '<a href="/yes">yes</a><a href="/no">no</a>'
+        return web.Response(text=f"<p>page</p>{links}", content_type="text/html")
+
+    async def main():
+        runner, base_url = await start_site(
+            {"/robots.txt": robots, "/": page, "/yes": page, "/no": page}
+        )
+        crawler = make_crawler(base_url + "/", obey_robots=True)
+        await crawler.init()
+        try:
+            await crawler.run(blocking=True)
+        finally:
+            await crawler.close()
+            await runner.cleanup()
+        return sorted(r.url[len(base_url):] for r in crawler.reporter.reports)
+
+    assert run(main()) == ["/", "/yes"]
+
+
+def test_robots_served_by_chunks_is_read_whole(run):
+    async def robots(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b"User-agent: *\n" + b"# padding\n" * 100)
+        await asyncio.sleep(0.05)
+        await response.write(b"Disallow: /no\n")
+        await response.write_eof()
+        return response
+
+    async def main():
+        runner, base_url = await start_site({"/robots.txt": robots})
+        async with aiohttp.ClientSession() as session:
+            cache = RobotsCache(session, "bot")
+            allowed = await cache.is_allowed(base_url + "/no/1")
+            cache.max_size = 20  # the rest of the too large robots.txt is cut
+            cache._rules.clear()
+            cut_allowed = await cache.is_allowed(base_url + "/no/1")
+        await runner.cleanup()
+        return allowed, cut_allowed
+
+    assert run(main()) == (False, True)
@@ -0,0 +1,66 @@
+import asyncio
+
+from hw_3_aio_web_crawler.crawler import TokenBucket, PolitenessScheduler
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2, now=0)
+    assert bucket.delay(0) == 0
+    bucket.take(0)
+    bucket.take(0)
+    assert bucket.delay(0) == 0.5
+    assert bucket.delay(0.5) == 0
+    assert not bucket.is_full(0.5)
+    assert bucket.is_full(10)
+
+
+def test_slow_host_does_not_stall_the_others():
+    async def main():
+        scheduler = PolitenessScheduler(max_rps_per_host=5)
+        await scheduler.init()
+        for i in range(3):
+            await scheduler.put(f"http://slow.example/{i}")
+        for i in range(3):
+            await scheduler.put(f"http://fast-{i}.example/")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        got = [(await scheduler.get())[0] for _ in range(4)]
+        assert loop.time() - started < 0.1  # one slow url and three other hosts
+        assert sum("slow" in url for url in got) == 1
+
+        await scheduler.get()
+        assert loop.time() - started >= 0.15  # the next slow url waits for its token
+
+    asyncio.run(main())
+
+
+def test_crawl_delay_slows_down_the_host():
+    async def main():
+        scheduler = PolitenessScheduler(max_rps_per_host=100)
+        await scheduler.init()
+        scheduler.set_crawl_delay("Slow.example", 0.2)
+        await scheduler.put("http://slow.example/1")
+        await scheduler.put("http://slow.example/2")
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await scheduler.get()
+        await scheduler.get()
+        assert loop.time() - started >= 0.19
+
+    asyncio.run(main())
+
+
+def test_put_blocks_when_buffer_is_full():
+    async def main():
+        scheduler = PolitenessScheduler(max_rps_per_host=100, max_buffered=2)
+        await scheduler.init()
+        await scheduler.put("http://a.example/1")
+        await scheduler.put("http://b.example/1")
+        put = asyncio.ensure_future(scheduler.put("http://c.example/1"))
+        await asyncio.sleep(0.01)
+        assert not put.done()
+        await scheduler.get()
+        await asyncio.wait_for(put, 1)
+        assert len(scheduler) == 2
+
+    asyncio.run(main())
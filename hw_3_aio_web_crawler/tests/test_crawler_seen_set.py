@@ -0,0 +1,43 @@
+import pytest
+
+from hw_3_aio_web_crawler.crawler import (
+    BloomSeenSet,
+    FingerprintSeenSet,
+    ScalableBloomFilter,
+)
+
+URLS = [f"http://a.example/page/{i}" for i in range(5000)]
+
+
+def test_fingerprint_set_is_exact_and_grows():
+    seen = FingerprintSeenSet(capacity=16)
+    assert all(seen.add(url) for url in URLS)
+    assert not any(seen.add(url) for url in URLS)
+    assert len(seen) == len(URLS)
+    assert all(url in seen for url in URLS)
+    assert "http://a.example/other" not in seen
+    assert seen.nbytes <= 32 * len(URLS)
+
+
+def test_scalable_bloom_filter_keeps_error_rate():
+    bloom = ScalableBloomFilter(capacity=500, error_rate=0.01)
+    for i in range(1, 5001):
+        bloom.add(i * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF)
+    assert len(bloom.filters) > 1
+    assert len(bloom) == 5000
+    missed = [i * 0xC2B2AE3D27D4EB4F & 0xFFFFFFFFFFFFFFFF for i in range(1, 5001)]
+    false_positives = sum(fingerprint in bloom for fingerprint in missed)
+    assert false_positives / len(missed) < 0.02
+
+
+def test_bloom_seen_set_measures_false_positives():
+    seen = BloomSeenSet(capacity=1000, error_rate=0.01, sample_rate=4)
+    added = sum(seen.add(url) for url in URLS[:2500])
+    assert added > 2450  # the rest are false positives of the filter
+    assert all(url in seen for url in URLS[:2500])
+    new = sum(url not in seen for url in URLS[2500:])
+    assert new > 2400
+    assert seen.sampled_lookups > 0
+    assert seen.false_positive_rate == pytest.approx(0, abs=0.05)
+    assert seen.bloom.nbytes < 4 * added
+    assert seen.stats()["urls"] == added
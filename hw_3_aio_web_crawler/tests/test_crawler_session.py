@@ -0,0 +1,60 @@
+import asyncio
+
+from aiohttp import web
+
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+
+def make_handlers(seen_headers):
+    async def page(request):
+        seen_headers.append(request.headers.get("Accept-Encoding"))
+        links = "".join(f'<a href="/p/{i}">{i}</a>' for i in range(5))
+        response = web.Response(text=f"<p>page</p>{links}", content_type="text/html")
+        response.enable_compression()
+        return response
+
+    return {"/": page, "/p/{i}": page}
+
+
+async def crawl(routes, **config):
+    runner, base_url = await start_site(routes)
+    crawler = make_crawler(base_url + "/", max_workers=1, **config)
+    await crawler.init()
+    try:
+        await crawler.run(blocking=True)
+    finally:
+        await crawler.close()
+        await runner.cleanup()
+    return crawler
+
+
+def test_connections_are_reused_and_bodies_decompressed(run):
+    seen_headers = []
+    crawler = run(crawl(make_handlers(seen_headers)))
+    assert len(crawler.reporter.reports) == 6
+    assert all(report.text.startswith("page") for report in crawler.reporter.reports)
+    assert set(seen_headers) == {"gzip, deflate"}
+
+    host_stats = crawler.connection_stats.host_stats("127.0.0.1")
+    assert host_stats["new"] == 1
+    assert host_stats["reused"] == 5
+
+
+def test_compression_can_be_disabled(run):
+    seen_headers = []
+    crawler = run(crawl(make_handlers(seen_headers), compression=False))
+    assert set(seen_headers) == {"identity"}
+    assert len(crawler.reporter.reports) == 6
+
+
+def test_timed_out_page_is_retried_and_skipped(run):
+    attempts = []
+
+    async def slow(request):
+        attempts.append(request.path)
+        await asyncio.sleep(1)
+        return web.Response(text="<p>late</p>", content_type="text/html")
+
+    crawler = run(crawl({"/": slow}, max_retries=2, total_timeout=0.2))
+    assert attempts == ["/", "/"]
+    assert crawler.reporter.reports == []
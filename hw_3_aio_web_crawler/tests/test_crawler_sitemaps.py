@@ -0,0 +1,219 @@
+import asyncio
+import gzip
+import zlib
+from datetime import datetime, timezone
+
+import aiohttp
+from aiohttp import web
+
+from hw_3_aio_web_crawler.crawler import PolitenessScheduler, RobotsCache, SitemapLoader
+from hw_3_aio_web_crawler.tests.helpers import make_crawler, start_site
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def urlset(*paths):
+    urls = "".join(
+        f"<url><loc>{{base}}{path}</loc><lastmod>2020-01-02</lastmod></url>"
+        for path in paths
+    )
+    return f'<?xml version="1.0"?><urlset {NS}>{urls}</urlset>'
+
+
+def make_routes(base):
+    async def robots(request):
+        return web.Response(text=f"User-agent: *\nSitemap: {base[0]}/sitemap.xml")
+
+    async def sitemap_index(request):
+        index = (
+            f"<sitemapindex {NS}><sitemap><loc>{base[0]}/pages.xml.gz</loc></sitemap>"
+            f"<sitemap><loc>{base[0]}/broken.xml</loc></sitemap></sitemapindex>"
+        )
+        return web.Response(text=index, content_type="application/xml")
+
+    async def pages(request):
+        body = urlset("/a", "/b").format(base=base[0]).encode()
+        return web.Response(body=gzip.compress(body))
+
+    async def broken(request):
+        return web.Response(text="<urlset><url><loc>", content_type="application/xml")
+
+    async def page(request):
+        return web.Response(text="<p>page</p>", content_type="text/html")
+
+    return {
+        "/robots.txt": robots,
+        "/sitemap.xml": sitemap_index,
+        "/pages.xml.gz": pages,
+        "/broken.xml": broken,
+        "/": page,
+        "/a": page,
+        "/b": page,
+    }
+
+
+async def start_sitemap_site():
+    base = [None]  # sitemaps refer to the site by its absolute urls
+    runner, base_url = await start_site(make_routes(base))
+    base[0] = base_url
+    return runner, base_url
+
+
+def test_sitemap_index_and_gzipped_sitemaps_are_read(run):
+    async def main():
+        runner, base_url = await start_sitemap_site()
+        async with aiohttp.ClientSession() as session:
+            loader = SitemapLoader(session)
+            urls = [entry async for entry in loader.urls(base_url + "/")]
+        await runner.cleanup()
+        return urls, loader, base_url
+
+    urls, loader, base_url = run(main())
+    lastmod = datetime(2020, 1, 2, tzinfo=timezone.utc)
+    assert urls == [(base_url + "/a", lastmod), (base_url + "/b", lastmod)]
+    assert loader.sitemaps_fetched == 3
+
+
+def test_missing_sitemap_gives_nothing(run):
+    async def main():
+        runner, base_url = await start_site({})
+        async with aiohttp.ClientSession() as session:
+            loader = SitemapLoader(session)
+            urls = [entry async for entry in loader.urls(base_url + "/")]
+        await runner.cleanup()
+        return urls, loader
+
+    urls, loader = run(main())
+    assert urls == []
+    assert loader.sitemaps_fetched == 0
+
+
+def test_parse_lastmod():
+    assert SitemapLoader.parse_lastmod("2019-01-02T10:00:00Z") == datetime(
+        2019, 1, 2, 10, tzinfo=timezone.utc
+    )
+    assert SitemapLoader.parse_lastmod("yesterday") is None
+    assert SitemapLoader.parse_lastmod(None) is None
+
+
+def test_crawler_is_seeded_from_sitemaps_of_robots(run):
+    async def main():
+        runner, base_url = await start_sitemap_site()
+        crawler = make_crawler(base_url + "/", obey_robots=True, use_sitemaps=True)
+        await crawler.init()
+        try:
+            await crawler.run(blocking=True)
+        finally:
+            await crawler.close()
+            await runner.cleanup()
+        return sorted(r.url[len(base_url):] for r in crawler.reporter.reports)
+
+    assert run(main()) == ["/", "/a", "/b"]
+
+
+class BufferingDecompressor:
+    """ Gives the data only on flush, as zlib may keep some of it buffered """
+
+    decompressobj = zlib.decompressobj  # the real one, it's patched in the test
+
+    def __init__(self, wbits):
+        self.decompressor = type(self).decompressobj(wbits)
+        self.data = b""
+
+    def decompress(self, chunk):
+        self.data += self.decompressor.decompress(chunk)
+        return b""
+
+    def flush(self):
+        return self.data + self.decompressor.flush()
+
+
+def test_gzipped_sitemap_is_read_by_small_chunks_till_the_end(run, monkeypatch):
+    async def pages(request):
+        body = gzip.compress(urlset("/a", "/b").format(base="http://x").encode())
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for start in range(0, len(body), 7):
+            await response.write(body[start:start + 7])
+        await response.write_eof()
+        return response
+
+    async def main():
+        runner, base_url = await start_site({"/sitemap.xml": pages})
+        async with aiohttp.ClientSession() as session:
+            loader = SitemapLoader(session)
+            urls = [loc async for loc, _ in loader.urls(base_url + "/")]
+        await runner.cleanup()
+        return urls
+
+    monkeypatch.setattr(
+        "hw_3_aio_web_crawler.crawler.zlib.decompressobj", BufferingDecompressor
+    )
+    assert run(main()) == ["http://x/a", "http://x/b"]
+
+
+def test_sitemaps_wait_for_crawl_delay_of_the_host(run):
+    fetched_at = []
+
+    def timed(handler):
+        async def wrapper(request):
+            fetched_at.append(asyncio.get_event_loop().time())
+            return await handler(request)
+
+        return wrapper
+
+    async def main():
+        base = [None]
+        routes = make_routes(base)
+
+        async def robots(request):
+            text = f"User-agent: *\nCrawl-delay: 0.2\nSitemap: {base[0]}/sitemap.xml"
+            return web.Response(text=text)
+
+        routes["/robots.txt"] = robots
+        for path in ("/sitemap.xml", "/pages.xml.gz", "/broken.xml"):
+            routes[path] = timed(routes[path])
+        runner, base[0] = await start_site(routes)
+        scheduler = PolitenessScheduler(max_rps_per_host=100)
+        await scheduler.init()
+        async with aiohttp.ClientSession() as session:
+            robots_cache = RobotsCache(
+                session,
+                "test",
+                on_rules=lambda host, rules: scheduler.set_crawl_delay(
+                    host, rules.crawl_delay
+                ),
+            )
+            loader = SitemapLoader(session, robots_cache, scheduler)
+            urls = [loc async for loc, _ in loader.urls(base[0] + "/")]
+        await runner.cleanup()
+        return urls
+
+    assert len(run(main())) == 2
+    assert len(fetched_at) == 3
+    assert fetched_at[2] - fetched_at[0] >= 0.35
+
+
+def test_xml_responses_are_not_parsed_as_pages(run):
+    async def home(request):
+        text = '<p>home</p><a href="/feed.xml">feed</a>'
+        return web.Response(text=text, content_type="text/html")
+
+    async def feed(request):
+        text = '<rss><a href="/hidden">hidden</a></rss>'
+        return web.Response(text=text, content_type="application/xml")
+
+    async def main():
+        runner, base_url = await start_site({"/": home, "/feed.xml": feed})
+        crawler = make_crawler(base_url + "/")
+        await crawler.init()
+        try:
+            await crawler.run(blocking=True)
+        finally:
+            await crawler.close()
+            await runner.cleanup()
+        return {r.url[len(base_url):]: r for r in crawler.reporter.reports}
+
+    reports = run(main())
+    assert sorted(reports) == ["/", "/feed.xml"]
+    assert "not parsable" in reports["/feed.xml"].unsuccess_msg
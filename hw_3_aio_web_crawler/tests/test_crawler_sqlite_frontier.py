@@ -0,0 +1,86 @@
+from hw_3_aio_web_crawler.crawler import CrawlerQueueSQLite
+from hw_3_aio_web_crawler.tests.helpers import make_crawler
+
+
+def test_urls_are_resumed_after_restart(run, tmp_path):
+    path = str(tmp_path / "frontier.db")
+
+    async def first_run():
+        queue = CrawlerQueueSQLite(path, batch_size=2, window_size=2)
+        await queue.init()
+        for i in range(5):
+            await queue.put(f"http://a.example/{i}", 1)
+        url, _ = await queue.get()
+        await queue.ack(url)
+        await queue.get()  # taken, but not acked before the "crash"
+        await queue.close()
+
+    async def second_run():
+        queue = CrawlerQueueSQLite(path, batch_size=2, window_size=2)
+        await queue.init()
+        assert await queue.len() == 4
+        urls = []
+        for _ in range(4):
+            url, depth = await queue.get()
+            assert depth == 1
+            urls.append(url)
+            await queue.ack(url)
+        await queue.join()
+        await queue.close()
+        return urls
+
+    run(first_run())
+    assert run(second_run()) == [f"http://a.example/{i}" for i in range(1, 5)]
+
+
+def test_duplicate_puts_are_not_queued_twice(run, tmp_path):
+    async def main():
+        queue = CrawlerQueueSQLite(str(tmp_path / "frontier.db"))
+        await queue.init()
+        await queue.put("http://a.example/")
+        await queue.put("http://a.example/")
+        await queue.checkpoint()
+        assert await queue.len() == 1
+        url, _ = await queue.get()
+        await queue.ack(url)
+        await queue.join()
+        await queue.close()
+
+    run(main())
+
+
+def test_seen_urls_are_read_by_batches(run, tmp_path):
+    async def main():
+        queue = CrawlerQueueSQLite(str(tmp_path / "frontier.db"), batch_size=3)
+        await queue.init()
+        for i in range(10):
+            await queue.put(f"http://a.example/{i}")
+        loads = []
+        load_seen = queue._load_seen
+        queue._load_seen = lambda *args: loads.append(args) or load_seen(*args)
+        seen = [url async for url in queue.seen_urls()]
+        await queue.close()
+        return seen, loads
+
+    seen, loads = run(main())
+    assert seen == [f"http://a.example/{i}" for i in range(10)]
+    assert all(limit == 3 for _, limit in loads)
+    assert len(loads) == 4
+
+
+def test_crawler_restores_known_urls_from_the_frontier(run, tmp_path):
+    path = str(tmp_path / "frontier.db")
+
+    async def main():
+        queue = CrawlerQueueSQLite(path)
+        await queue.init()
+        await queue.put("http://127.0.0.1:1/old", 1)
+        await queue.close()
+
+        crawler = make_crawler("http://127.0.0.1:1/", queue=CrawlerQueueSQLite(path))
+        await crawler.init()
+        known = "http://127.0.0.1:1/old" in crawler.known_urls
+        await crawler.close()
+        return known
+
+    assert run(main())